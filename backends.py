@@ -0,0 +1,469 @@
+"""
+Backends Module
+
+This module is the seam between the extractor and the Gemini API. Every file
+and model call (upload_file, get_file, list_files, delete_file, models,
+generation configs and cached content) goes through the active backend, and
+release_file tells it when a study is done with a file it keeps:
+
+- GeminiBackend: the live API via google.generativeai (the default). Given
+  an api_key it uses its own clients for that key instead of the global
+  genai.configure() ones, so several keys can be used side by side
+  (see key_pool.py).
+- FakeBackend: a local stand-in with configurable latency distributions,
+  server-side processing delay, injected 429 errors and canned JSON answers
+  built from the request's response_schema (or the prompt's field list). It
+  needs no API key or network, so the full main() loop can be benchmarked
+  offline with thousands of PDFs.
+
+Usage:
+    from backends import FakeBackend, Latency, set_backend
+
+    set_backend(FakeBackend(generate_latency=Latency('lognormal', 4.0, 0.4),
+                            error_rate=0.05, time_scale=0.01, seed=1))
+    ...  # file_manager / genai_client / context_cache now use the fake
+
+    # or: gemini_api_extractor.main(api_key=None, backend=FakeBackend(...))
+"""
+
+import os
+import re
+import json
+import math
+import time
+import random
+import hashlib
+import itertools
+import mimetypes
+import threading
+from datetime import datetime, timedelta, timezone
+from typing import Dict, List, Optional
+from google.api_core import exceptions
+import google.generativeai as genai
+from google.generativeai import caching, protos
+from google.generativeai import client as genai_client
+from google.generativeai.types import file_types
+
+
+class GeminiBackend:
+    """
+    The live Gemini API (google.generativeai).
+
+    Without an api_key it uses the global clients (call genai.configure
+    first); with one it keeps its own clients for that key.
+    """
+
+    name = 'gemini'
+
+    def __init__(self, api_key: Optional[str] = None, transport: Optional[str] = None):
+        """
+        Args:
+            api_key: Key for this backend's own clients (None = the global genai.configure key)
+            transport: 'grpc' or 'rest' for the backend's own clients
+        """
+        self.clients = None
+        if api_key:
+            self.clients = genai_client._ClientManager()
+            self.clients.configure(api_key=api_key, transport=transport)
+
+    def _client(self, service: str):
+        return self.clients.get_default_client(service)
+
+    def upload_file(self, path: str, display_name: str):
+        if self.clients is None:
+            return genai.upload_file(path=path, display_name=display_name)
+        mime_type = mimetypes.guess_type(path)[0] or 'application/pdf'
+        response = self._client('file').create_file(path=path, mime_type=mime_type, name=None,
+                                                    display_name=display_name, resumable=True)
+        return file_types.File(response)
+
+    def get_file(self, name: str):
+        if self.clients is None:
+            return genai.get_file(name)
+        return file_types.File(self._client('file').get_file(name=name))
+
+    def list_files(self):
+        if self.clients is None:
+            return genai.list_files()
+        return (file_types.File(proto)
+                for proto in self._client('file').list_files(protos.ListFilesRequest(page_size=100)))
+
+    def delete_file(self, name: str):
+        if self.clients is None:
+            genai.delete_file(name)
+        else:
+            self._client('file').delete_file(request=protos.DeleteFileRequest(name=name))
+
+    def release_file(self, name: str):
+        pass  # Nothing held per study; kept uploads expire server-side
+
+    def generative_model(self, model_name: str, system_instruction: Optional[str] = None):
+        if system_instruction:
+            model = genai.GenerativeModel(model_name, system_instruction=system_instruction)
+        else:
+            model = genai.GenerativeModel(model_name)
+        if self.clients is not None:
+            model._client = self._client('generative')
+        return model
+
+    def generation_config(self, response_schema: Optional[dict] = None):
+        return genai.GenerationConfig(response_mime_type="application/json", response_schema=response_schema)
+
+    def create_cached_content(self, model_name: str, document, system_instruction: Optional[str],
+                              ttl: timedelta, display_name: str = ""):
+        if self.clients is None:
+            return caching.CachedContent.create(
+                model=model_name,
+                display_name=display_name or None,
+                system_instruction=system_instruction,
+                contents=[document],
+                ttl=ttl
+            )
+        request = caching.CachedContent._prepare_create_request(
+            model=model_name, display_name=display_name or None, system_instruction=system_instruction,
+            contents=[document], ttl=ttl)
+        return caching.CachedContent._from_obj(self._client('cache').create_cached_content(request))
+
+    def model_from_cached_content(self, cached_content):
+        model = genai.GenerativeModel.from_cached_content(cached_content=cached_content)
+        if self.clients is not None:
+            model._client = self._client('generative')
+        return model
+
+    def delete_cached_content(self, cached_content):
+        if self.clients is None:
+            cached_content.delete()
+        else:
+            self._client('cache').delete_cached_content(
+                protos.DeleteCachedContentRequest(name=cached_content.name))
+
+
+class Latency:
+    """A latency distribution in seconds."""
+
+    KINDS = ('fixed', 'uniform', 'normal', 'lognormal')
+
+    def __init__(self, kind: str = 'fixed', mean: float = 0.0, spread: float = 0.0):
+        """
+        Args:
+            kind: 'fixed' (always mean), 'uniform' (mean +/- spread),
+                'normal' (standard deviation spread) or 'lognormal'
+                (median mean, sigma spread - a long right tail like real inference)
+            mean: Typical latency in seconds
+            spread: Width of the distribution (see kind)
+        """
+        if kind not in self.KINDS:
+            raise ValueError(f"Unknown latency distribution '{kind}' (expected one of {', '.join(self.KINDS)})")
+        self.kind = kind
+        self.mean = mean
+        self.spread = spread
+
+    def sample(self, rng: random.Random) -> float:
+        """Draw one latency (never negative)."""
+        if self.kind == 'uniform':
+            value = rng.uniform(self.mean - self.spread, self.mean + self.spread)
+        elif self.kind == 'normal':
+            value = rng.gauss(self.mean, self.spread)
+        elif self.kind == 'lognormal':
+            value = self.mean * math.exp(rng.gauss(0, self.spread)) if self.mean > 0 else 0.0
+        else:
+            value = self.mean
+        return max(0.0, value)
+
+    @classmethod
+    def parse(cls, spec: str) -> 'Latency':
+        """Parse 'kind:mean[:spread]', e.g. 'lognormal:4:0.4' or 'fixed:0.5'."""
+        parts = spec.split(':')
+        return cls(parts[0], float(parts[1]) if len(parts) > 1 else 0.0,
+                   float(parts[2]) if len(parts) > 2 else 0.0)
+
+
+class _State:
+    def __init__(self, name: str):
+        self.name = name
+
+
+class FakeFile:
+    """Stand-in for a genai File."""
+
+    def __init__(self, name: str, display_name: str, size_bytes: int, ready_at: float, fail: bool):
+        self.name = name
+        self.display_name = display_name
+        self.uri = f"fake://{name}"
+        self.mime_type = 'application/pdf'
+        self.size_bytes = size_bytes
+        self.expiration_time = datetime.now(timezone.utc) + timedelta(hours=48)
+        self._ready_at = ready_at
+        self._fail = fail
+
+    @property
+    def state(self) -> _State:
+        if time.monotonic() < self._ready_at:
+            return _State('PROCESSING')
+        return _State('FAILED' if self._fail else 'ACTIVE')
+
+
+class FakeUsage:
+    """Stand-in for a response's usage_metadata."""
+
+    def __init__(self, prompt: int, candidates: int, cached: int = 0):
+        self.prompt_token_count = prompt
+        self.candidates_token_count = candidates
+        self.cached_content_token_count = cached
+        self.total_token_count = prompt + candidates
+
+
+class FakeResponse:
+    """Stand-in for a (non-streamed) GenerateContentResponse."""
+
+    def __init__(self, text: str, usage: FakeUsage):
+        self.text = text
+        self.usage_metadata = usage
+
+
+class FakeStream:
+    """Stand-in for a streamed response: iterate for chunks, then read usage_metadata."""
+
+    def __init__(self, text: str, usage: FakeUsage, chunk_delay: float, chunks: int = 4):
+        self.text = text
+        self.usage_metadata = usage
+        self._chunk_delay = chunk_delay
+        self._chunks = chunks
+
+    def __iter__(self):
+        size = max(1, math.ceil(len(self.text) / self._chunks))
+        for start in range(0, len(self.text), size):
+            time.sleep(self._chunk_delay)
+            yield FakeResponse(self.text[start:start + size], self.usage_metadata)
+
+
+class FakeCachedContent:
+    """Stand-in for a caching.CachedContent entry."""
+
+    def __init__(self, name: str, document, system_instruction: Optional[str]):
+        self.name = name
+        self.document = document
+        self.system_instruction = system_instruction
+
+    def delete(self):
+        pass
+
+
+class FakeModel:
+    """Stand-in for a GenerativeModel, answering with canned JSON."""
+
+    def __init__(self, backend: 'FakeBackend', model_name: str, cached_content: Optional[FakeCachedContent] = None):
+        self.backend = backend
+        self.model_name = model_name
+        self.cached_content = cached_content
+
+    def generate_content(self, contents, generation_config=None, stream: bool = False, **kwargs):
+        return self.backend._generate(self, list(contents), generation_config, stream)
+
+
+# '- Field Name: description' lines of create_prompt
+PROMPT_FIELD_LINE = re.compile(r'^- (.+?)(?::\s.*)?$', re.MULTILINE)
+
+
+class FakeBackend:
+    """Offline stand-in for the Gemini API, for benchmarks and tests."""
+
+    name = 'fake'
+    _instances = itertools.count(1)
+
+    def __init__(self, generate_latency: Latency = Latency('lognormal', 4.0, 0.4),
+                 upload_latency: Latency = Latency('uniform', 1.0, 0.5),
+                 processing_latency: Latency = Latency('uniform', 2.0, 1.0),
+                 status_latency: Latency = Latency('fixed', 0.1),
+                 error_rate: float = 0.0, processing_failure_rate: float = 0.0,
+                 disagreement_rate: float = 0.05, null_rate: float = 0.1,
+                 time_scale: float = 1.0, seed: Optional[int] = None):
+        """
+        Args:
+            generate_latency: Time per generate_content call
+            upload_latency: Time per upload_file call
+            processing_latency: Time a new upload stays PROCESSING
+            status_latency: Time per get_file/list_files/delete_file call
+            error_rate: Probability that a generate call fails with 429 ResourceExhausted
+            processing_failure_rate: Probability that an upload ends up FAILED
+            disagreement_rate: Probability that a field's value differs from
+                the study's "true" value (exercises the pass comparison)
+            null_rate: Probability that a field is null
+            time_scale: Multiplier for every latency (e.g. 0.01 for fast benchmarks)
+            seed: Random seed for reproducible runs
+        """
+        self.generate_latency = generate_latency
+        self.upload_latency = upload_latency
+        self.processing_latency = processing_latency
+        self.status_latency = status_latency
+        self.error_rate = error_rate
+        self.processing_failure_rate = processing_failure_rate
+        self.disagreement_rate = disagreement_rate
+        self.null_rate = null_rate
+        self.time_scale = time_scale
+        self._rng = random.Random(seed)
+        self._files: Dict[str, FakeFile] = {}
+        self._lock = threading.Lock()
+        self._counter = 0
+        # Distinguishes file names of several fakes used side by side (key pools)
+        self._instance = next(FakeBackend._instances)
+        self.calls: Dict[str, int] = {}
+
+    def _sleep(self, latency: Latency):
+        with self._lock:
+            seconds = latency.sample(self._rng) * self.time_scale
+        if seconds:
+            time.sleep(seconds)
+
+    def _chance(self, probability: float) -> bool:
+        with self._lock:
+            return probability > 0 and self._rng.random() < probability
+
+    def _count(self, call: str):
+        with self._lock:
+            self.calls[call] = self.calls.get(call, 0) + 1
+
+    # --- Files ---
+
+    def upload_file(self, path: str, display_name: str):
+        self._count('upload_file')
+        self._sleep(self.upload_latency)
+        with self._lock:
+            self._counter += 1
+            name = f"files/fake-{self._instance}-{self._counter:06d}"
+            processing = self.processing_latency.sample(self._rng) * self.time_scale
+        remote = FakeFile(name, display_name, os.path.getsize(path), time.monotonic() + processing,
+                          self._chance(self.processing_failure_rate))
+        with self._lock:
+            self._files[name] = remote
+        return remote
+
+    def get_file(self, name: str):
+        self._count('get_file')
+        self._sleep(self.status_latency)
+        with self._lock:
+            remote = self._files.get(name)
+        if remote is None:
+            raise exceptions.NotFound(f"File {name} not found")
+        return remote
+
+    def list_files(self):
+        self._count('list_files')
+        self._sleep(self.status_latency)
+        with self._lock:
+            return list(reversed(list(self._files.values())))  # Newest first, like the API
+
+    def delete_file(self, name: str):
+        self._count('delete_file')
+        self._sleep(self.status_latency)
+        with self._lock:
+            self._files.pop(name, None)
+
+    def release_file(self, name: str):
+        pass  # Nothing held per study
+
+    # --- Models ---
+
+    def generative_model(self, model_name: str, system_instruction: Optional[str] = None):
+        return FakeModel(self, model_name)
+
+    def generation_config(self, response_schema: Optional[dict] = None):
+        return {'response_mime_type': 'application/json', 'response_schema': response_schema}
+
+    def create_cached_content(self, model_name: str, document, system_instruction: Optional[str],
+                              ttl: timedelta, display_name: str = ""):
+        self._count('create_cached_content')
+        with self._lock:
+            self._counter += 1
+            return FakeCachedContent(f"cachedContents/fake-{self._counter:06d}", document, system_instruction)
+
+    def model_from_cached_content(self, cached_content: FakeCachedContent):
+        return FakeModel(self, 'fake', cached_content)
+
+    def delete_cached_content(self, cached_content: FakeCachedContent):
+        self._count('delete_cached_content')
+
+    # --- Generation ---
+
+    @staticmethod
+    def _tokens(part) -> int:
+        """Rough token count of a request part (text ~4 chars/token, PDFs ~1 token/40 bytes)."""
+        if isinstance(part, str):
+            return max(1, len(part) // 4)
+        return max(1, getattr(part, 'size_bytes', 0) // 40)
+
+    @staticmethod
+    def _document_key(parts: List) -> str:
+        """Identify the study a request is about, so both passes share 'true' values."""
+        for part in parts:
+            if isinstance(part, FakeFile):
+                return part.display_name
+        return hashlib.sha256(str(parts[0]).encode('utf-8')).hexdigest() if parts else ''
+
+    def _fields(self, prompt: str, generation_config) -> Dict[str, str]:
+        """Field name -> JSON type, from the response_schema or the prompt's field list."""
+        schema = (generation_config or {}).get('response_schema') if isinstance(generation_config, dict) else None
+        if schema and schema.get('properties'):
+            return {name: prop.get('type', 'string') for name, prop in schema['properties'].items()
+                    if not name.endswith('_justification')}
+        body = prompt.split('\n\n', 1)[-1]
+        return {name.strip(): 'string' for name in PROMPT_FIELD_LINE.findall(body)}
+
+    def _value(self, document: str, field: str, field_type: str):
+        """A deterministic value per (study, field), occasionally perturbed or null."""
+        seed = int(hashlib.sha256(f"{document}\x00{field}".encode('utf-8')).hexdigest()[:12], 16)
+        rng = random.Random(seed)
+        if rng.random() < self.null_rate:
+            return None
+        if self._chance(self.disagreement_rate):
+            rng = random.Random(self._rng_bits())
+        if field_type == 'integer':
+            return rng.randint(1995, 2025) if 'year' in field.lower() else rng.randint(10, 5000)
+        if field_type == 'number':
+            return round(rng.uniform(0, 100), 2)
+        return f"{field} value {rng.randint(1, 999)}"
+
+    def _rng_bits(self) -> int:
+        with self._lock:
+            return self._rng.getrandbits(32)
+
+    def _generate(self, model: FakeModel, parts: List, generation_config, stream: bool):
+        self._count('generate_content')
+        if self._chance(self.error_rate):
+            self._sleep(self.status_latency)
+            raise exceptions.ResourceExhausted("429 Resource has been exhausted (e.g. check quota). "
+                                               f"Please retry in {max(0.01, self.time_scale):.2f}s.")
+
+        cached = model.cached_content
+        document_parts = [cached.document] if cached is not None else parts[:-1]
+        prompt = parts[-1] if parts else ''
+        document = self._document_key(document_parts)
+        answer = {field: self._value(document, field, field_type)
+                  for field, field_type in self._fields(prompt, generation_config).items()}
+        text = json.dumps(answer, ensure_ascii=False)
+
+        cached_tokens = sum(self._tokens(p) for p in document_parts) if cached is not None else 0
+        prompt_tokens = sum(self._tokens(p) for p in document_parts) + self._tokens(prompt)
+        usage = FakeUsage(prompt_tokens, self._tokens(text), cached_tokens)
+
+        if stream:
+            with self._lock:
+                total = self.generate_latency.sample(self._rng) * self.time_scale
+            return FakeStream(text, usage, total / 4)
+        self._sleep(self.generate_latency)
+        return FakeResponse(text, usage)
+
+
+# The backend every module calls (the live API unless replaced)
+_backend = GeminiBackend()
+
+
+def get_backend():
+    """Return the active backend."""
+    return _backend
+
+
+def set_backend(backend):
+    """Make `backend` the active backend for all subsequent calls."""
+    global _backend
+    _backend = backend
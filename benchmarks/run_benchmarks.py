@@ -0,0 +1,240 @@
+"""
+End-to-End Benchmarks
+
+This script runs the full extraction (upload, processing wait, both passes,
+comparison, journal writes and the Excel export) over synthetic corpora of
+growing size against the offline FakeBackend, and reports for each case:
+
+- files/minute (wall clock, whole run)
+- per-study latency p50/p95/max (upload start until the row is written)
+- peak RSS of the run
+- output-write time (journal appends) and export time (Excel files)
+
+Each case runs in its own subprocess and temporary directory, so peak RSS
+and on-disk state (journal, upload index, response cache) are per case.
+Results are written as JSON, tagged with the git commit; pass an earlier file
+to --compare to see the change per case.
+
+Usage:
+    python benchmarks/run_benchmarks.py
+    python benchmarks/run_benchmarks.py --sizes 10,100,1000,10000 --fields 20,80 --workers 8
+    python benchmarks/run_benchmarks.py --compare benchmark_a1b2c3d.json
+"""
+
+import os
+import sys
+import json
+import time
+import shutil
+import argparse
+import platform
+import tempfile
+import subprocess
+from contextlib import redirect_stdout
+from datetime import datetime
+from typing import Dict, List, Optional
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+REPO_DIR = os.path.dirname(BENCH_DIR)
+sys.path.insert(0, REPO_DIR)
+
+from backends import Latency  # noqa: E402
+from synthetic import write_corpus, write_template  # noqa: E402
+
+DEFAULT_SIZES = '10,100,1000'
+DEFAULT_FIELDS = '20,80'
+# Fake latencies are multiplied by this, so a 4 s generate call takes 40 ms
+DEFAULT_TIME_SCALE = 0.01
+TEMPLATE_FILE = 'template.xlsx'
+LOG_FILE = 'extractor.log'
+
+# Metrics shown by --compare, and whether higher is better
+COMPARED_METRICS = [
+    ('files_per_minute', True),
+    ('study_p95_s', False),
+    ('peak_rss_mb', False),
+    ('write_s', False),
+    ('export_s', False),
+]
+
+
+def git_commit() -> Optional[str]:
+    """Short hash of the checked-out commit, with '-dirty' for uncommitted changes."""
+    try:
+        commit = subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=REPO_DIR,
+                                capture_output=True, text=True, check=True).stdout.strip()
+        dirty = subprocess.run(['git', 'status', '--porcelain', '--untracked-files=no'], cwd=REPO_DIR,
+                               capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+    return f"{commit}-dirty" if dirty else commit
+
+
+def peak_rss_mb() -> Optional[float]:
+    """Peak resident set size of this process in MB (None where it can't be measured)."""
+    try:
+        import resource  # Unix only
+    except ImportError:
+        try:
+            import psutil
+        except ImportError:
+            return None
+        # Windows reports the peak working set; elsewhere only the current RSS
+        info = psutil.Process().memory_info()
+        return round(getattr(info, 'peak_wset', info.rss) / (1024 * 1024), 1)
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux reports kilobytes, macOS bytes
+    return round(peak / (1024 * 1024 if sys.platform == 'darwin' else 1024), 1)
+
+
+def run_case(case: Dict) -> Dict:
+    """
+    Run one extraction in the current directory (which holds Articles/ and
+    the template) and measure it. Runs inside the case's subprocess.
+    """
+    import gemini_api_extractor as extractor
+    from backends import FakeBackend
+
+    backend = FakeBackend(generate_latency=Latency.parse(case['fake_latency']), error_rate=case['error_rate'],
+                          time_scale=case['time_scale'], seed=case['seed'])
+    started = time.perf_counter()
+    with open(LOG_FILE, 'w', encoding='utf-8') as log, redirect_stdout(log):
+        extractor.main(None, template_path=TEMPLATE_FILE, dual_pass=not case['single_pass'],
+                       workers=case['workers'], prefetch=case['prefetch'], rpm=0, tpm=0, backend=backend)
+    wall = time.perf_counter() - started
+
+    with open(extractor.AUDIT_LOG_FILE, encoding='utf-8') as f:
+        summary = json.load(f)['summary']
+    timings = summary['timings']
+    study = timings.get('study', {})
+    return {
+        'studies': case['studies'],
+        'fields': case['fields'],
+        'files_extracted': summary['files_extracted'],
+        'wall_s': round(wall, 3),
+        'files_per_minute': round(case['studies'] / wall * 60, 1) if wall else None,
+        'study_p50_s': study.get('p50_s'),
+        'study_p95_s': study.get('p95_s'),
+        'study_max_s': study.get('max_s'),
+        'peak_rss_mb': peak_rss_mb(),
+        'write_s': timings.get('write', {}).get('total_s', 0.0),
+        'export_s': timings.get('export', {}).get('total_s', 0.0),
+        'requests': summary['tokens']['requests'],
+        'backend_calls': dict(backend.calls),
+        'stages': timings,
+    }
+
+
+def launch_case(case: Dict, keep: bool = False) -> Dict:
+    """Build the case's corpus in a temporary directory and run it in a subprocess."""
+    workdir = tempfile.mkdtemp(prefix=f"bench_{case['studies']}x{case['fields']}_")
+    try:
+        corpus_bytes = write_corpus(os.path.join(workdir, 'Articles'), case['studies'], seed=case['seed'])
+        write_template(os.path.join(workdir, TEMPLATE_FILE), case['fields'])
+        completed = subprocess.run([sys.executable, os.path.abspath(__file__), '--run-case', json.dumps(case)],
+                                   cwd=workdir, capture_output=True, text=True)
+        if completed.returncode != 0:
+            raise RuntimeError(f"Case {case['studies']} studies x {case['fields']} fields failed "
+                               f"(log in {workdir}):\n{completed.stderr}")
+        result = json.loads(completed.stdout.strip().splitlines()[-1])
+        result['corpus_mb'] = round(corpus_bytes / (1024 * 1024), 1)
+        return result
+    finally:
+        if keep:
+            print(f"  kept {workdir}")
+        else:
+            shutil.rmtree(workdir, ignore_errors=True)
+
+
+def compare(results: List[Dict], baseline_path: str) -> str:
+    """A table of each metric's change against a previous results file."""
+    with open(baseline_path, encoding='utf-8') as f:
+        baseline = json.load(f)
+    previous = {(r['studies'], r['fields']): r for r in baseline['results']}
+    lines = [f"Compared with {baseline_path} ({baseline.get('commit') or 'unknown commit'})",
+             f"{'Case':<16}{'Metric':<18}{'Before':>12}{'After':>12}{'Change':>10}"]
+    for result in results:
+        before = previous.get((result['studies'], result['fields']))
+        if before is None:
+            continue
+        case = f"{result['studies']}x{result['fields']}"
+        for metric, higher_is_better in COMPARED_METRICS:
+            old, new = before.get(metric), result.get(metric)
+            if not old or new is None:
+                continue
+            change = (new - old) / old * 100
+            worse = change < 0 if higher_is_better else change > 0
+            flag = ' !' if worse and abs(change) >= 10 else ''
+            lines.append(f"{case:<16}{metric:<18}{old:>12g}{new:>12g}{change:>+9.1f}%{flag}")
+    return '\n'.join(lines)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="End-to-end extraction benchmarks against the offline fake backend")
+    parser.add_argument("--sizes", default=DEFAULT_SIZES,
+                        help="Comma-separated corpus sizes in studies (default: %(default)s)")
+    parser.add_argument("--fields", default=DEFAULT_FIELDS,
+                        help="Comma-separated template sizes in fields (default: %(default)s)")
+    parser.add_argument("--workers", type=int, default=8, help="Workers per pipeline stage (default: %(default)s)")
+    parser.add_argument("--prefetch", type=int, default=2,
+                        help="Studies queued between pipeline stages (default: %(default)s)")
+    parser.add_argument("--single-pass", action="store_true", help="Benchmark single-pass extraction")
+    parser.add_argument("--time-scale", type=float, default=DEFAULT_TIME_SCALE,
+                        help="Multiplier for every fake latency (default: %(default)s)")
+    parser.add_argument("--fake-latency", default='lognormal:4:0.4',
+                        help="Fake generate latency as kind:mean[:spread] (default: %(default)s)")
+    parser.add_argument("--error-rate", type=float, default=0.0,
+                        help="Fraction of generate calls failing with 429 (default: %(default)s)")
+    parser.add_argument("--seed", type=int, default=1, help="Seed for the corpus and fake backend")
+    parser.add_argument("--output", help="Results file (default: benchmark_<commit>.json)")
+    parser.add_argument("--compare", help="Earlier results file to compare against")
+    parser.add_argument("--keep", action="store_true", help="Keep each case's working directory")
+    parser.add_argument("--run-case", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.run_case:
+        print(json.dumps(run_case(json.loads(args.run_case))))
+        return
+
+    Latency.parse(args.fake_latency)  # Fail before building any corpus
+    commit = git_commit()
+    config = {
+        'workers': args.workers,
+        'prefetch': args.prefetch,
+        'single_pass': args.single_pass,
+        'time_scale': args.time_scale,
+        'fake_latency': args.fake_latency,
+        'error_rate': args.error_rate,
+        'seed': args.seed,
+    }
+    results = []
+    for fields in [int(n) for n in args.fields.split(',')]:
+        for studies in [int(n) for n in args.sizes.split(',')]:
+            print(f"Running {studies} studies x {fields} fields...", flush=True)
+            result = launch_case(dict(config, studies=studies, fields=fields), keep=args.keep)
+            rss = f"{result['peak_rss_mb']:.0f} MB" if result['peak_rss_mb'] is not None else "n/a"
+            print(f"  {result['files_per_minute']:,.1f} files/min, p95 {result['study_p95_s']:.2f} s/study, "
+                  f"peak RSS {rss}, write {result['write_s']:.2f} s, "
+                  f"export {result['export_s']:.2f} s", flush=True)
+            results.append(result)
+
+    output = {
+        'commit': commit,
+        'timestamp': datetime.now().isoformat(),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'cpu_count': os.cpu_count(),
+        'config': config,
+        'results': results,
+    }
+    output_path = args.output or f"benchmark_{commit or 'unknown'}.json"
+    with open(output_path, 'w', encoding='utf-8') as f:
+        json.dump(output, f, indent=2)
+    print(f"Results saved to: {output_path}")
+
+    if args.compare:
+        print(compare(results, args.compare))
+
+
+if __name__ == "__main__":
+    main()
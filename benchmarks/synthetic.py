@@ -0,0 +1,141 @@
+"""
+Synthetic Corpus Module
+
+This module writes the inputs for the benchmarks: small but valid PDFs with
+a few pages of study-like text, and Excel templates with a chosen number of
+fields. Everything is derived from a seed, so a corpus can be rebuilt exactly
+on another machine or for another version of the extractor.
+
+Usage:
+    from synthetic import write_corpus, write_template
+
+    write_corpus('bench/Articles', n_studies=100, seed=1)
+    write_template('bench/template.xlsx', n_fields=40)
+"""
+
+import os
+import random
+from typing import List
+
+import pandas as pd
+
+# Field names cycled through to build templates; the mix covers the integer,
+# number and free-text types template_parser infers for the response schema
+FIELD_NAMES = [
+    'Author', 'Year of publication', 'Country', 'Study design', 'Sample size (n)',
+    'Intervention', 'Comparator', 'Duration (weeks)', 'Mean age ± SD', 'Female %',
+    'Baseline HbA1c %', 'Change in HbA1c', 'Baseline weight (kg)', 'Change in body weight',
+    'Number of dropouts', 'Adverse events', 'Risk of bias', 'Funding source',
+]
+# Fields per template sheet (sheets become sections, which field sharding splits on)
+FIELDS_PER_SECTION = 15
+
+SECTION_HEADINGS = ['Abstract', 'Introduction', 'Methods', 'Results', 'Discussion']
+FILLER_WORDS = [
+    'patients', 'randomized', 'placebo', 'glucagon', 'peptide', 'receptor', 'agonist', 'weekly',
+    'baseline', 'reduction', 'glycemic', 'control', 'weight', 'trial', 'dose', 'mg', 'week',
+    'outcome', 'primary', 'secondary', 'analysis', 'significant', 'treatment', 'group',
+]
+
+
+def make_pdf(pages: List[List[str]]) -> bytes:
+    """
+    Build a minimal PDF with one text line per entry on each page.
+
+    Args:
+        pages: Lines of text for each page
+
+    Returns:
+        The PDF file contents
+    """
+    objects = [b"<< /Type /Catalog /Pages 2 0 R >>", None,
+               b"<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>"]
+    kids = []
+    for i, lines in enumerate(pages):
+        page_id, content_id = 4 + 2 * i, 5 + 2 * i
+        kids.append(f"{page_id} 0 R")
+        shown = " ".join(f"({line.replace('(', '').replace(')', '')}) '" for line in lines)
+        stream = f"BT /F1 10 Tf 50 750 Td 12 TL {shown} ET"
+        objects.append(f"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 612 792] "
+                       f"/Resources << /Font << /F1 3 0 R >> >> /Contents {content_id} 0 R >>".encode())
+        objects.append(f"<< /Length {len(stream)} >>\nstream\n{stream}\nendstream".encode())
+    objects[1] = f"<< /Type /Pages /Kids [{' '.join(kids)}] /Count {len(pages)} >>".encode()
+
+    out = b"%PDF-1.4\n"
+    offsets = []
+    for number, body in enumerate(objects, start=1):
+        offsets.append(len(out))
+        out += f"{number} 0 obj\n".encode() + body + b"\nendobj\n"
+    xref = len(out)
+    out += f"xref\n0 {len(objects) + 1}\n0000000000 65535 f \n".encode()
+    out += b"".join(f"{offset:010d} 00000 n \n".encode() for offset in offsets)
+    out += f"trailer\n<< /Size {len(objects) + 1} /Root 1 0 R >>\nstartxref\n{xref}\n%%EOF\n".encode()
+    return out
+
+
+def study_pages(rng: random.Random, study: int, n_pages: int) -> List[List[str]]:
+    """Pages of study-like text: a title page, body sections and a reference list."""
+    title = f"Study {study:05d}: weekly GLP-1 receptor agonist versus placebo"
+    pages = [[title, f"Sample size n = {rng.randint(40, 4000)}",
+              f"Year {rng.randint(1995, 2025)}"]]
+    for page in range(1, n_pages - 1):
+        heading = SECTION_HEADINGS[page % len(SECTION_HEADINGS)]
+        lines = [heading]
+        for _ in range(40):
+            lines.append(" ".join(rng.choice(FILLER_WORDS) for _ in range(12)))
+        pages.append(lines)
+    pages.append(['References'] + [f"{n}. Author A, et al. J Diabetes. {rng.randint(1995, 2025)};"
+                                   f"{rng.randint(1, 60)}:{rng.randint(1, 900)}." for n in range(1, 40)])
+    return pages
+
+
+def write_corpus(articles_dir: str, n_studies: int, seed: int = 0, min_pages: int = 6,
+                 max_pages: int = 14) -> int:
+    """
+    Write n synthetic study PDFs into a directory.
+
+    Args:
+        articles_dir: Output directory (created if missing)
+        n_studies: Number of PDFs
+        seed: Random seed
+        min_pages: Fewest pages per study
+        max_pages: Most pages per study
+
+    Returns:
+        Total bytes written
+    """
+    os.makedirs(articles_dir, exist_ok=True)
+    rng = random.Random(seed)
+    total = 0
+    for study in range(n_studies):
+        pdf = make_pdf(study_pages(rng, study, rng.randint(min_pages, max_pages)))
+        with open(os.path.join(articles_dir, f"study_{study:05d}.pdf"), 'wb') as f:
+            f.write(pdf)
+        total += len(pdf)
+    return total
+
+
+def template_fields(n_fields: int) -> List[str]:
+    """n distinct field names cycled from FIELD_NAMES."""
+    names = []
+    for i in range(n_fields):
+        base = FIELD_NAMES[i % len(FIELD_NAMES)]
+        round_ = i // len(FIELD_NAMES)
+        names.append(base if round_ == 0 else f"{base} ({round_ + 1})")
+    return names
+
+
+def write_template(path: str, n_fields: int):
+    """
+    Write an Excel template with n fields, FIELDS_PER_SECTION to a sheet.
+
+    Args:
+        path: Output .xlsx path
+        n_fields: Number of fields
+    """
+    names = template_fields(n_fields)
+    with pd.ExcelWriter(path) as writer:
+        for start in range(0, len(names), FIELDS_PER_SECTION):
+            section = names[start:start + FIELDS_PER_SECTION]
+            sheet = f"Section {start // FIELDS_PER_SECTION + 1}"
+            pd.DataFrame(columns=section).to_excel(writer, sheet_name=sheet, index=False)
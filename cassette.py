@@ -0,0 +1,171 @@
+"""
+Cassette Module
+
+This module records model interactions to a compact on-disk cassette and
+replays them later without calling the API. Each interaction stores the
+request fingerprint (document hash, prompt hash, model and the full request
+key) together with the raw response text, its token usage and how long the
+call took.
+
+A cassette is a gzip-compressed JSON Lines file. Recording appends to it, and
+each interaction is flushed as it is written, so a run that crashes still
+leaves a readable cassette. Replaying serves each request key's responses in
+the order they were recorded (retries of unparseable output included), and
+repeats the last one once they run out. A request that was never recorded
+raises CassetteMissError instead of reaching the API.
+
+Usage:
+    from cassette import Cassette
+
+    recorder = Cassette('run.cassette.jsonl.gz', mode='record')
+    recorder.record(key, pdf_sha256, prompt, model_name, response.text,
+                    response.usage_metadata, latency)
+    recorder.close()
+
+    player = Cassette('run.cassette.jsonl.gz', mode='replay', latency='original')
+    response_text, usage_metadata = player.play(key)
+"""
+
+import gzip
+import json
+import time
+import hashlib
+import threading
+from collections import deque
+from datetime import datetime
+from types import SimpleNamespace
+from typing import Deque, Dict, List, Tuple
+from token_usage import USAGE_FIELDS
+
+REPLAY_LATENCIES = ('original', 'zero')
+
+
+class CassetteMissError(Exception):
+    """A replayed request has no recorded response."""
+
+
+class Cassette:
+    """Thread-safe recorder/player of model responses."""
+
+    def __init__(self, path: str, mode: str = 'replay', latency: str = 'original'):
+        """
+        Args:
+            path: Cassette file (.jsonl.gz)
+            mode: 'record' (append new interactions) or 'replay' (serve recorded ones)
+            latency: In replay mode, 'original' waits as long as the recorded
+                call took; 'zero' answers immediately
+        """
+        if mode not in ('record', 'replay'):
+            raise ValueError(f"Unknown cassette mode: {mode}")
+        if latency not in REPLAY_LATENCIES:
+            raise ValueError(f"Unknown replay latency: {latency}")
+        self.path = path
+        self.mode = mode
+        self.latency = latency
+        self.recorded = 0
+        self.replayed = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._file = None
+        self._interactions: Dict[str, Deque[Dict]] = {}
+        if mode == 'record':
+            self._file = gzip.open(path, 'at', encoding='utf-8')
+        else:
+            for interaction in self._read(path):
+                self._interactions.setdefault(interaction['key'], deque()).append(interaction)
+
+    @property
+    def replaying(self) -> bool:
+        return self.mode == 'replay'
+
+    @staticmethod
+    def _read(path: str) -> List[Dict]:
+        """Interactions in a cassette, tolerating a tail cut off by a crash."""
+        interactions = []
+        with gzip.open(path, 'rt', encoding='utf-8') as f:
+            try:
+                for line in f:
+                    try:
+                        entry = json.loads(line)
+                    except json.JSONDecodeError:
+                        break  # Partially written last line
+                    if 'key' in entry:
+                        interactions.append(entry)
+            except EOFError:
+                pass  # The recording run did not close the file
+        return interactions
+
+    def record(self, key: str, document_id: str, prompt: str, model: str, response_text: str,
+               usage_metadata=None, latency: float = 0.0):
+        """
+        Append one interaction.
+
+        Args:
+            key: Request key (the response cache key of the request)
+            document_id: Hash of the document sent (PDF or extracted text)
+            prompt: Full prompt text
+            model: Model name
+            response_text: Raw response text
+            usage_metadata: The response's usage_metadata
+            latency: Seconds the generate call took
+        """
+        entry = {
+            'key': key,
+            'document_sha256': document_id,
+            'prompt_sha256': hashlib.sha256(prompt.encode('utf-8')).hexdigest(),
+            'model': model,
+            'latency_s': round(latency, 3),
+            'usage': {attribute: getattr(usage_metadata, attribute, 0) or 0 for attribute in USAGE_FIELDS},
+            'recorded_at': datetime.now().isoformat(timespec='seconds'),
+            'response': response_text,
+        }
+        line = json.dumps(entry, ensure_ascii=False, separators=(',', ':')) + '\n'
+        with self._lock:
+            self._file.write(line)
+            self._file.flush()
+            self.recorded += 1
+
+    def __contains__(self, key: str) -> bool:
+        """True if a response was recorded for the request key."""
+        with self._lock:
+            return bool(self._interactions.get(key))
+
+    def play(self, key: str) -> Tuple[str, SimpleNamespace]:
+        """
+        Serve the next recorded response for a request, after its original
+        latency unless replaying with zero latency.
+
+        Returns:
+            (response_text, usage_metadata)
+
+        Raises:
+            CassetteMissError: If the request was never recorded
+        """
+        with self._lock:
+            queued = self._interactions.get(key)
+            if not queued:
+                self.misses += 1
+                raise CassetteMissError(f"No recorded response for request {key[:12]} in {self.path}")
+            interaction = queued.popleft() if len(queued) > 1 else queued[0]
+            self.replayed += 1
+        if self.latency == 'original' and interaction['latency_s']:
+            time.sleep(interaction['latency_s'])
+        return interaction['response'], SimpleNamespace(**interaction['usage'])
+
+    def stats(self) -> Dict[str, object]:
+        """Counts for the audit log."""
+        return {
+            'path': self.path,
+            'mode': self.mode,
+            'latency': self.latency if self.replaying else None,
+            'recorded': self.recorded,
+            'replayed': self.replayed,
+            'misses': self.misses,
+        }
+
+    def close(self):
+        """Finish writing the cassette."""
+        with self._lock:
+            if self._file is not None:
+                self._file.close()
+                self._file = None
@@ -0,0 +1,162 @@
+"""
+Context Cache Module
+
+This module holds the per-study model context: the document (the uploaded
+PDF, or its locally extracted text) plus any static instructions. With context
+caching enabled, that context is stored once per study as a Gemini
+CachedContent entry, and every pass, field shard and retry references it
+instead of making the model re-ingest the whole document.
+
+LocalContext is a stand-in with the same interface that sends the document (and
+instructions) inline with each request. It is used when caching is disabled,
+when the model or document is not eligible for caching (e.g. below the minimum
+cacheable token count), and for testing without a live cache.
+
+Usage:
+    from file_manager import StudyFile
+    from context_cache import StudyContext
+
+    with StudyFile(pdf_path) as study_file, \\
+            StudyContext(study_file, MODEL_NAME, instructions, use_cache=True) as context:
+        ctx = context.get()                  # created on first use
+        model = ctx.model()
+        response = model.generate_content(ctx.contents(prompt))
+"""
+
+import hashlib
+import threading
+from datetime import timedelta
+from typing import Optional
+from backends import get_backend
+from genai_client import get_model
+
+DEFAULT_CACHE_TTL = timedelta(hours=1)
+
+
+class LocalContext:
+    """Stand-in context that sends the document and instructions with every request."""
+
+    def __init__(self, document, model_name: str, instructions: Optional[str] = None):
+        self.document = document
+        self.model_name = model_name
+        self.instructions = instructions
+
+    def model(self):
+        """Return the shared model configured with the static instructions."""
+        return get_model(self.model_name, self.instructions)
+
+    def contents(self, prompt: str):
+        """Request contents for a prompt: the document is sent inline."""
+        return [self.document, prompt]
+
+    def release(self):
+        """Nothing to clean up."""
+
+
+class CachedContext:
+    """Context stored server-side as a Gemini CachedContent entry."""
+
+    def __init__(self, document, model_name: str, instructions: Optional[str] = None,
+                 ttl: timedelta = DEFAULT_CACHE_TTL, display_name: str = ""):
+        self.model_name = model_name
+        self.instructions = instructions
+        self._backend = get_backend()
+        self._cache = self._backend.create_cached_content(model_name, document, instructions, ttl, display_name)
+        self._model = self._backend.model_from_cached_content(self._cache)
+
+    def model(self):
+        """Return the model bound to the cached file and instructions."""
+        return self._model
+
+    def contents(self, prompt: str):
+        """Request contents for a prompt: the document is already in the cache."""
+        return [prompt]
+
+    def release(self):
+        """Delete the cache entry."""
+        try:
+            self._backend.delete_cached_content(self._cache)
+        except Exception:
+            pass  # Expires on its own
+
+
+class StudyContext:
+    """One lazily created context per study, shared by passes, shards and retries."""
+
+    def __init__(self, study_file, model_name: str, instructions: Optional[str] = None,
+                 use_cache: bool = False, ttl: timedelta = DEFAULT_CACHE_TTL, text: Optional[str] = None):
+        """
+        Args:
+            study_file: file_manager.StudyFile for the PDF
+            model_name: Model to create the context for
+            instructions: Static system instructions shared by every request
+            use_cache: Try to create a server-side CachedContent entry
+            ttl: Lifetime of the cache entry (deleted earlier on release)
+            text: Locally extracted document text; when given it is sent
+                instead of the PDF, which is then never uploaded
+        """
+        self.study_file = study_file
+        self.model_name = model_name
+        self.instructions = instructions
+        self.use_cache = use_cache
+        self.ttl = ttl
+        self.text = text
+        self._context = None
+        self._lock = threading.Lock()
+
+    def get(self):
+        """
+        Return the study's context, uploading the file on first use
+        (unless local text is available).
+
+        Returns:
+            CachedContext or LocalContext, or None if the file could not be processed
+        """
+        with self._lock:
+            if self._context is None:
+                if self.text is not None:
+                    document = self.text
+                else:
+                    document = self.study_file.get()
+                    if document is None:
+                        return None
+                self._context = self._create(document)
+            return self._context
+
+    @property
+    def source(self) -> str:
+        """'text' if the study is sent as extracted text, 'pdf' if uploaded."""
+        return 'text' if self.text is not None else 'pdf'
+
+    @property
+    def document_id(self) -> str:
+        """Content hash of the document the model sees (the text, or the uploaded file)."""
+        if self.text is not None:
+            return hashlib.sha256(self.text.encode('utf-8')).hexdigest()
+        return self.study_file.sha256
+
+    def _create(self, document):
+        """Create a cached context, falling back to the inline stand-in."""
+        if self.use_cache:
+            try:
+                return CachedContext(document, self.model_name, self.instructions,
+                                     self.ttl, self.study_file.display_name)
+            except Exception as e:
+                # Typically the document is below the minimum cacheable size
+                # or the model does not support caching
+                print(f"[{self.study_file.display_name}] Context caching unavailable, sending document inline: {e}")
+        return LocalContext(document, self.model_name, self.instructions)
+
+    def release(self):
+        """Delete the cache entry (if any) once the study is finished."""
+        with self._lock:
+            if self._context is not None:
+                self._context.release()
+                self._context = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.release()
+        return False
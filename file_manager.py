@@ -0,0 +1,396 @@
+"""
+File Manager Module
+
+This module manages the lifecycle of PDFs uploaded to the Gemini File API.
+A single upload is shared by every extraction pass (and retry) of a study and
+is deleted only once the study is finished.
+
+Uploaded files are processed server-side before they can be used. A shared
+FilePoller waits for them with adaptive backoff and an overall timeout, and
+checks many in-flight uploads with one list_files call instead of one
+get_file call each.
+
+An optional UploadIndex persists a SHA-256 -> remote file mapping on disk so
+that re-runs (after a crash, or with a different template) reuse files that
+are still live on the server instead of uploading them again.
+
+Usage:
+    from file_manager import StudyFile, UploadIndex
+
+    with StudyFile('Articles/study.pdf') as study_file:
+        uploaded = study_file.get()   # uploads on first use
+        ...                           # pass 1, pass 2, retries reuse it
+    # remote file deleted here
+
+    index = UploadIndex('upload_index.json')
+    with StudyFile('Articles/study.pdf', index=index) as study_file:
+        uploaded = study_file.get()   # reused if uploaded by an earlier run
+    # remote file kept (until it expires) for later runs
+
+    poller = FilePoller(timeout=300)    # shared by all StudyFiles of a run
+    study_file = StudyFile('Articles/study.pdf', poller=poller)
+"""
+
+import os
+import json
+import time
+import hashlib
+import threading
+from datetime import datetime, timedelta, timezone
+from typing import Dict, List, Optional
+from google.api_core import exceptions
+from backends import get_backend
+
+# Files uploaded to the File API are kept for 48 hours
+DEFAULT_FILE_TTL = timedelta(hours=48)
+# Don't reuse a file that would expire mid-study
+EXPIRY_MARGIN = timedelta(minutes=30)
+
+# Processing polls start quickly and back off for large files
+POLL_INITIAL_DELAY = 0.5
+POLL_MAX_DELAY = 10.0
+POLL_BACKOFF = 1.5
+DEFAULT_PROCESSING_TIMEOUT = 600.0
+# With at least this many files due, one list_files call replaces the get_file calls
+BATCH_POLL_THRESHOLD = 4
+
+
+def file_sha256(path: str) -> str:
+    """Return the hex SHA-256 digest of a file's contents."""
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+class UploadIndex:
+    """Persistent map of PDF content hash to a live remote file name and expiry."""
+
+    def __init__(self, path: str):
+        self.path = path
+        self._lock = threading.Lock()
+        self._entries: Dict[str, Dict[str, str]] = {}
+        if os.path.exists(path):
+            try:
+                with open(path, 'r', encoding='utf-8') as f:
+                    self._entries = json.load(f)
+            except (OSError, ValueError) as e:
+                print(f"Warning: Could not read upload index {path}: {e}")
+
+    def lookup(self, sha256: str):
+        """
+        Return the live remote file for a content hash, or None.
+
+        Entries that are expired, missing on the server or failed are evicted.
+
+        Raises:
+            Any other get_file error (429, 5xx, network), keeping the entry so
+            a retry can still reuse the file
+        """
+        with self._lock:
+            entry = self._entries.get(sha256)
+        if entry is None:
+            return None
+
+        expires = datetime.fromisoformat(entry['expiration_time'])
+        if expires - EXPIRY_MARGIN <= datetime.now(timezone.utc):
+            self.evict(sha256)
+            return None
+
+        try:
+            remote = get_backend().get_file(entry['name'])
+        except (exceptions.NotFound, exceptions.PermissionDenied):
+            # Deleted or expired on the server
+            self.evict(sha256)
+            return None
+
+        if remote.state.name == "FAILED":
+            self.evict(sha256)
+            return None
+        return remote
+
+    def record(self, sha256: str, remote_file):
+        """Remember an uploaded file under its content hash."""
+        expires = getattr(remote_file, 'expiration_time', None)
+        if not expires:
+            expires = datetime.now(timezone.utc) + DEFAULT_FILE_TTL
+        elif expires.tzinfo is None:
+            expires = expires.replace(tzinfo=timezone.utc)
+        with self._lock:
+            self._entries[sha256] = {
+                'name': remote_file.name,
+                'display_name': getattr(remote_file, 'display_name', ''),
+                'expiration_time': expires.isoformat()
+            }
+            self._save()
+
+    def evict(self, sha256: str):
+        """Drop an entry from the index."""
+        with self._lock:
+            if self._entries.pop(sha256, None) is not None:
+                self._save()
+
+    def _save(self):
+        """Write the index atomically. Caller must hold the lock."""
+        tmp_path = f"{self.path}.tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(self._entries, f, indent=2)
+        os.replace(tmp_path, self.path)
+
+
+class _PollState:
+    """One file being waited on by FilePoller."""
+
+    def __init__(self, remote_file, initial_delay: float):
+        self.file = remote_file
+        self.started = time.monotonic()
+        self.delay = initial_delay
+        self.next_poll = self.started + self.delay
+        self.polls: List[Dict] = []
+        self.timed_out = False
+        self.done = False
+
+
+class FilePoller:
+    """Shared background poller for files still PROCESSING on the server."""
+
+    def __init__(self, initial_delay: float = POLL_INITIAL_DELAY, max_delay: float = POLL_MAX_DELAY,
+                 backoff: float = POLL_BACKOFF, timeout: float = DEFAULT_PROCESSING_TIMEOUT,
+                 batch_threshold: int = BATCH_POLL_THRESHOLD):
+        """
+        Args:
+            initial_delay: Seconds before the first status check
+            max_delay: Cap on the delay between checks of one file
+            backoff: Factor the delay grows by after each check
+            timeout: Give up on a file still PROCESSING after this many seconds
+            batch_threshold: Files due at once before a list_files call is used
+        """
+        self.initial_delay = initial_delay
+        self.max_delay = max_delay
+        self.backoff = backoff
+        self.timeout = timeout
+        self.batch_threshold = batch_threshold
+        self.total_polls = 0
+        self.batch_polls = 0
+        self._pending: Dict[int, _PollState] = {}
+        self._cond = threading.Condition()
+        self._thread = None
+
+    def wait(self, remote_file) -> _PollState:
+        """
+        Block until the file leaves PROCESSING or the timeout passes.
+
+        Returns:
+            The poll state: .file is the latest File, .polls records each
+            check ({'after_s', 'state'}), .timed_out is set on timeout
+        """
+        state = _PollState(remote_file, self.initial_delay)
+        if remote_file.state.name != "PROCESSING":
+            state.done = True
+            return state
+
+        with self._cond:
+            self._pending[id(state)] = state
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="file-poller", daemon=True)
+                self._thread.start()
+            self._cond.notify_all()
+            while not state.done:
+                self._cond.wait()
+        return state
+
+    def _run(self):
+        """Poll due files until none are pending."""
+        while True:
+            with self._cond:
+                while True:
+                    if not self._pending:
+                        self._thread = None
+                        return
+                    now = time.monotonic()
+                    due = [s for s in self._pending.values() if s.next_poll <= now]
+                    if due:
+                        break
+                    self._cond.wait(min(s.next_poll for s in self._pending.values()) - now)
+
+            refreshed = self._check(due)
+
+            with self._cond:
+                now = time.monotonic()
+                for state in due:
+                    if refreshed.get(state.file.name) is not None:
+                        state.file = refreshed[state.file.name]
+                    state.polls.append({'after_s': round(now - state.started, 3),
+                                        'state': state.file.state.name})
+                    if state.file.state.name != "PROCESSING":
+                        state.done = True
+                    elif now - state.started >= self.timeout:
+                        state.done = state.timed_out = True
+                    else:
+                        state.delay = min(self.max_delay, state.delay * self.backoff)
+                        state.next_poll = now + state.delay
+                    if state.done:
+                        del self._pending[id(state)]
+                self.total_polls += len(due)
+                self._cond.notify_all()
+
+    def _check(self, due: List[_PollState]) -> Dict[str, object]:
+        """Fetch the current state of the due files (None where the check failed)."""
+        names = {state.file.name for state in due}
+        refreshed = {}
+        if len(names) >= self.batch_threshold:
+            try:
+                for remote_file in get_backend().list_files():
+                    if remote_file.name in names:
+                        refreshed[remote_file.name] = remote_file
+                        if len(refreshed) == len(names):
+                            break  # Newest files are listed first
+                self.batch_polls += 1
+            except Exception as e:
+                print(f"[file-poller] list_files failed, checking files one by one: {e}")
+        for name in names - set(refreshed):
+            try:
+                refreshed[name] = get_backend().get_file(name)
+            except Exception as e:
+                # Transient: the file is checked again after the next delay
+                print(f"[file-poller] Status check for {name} failed: {e}")
+                refreshed[name] = None
+        return refreshed
+
+
+# Used by StudyFile unless one is passed in
+DEFAULT_POLLER = FilePoller()
+
+
+class StudyFile:
+    """Uploaded copy of one PDF, shared across passes and retries."""
+
+    def __init__(self, pdf_path: str, index: Optional[UploadIndex] = None, limiter=None,
+                 upload_path: Optional[str] = None, poller: Optional[FilePoller] = None):
+        """
+        Args:
+            pdf_path: Local path of the PDF
+            index: Optional UploadIndex for reusing uploads across runs
+            limiter: Optional rate_limiter.RateLimiter that uploads acquire from
+            upload_path: File to upload in place of the PDF (e.g. a copy trimmed
+                to the relevant pages); defaults to pdf_path
+            poller: FilePoller that waits for processing (defaults to DEFAULT_POLLER)
+        """
+        self.pdf_path = pdf_path
+        self.upload_path = upload_path or pdf_path
+        self.display_name = os.path.basename(pdf_path)
+        self.index = index
+        self.limiter = limiter
+        self.poller = poller or DEFAULT_POLLER
+        # Upload time, processing status checks ({'after_s', 'state'}) and
+        # total processing wait, for tuning
+        self.upload_time = 0.0
+        self.polls: List[Dict] = []
+        self.processing_wait = 0.0
+        self._sha256 = None
+        self._file = None
+        self._pending = None  # Uploaded but not yet waited on
+        self._failed = False
+        self._lock = threading.Lock()
+
+    @property
+    def sha256(self) -> str:
+        """Content hash of the uploaded file, computed on first use."""
+        if self._sha256 is None:
+            self._sha256 = file_sha256(self.upload_path)
+        return self._sha256
+
+    def upload(self):
+        """
+        Start the upload (or find an indexed copy) without waiting for
+        server-side processing, so it can overlap other work. get() finishes it.
+        """
+        with self._lock:
+            if self._file is None and self._pending is None and not self._failed:
+                self._pending = self._start_upload()
+
+    def get(self):
+        """
+        Return the uploaded file, uploading and waiting for processing on first use.
+
+        Concurrent callers block until the single upload has finished.
+
+        Returns:
+            The ACTIVE genai File, or None if server-side processing failed
+        """
+        with self._lock:
+            if self._file is None and not self._failed:
+                pending = self._pending if self._pending is not None else self._start_upload()
+                self._pending = None
+                self._file = self._wait_until_active(pending)
+                self._failed = self._file is None
+            return self._file
+
+    def _start_upload(self):
+        """Upload the PDF, or reuse an indexed copy. The file may still be PROCESSING."""
+        if self.index is not None:
+            sample_file = self.index.lookup(self.sha256)
+            if sample_file is not None:
+                print(f"[{self.display_name}] Reusing uploaded file {sample_file.name}")
+                return sample_file
+
+        print(f"[{self.display_name}] Uploading to Gemini...")
+        if self.limiter is not None:
+            self.limiter.acquire(counts_tokens=False)
+        started = time.monotonic()
+        sample_file = get_backend().upload_file(self.upload_path, self.display_name)
+        self.upload_time += time.monotonic() - started
+        if self.index is not None:
+            self.index.record(self.sha256, sample_file)
+        return sample_file
+
+    def _wait_until_active(self, sample_file):
+        """Wait until the file leaves PROCESSING; clean up and return None if it FAILED or timed out."""
+        poll = self.poller.wait(sample_file)
+        sample_file = poll.file
+        self.polls.extend(poll.polls)
+        self.processing_wait += time.monotonic() - poll.started
+
+        if poll.timed_out or sample_file.state.name == "FAILED":
+            if poll.timed_out:
+                print(f"[{self.display_name}] File still processing after {self.poller.timeout:g}s; giving up.")
+            else:
+                print(f"[{self.display_name}] File processing failed.")
+            if self.index is not None:
+                self.index.evict(self.sha256)
+            try:
+                get_backend().delete_file(sample_file.name)
+            except Exception:
+                pass  # Not critical
+            return None
+
+        return sample_file
+
+    def release(self):
+        """
+        Delete the remote file once the study is finished.
+
+        Indexed files are kept so later runs can reuse them; the server
+        removes them when they expire. Either way the backend is told the
+        study is done with the file (e.g. a key pool drops its failover copies).
+        """
+        with self._lock:
+            remote = self._file if self._file is not None else self._pending
+            if remote is not None:
+                try:
+                    if self.index is None:
+                        get_backend().delete_file(remote.name)
+                    else:
+                        get_backend().release_file(remote.name)
+                except Exception:
+                    pass  # Not critical
+            self._file = None
+            self._pending = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.release()
+        return False
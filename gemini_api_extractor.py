@@ -1,18 +1,41 @@
 import os
-import time
 import json
 import pandas as pd
 import argparse
-import google.generativeai as genai
-from google.api_core import exceptions
-from template_parser import parse_template, get_field_names
+import shutil
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
+from template_parser import (parse_template, get_field_names, build_response_schema, shard_fields,
+                             infer_field_type)
+from file_manager import StudyFile, UploadIndex, FilePoller, DEFAULT_PROCESSING_TIMEOUT
+from context_cache import StudyContext
+from pipeline import Stage, run_pipeline
+from backends import GeminiBackend, FakeBackend, Latency, set_backend
+from key_pool import KeyPool, load_keys, mask_key
+from genai_client import (configure_client, create_key_backend, get_generation_config, DEFAULT_TRANSPORT,
+                          DEFAULT_MAX_CONNECTIONS, DEFAULT_KEEPALIVE)
+import pdf_text
+from result_journal import ResultJournal, export_to_excel
+from rate_limiter import RateLimiter
+from quota_ledger import QuotaLedger, DailyQuota, budget_allows, key_id, DEFAULT_LEDGER_FILE, QUOTA_POLICIES
+from retry_policy import RetryPolicy, InvalidResponseError
+from streaming_json import IncrementalJSONParser
+from response_cache import ResponseCache, DEFAULT_CACHE_DIR, DEFAULT_MAX_BYTES
+from cassette import Cassette, CassetteMissError
+from stage_timer import StageTimer
+from token_usage import UsageTracker, empty_usage, merge_usage, estimate_cost, model_pricing
 from datetime import datetime
 
 # Configuration
 ARTICLES_DIR = 'Articles'
 OUTPUT_FILE = 'extracted_studies_api.xlsx'
+JOURNAL_FILE = 'extracted_studies_api.jsonl'
 DISCREPANCY_FILE = 'extraction_discrepancies.xlsx'
 AUDIT_LOG_FILE = 'extraction_audit_log.json'
+UPLOAD_INDEX_FILE = 'upload_index.json'
+STREAM_LOG_FILE = 'extraction_stream.jsonl'
 DEFAULT_TEMPLATE = 'GLP1_Meta_Analysis_Data_Extraction_Template.docx'
 MODEL_NAME = "models/gemini-2.0-flash"
 
@@ -20,6 +43,40 @@ MODEL_NAME = "models/gemini-2.0-flash"
 TEMPLATE_FIELDS = None
 ALL_COLUMNS = None
 
+# Content-hash index of live uploads, shared across runs (None = disabled)
+UPLOAD_INDEX = None
+# Disk cache of model responses keyed by (PDF hash, prompt, model) (None = disabled)
+RESPONSE_CACHE = None
+# Shared RPM/TPM limiter for every upload and generate call (unlimited until main() configures it)
+RATE_LIMITER = RateLimiter()
+# Free-tier quota for gemini-2.0-flash; override with --rpm/--tpm
+DEFAULT_RPM = 15
+DEFAULT_TPM = 1_000_000
+# Daily caps are opt-in (--rpd/--tpd); the free tier allows 1,500 requests per day
+FREE_TIER_RPD = 1500
+# Per-stage durations for the audit log and the end-of-run timing report (reset by main())
+STAGE_TIMER = StageTimer()
+# Token counts from every response's usage_metadata (reset by main())
+USAGE_TRACKER = UsageTracker()
+# Shared poller waiting for uploads to finish processing (replaced by main() from --processing-timeout)
+FILE_POLLER = FilePoller()
+# Backoff/retry behaviour for transient API failures (replaced by main() from --max-attempts)
+RETRY_POLICY = RetryPolicy()
+# Stream responses and parse fields as they arrive (set by main() from --stream)
+STREAM_RESPONSES = False
+_stream_log_lock = threading.Lock()
+# Cache the uploaded PDF + static instructions once per study (set by main() from --context-cache)
+CONTEXT_CACHING = False
+# Request shaping (set by main() from --shard-fields / --no-schema)
+SHARD_SIZE = 0
+USE_SCHEMA = True
+# Records or replays model responses (set by main() from --record / --replay; None = off)
+CASSETTE = None
+CONTEXT_INSTRUCTIONS = (
+    "You are extracting structured data from the attached full-text study for a systematic review. "
+    "Base every value strictly on the content of this document."
+)
+
 def load_template(template_path):
     """Load template and set global field variables."""
     global TEMPLATE_FIELDS, ALL_COLUMNS
@@ -28,11 +85,13 @@ def load_template(template_path):
     ALL_COLUMNS = get_field_names(TEMPLATE_FIELDS)
     print(f"Loaded {len(TEMPLATE_FIELDS)} fields from template")
 
-def create_prompt(pass_num=1):
-    """Create extraction prompt from loaded template fields.
+def create_prompt(pass_num=1, fields=None):
+    """Create extraction prompt from loaded template fields (or a shard of them).
     Pass 1 uses standard extraction. Pass 2 uses a rephrased strategy."""
     if TEMPLATE_FIELDS is None:
         raise ValueError("Template not loaded. Call load_template() first.")
+    if fields is None:
+        fields = TEMPLATE_FIELDS
     
     if pass_num == 1:
         prompt = "You are an expert scientific researcher. Extract the following information from the attached PDF study.\n"
@@ -46,21 +105,62 @@ def create_prompt(pass_num=1):
     
     # Group fields by section for better context
     sections = {}
-    for field in TEMPLATE_FIELDS:
+    for field in fields:
         section = field.section if field.section else "General"
         if section not in sections:
             sections[section] = []
         sections[section].append(field)
     
-    for section_name, fields in sections.items():
+    for section_name, section_fields in sections.items():
         prompt += f"--- {section_name} ---\n"
-        for field in fields:
+        for field in section_fields:
             desc = f": {field.description}" if field.description else ""
             prompt += f"- {field.name}{desc}\n"
     
     prompt += "\nReturn ONLY the JSON object. No markdown formatting (like ```json), no preamble."
     return prompt
 
+def create_response_schema(pass_num=1, fields=None):
+    """Compile the loaded template fields (or a shard of them) into a response_schema
+    for the given pass. Pass 2 additionally allows '<FieldName>_justification' keys."""
+    if TEMPLATE_FIELDS is None:
+        raise ValueError("Template not loaded. Call load_template() first.")
+    if fields is None:
+        fields = TEMPLATE_FIELDS
+    return build_response_schema(fields, include_justifications=(pass_num == 2))
+
+def create_pass_requests(pass_num=1, fields=None):
+    """
+    Build the (prompt, response_schema) requests that make up one pass over the
+    template (or the given subset of fields).
+    With SHARD_SIZE > 0 the fields are split by section into shards of at most
+    SHARD_SIZE fields, each extracted with its own smaller prompt.
+    """
+    if TEMPLATE_FIELDS is None:
+        raise ValueError("Template not loaded. Call load_template() first.")
+    if fields is None:
+        fields = TEMPLATE_FIELDS
+    return [
+        (create_prompt(pass_num, shard), create_response_schema(pass_num, shard) if USE_SCHEMA else None)
+        for shard in shard_fields(fields, SHARD_SIZE)
+    ]
+
+def select_fields_for_verification(pass1_data):
+    """
+    Pick the fields worth re-extracting in an adaptive pass 2: values pass 1
+    left empty, and fields typed integer/number in the template, where
+    transcription errors matter most. Free-text fields that merely contain
+    digits (study IDs, "events / total N") are not re-extracted.
+    """
+    selected = []
+    for field in TEMPLATE_FIELDS:
+        value = pass1_data.get(field.name)
+        text = str(value).strip() if value is not None else ""
+        if (not text or text.lower() in ('null', 'none', 'not reported', 'n/a', 'nr')
+                or infer_field_type(field) in ('integer', 'number')):
+            selected.append(field)
+    return selected
+
 def clean_json_string(response_text):
     """Clean the response text to get valid JSON."""
     text = response_text.strip()
@@ -77,65 +177,178 @@ def clean_json_string(response_text):
     text = text.strip()
     return text
 
-def extract_study_with_api(pdf_path, prompt):
-    """Uploads file and extracts data using Gemini API."""
-    print(f"[{os.path.basename(pdf_path)}] Uploading to Gemini...")
-    
+def log_streamed_field(source_file, field, value, elapsed):
+    """Append one field to STREAM_LOG_FILE as soon as it has been received."""
+    entry = {'source_file': source_file, 'field': field, 'value': value, 'elapsed_s': round(elapsed, 3)}
+    with _stream_log_lock:
+        with open(STREAM_LOG_FILE, 'a', encoding='utf-8') as f:
+            f.write(json.dumps(entry, ensure_ascii=False, default=str) + '\n')
+
+def generate_streaming(model, contents, generation_config, source_file):
+    """
+    Stream a response, parsing the JSON object incrementally.
+    Each field is logged as it completes; malformed or truncated output raises
+    InvalidResponseError as soon as it is detected, abandoning the stream.
+    Returns (response_text, usage_metadata).
+    """
+    started = datetime.now()
+    parser = IncrementalJSONParser()
+    response = model.generate_content(contents, generation_config=generation_config, stream=True)
     try:
-        # Upload the file
-        sample_file = genai.upload_file(path=pdf_path, display_name=os.path.basename(pdf_path))
-        
-        # Verify state
-        while sample_file.state.name == "PROCESSING":
-            time.sleep(1)
-            sample_file = genai.get_file(sample_file.name)
-            
-        if sample_file.state.name == "FAILED":
-            print(f"[{os.path.basename(pdf_path)}] File processing failed.")
+        for chunk in response:
+            for field, value in parser.feed(chunk.text):
+                log_streamed_field(source_file, field, value, (datetime.now() - started).total_seconds())
+        parser.close()
+    except ValueError as e:
+        raise InvalidResponseError(f"{e}. Debug Raw: {parser.text[:100]}...")
+    return parser.text, getattr(response, 'usage_metadata', None)
+
+def create_study_context(study_file, text=None):
+    """Wrap a StudyFile in the per-study model context (server-side cached with --context-cache).
+    With locally extracted text, the text is sent instead of uploading the PDF."""
+    instructions = CONTEXT_INSTRUCTIONS if CONTEXT_CACHING else None
+    if text is not None:
+        text = f"Full text of the attached PDF study ({study_file.display_name}), extracted locally:\n\n{text}"
+    return StudyContext(study_file, MODEL_NAME, instructions, use_cache=CONTEXT_CACHING, text=text)
+
+def request_key(context, prompt, response_schema=None):
+    """
+    Everything that changes the response; identifies the request in the
+    response cache and the cassette. Known before anything is uploaded.
+    """
+    return ResponseCache.make_key(context.document_id, prompt, MODEL_NAME,
+                                  json.dumps(response_schema, sort_keys=True),
+                                  context.instructions or "", context.source)
+
+def answered_locally(context, requests):
+    """True if the response cache or the replayed cassette has every (prompt, schema) request."""
+    if RESPONSE_CACHE is None and (CASSETTE is None or not CASSETTE.replaying):
+        return False
+    for prompt, schema in requests:
+        key = request_key(context, prompt, schema)
+        if not ((RESPONSE_CACHE is not None and key in RESPONSE_CACHE)
+                or (CASSETTE is not None and CASSETTE.replaying and key in CASSETTE)):
+            return False
+    return True
+
+def _extract_once(pdf_path, prompt, context, response_schema=None, timings=None, tokens=None):
+    """
+    Single extraction attempt. Raises on API errors and InvalidResponseError on
+    unparseable output so the retry policy can decide whether to try again.
+    Generate and parse durations are recorded in STAGE_TIMER (and in timings),
+    token usage in USAGE_TRACKER (and in tokens).
+    """
+    key = request_key(context, prompt, response_schema)
+
+    # Serve identical requests from the local cache without touching the API
+    cache_key = None
+    response_text = None
+    if RESPONSE_CACHE is not None:
+        cache_key = key
+        response_text = RESPONSE_CACHE.get(cache_key)
+        if response_text is not None:
+            print(f"[{os.path.basename(pdf_path)}] Using cached response")
+
+    if response_text is None and CASSETTE is not None and CASSETTE.replaying:
+        # Recorded responses stand in for the API (CassetteMissError if absent)
+        with STAGE_TIMER.time('generate', timings):
+            response_text, usage = CASSETTE.play(key)
+        USAGE_TRACKER.add(usage, tokens)
+
+    if response_text is None:
+        # Upload the file / create the cached context (only happens once per study)
+        study_context = context.get()
+        if study_context is None:
             return None
 
         # Generate content
         print(f"[{os.path.basename(pdf_path)}] Generating extraction...")
-        model = genai.GenerativeModel(MODEL_NAME)
+        model = study_context.model()
+        contents = study_context.contents(prompt)
         
-        # Configure Generation config for JSON output (available in 1.5 Pro/Flash)
-        generation_config = genai.GenerationConfig(
-            response_mime_type="application/json"
-        )
-
-        response = model.generate_content(
-            [sample_file, prompt],
-            generation_config=generation_config
-        )
-        
-        # Clean up the file from cloud storage to be polite/clean
-        try:
-            genai.delete_file(sample_file.name)
-        except:
-            pass # Not critical
+        # Shared Generation config for JSON output (available in 1.5 Pro/Flash),
+        # constrained to the template's fields when a schema is given
+        generation_config = get_generation_config(response_schema)
 
-        # Parse Response
+        reservation = RATE_LIMITER.acquire()
+        generate_started = time.perf_counter()
         try:
-            text = clean_json_string(response.text)
+            with STAGE_TIMER.time('generate', timings):
+                if STREAM_RESPONSES:
+                    response_text, usage = generate_streaming(
+                        model, contents, generation_config, os.path.basename(pdf_path)
+                    )
+                else:
+                    response = model.generate_content(
+                        contents,
+                        generation_config=generation_config
+                    )
+                    response_text, usage = response.text, getattr(response, 'usage_metadata', None)
+        except Exception as e:
+            RATE_LIMITER.settle(reservation)
+            if RATE_LIMITER.quota is not None:
+                # A per-day 429 keeps the key out of later runs today
+                RATE_LIMITER.quota.note_error(e)
+            raise
+        generate_latency = time.perf_counter() - generate_started
+        RATE_LIMITER.settle(reservation, usage)
+        USAGE_TRACKER.add(usage, tokens)
+        if CASSETTE is not None:
+            # Recorded before parsing, so unparseable responses (and the retries
+            # they cause) replay exactly as they happened
+            CASSETTE.record(key, context.document_id, prompt, MODEL_NAME, response_text,
+                            usage, generate_latency)
+
+    # Parse Response
+    try:
+        with STAGE_TIMER.time('parse', timings):
+            text = clean_json_string(response_text)
             data = json.loads(text)
-            data['Source File'] = os.path.basename(pdf_path)
-            return data
-        except json.JSONDecodeError:
-            print(f"[{os.path.basename(pdf_path)}] Error: Invalid JSON returned.")
-            print(f"Debug Raw: {response.text[:100]}...")
-            return None
-            
-    except exceptions.ResourceExhausted:
-         print(f"[{os.path.basename(pdf_path)}] Quota exceeded (429). Waiting 30 seconds...")
-         time.sleep(30)
-         return "RETRY"
+    except json.JSONDecodeError:
+        raise InvalidResponseError(f"Invalid JSON returned. Debug Raw: {response_text[:100]}...")
+
+    if cache_key is not None:
+        RESPONSE_CACHE.put(cache_key, response_text)
+    data['Source File'] = os.path.basename(pdf_path)
+    return data
+
+def extract_study_with_api(pdf_path, prompt, context=None, response_schema=None, timings=None, tokens=None):
+    """
+    Extracts data from an uploaded PDF using Gemini API.
+    Transient failures (quota, 5xx, timeouts, invalid JSON) are retried
+    according to RETRY_POLICY; returns None once the study can't be extracted.
+    Pass a shared StudyContext to reuse one upload (and cached context) across
+    passes, shards and retries; without one, the file is uploaded for this call
+    and deleted afterwards.
+    response_schema (from create_response_schema) constrains the output keys/types.
+    timings and tokens are optional dicts that generate/parse durations and
+    token usage are added to.
+    """
+    basename = os.path.basename(pdf_path)
+    owns_context = context is None
+    if owns_context:
+        context = create_study_context(StudyFile(pdf_path, index=UPLOAD_INDEX, limiter=RATE_LIMITER,
+                                                 poller=FILE_POLLER))
+    
+    try:
+        return RETRY_POLICY.call(_extract_once, pdf_path, prompt, context, response_schema, timings, tokens,
+                                 label=basename)
+    except (InvalidResponseError, CassetteMissError) as e:
+        print(f"[{basename}] Error: {e}")
+        return None
     except Exception as e:
-        print(f"[{os.path.basename(pdf_path)}] API Error: {e}")
+        print(f"[{basename}] API Error: {e}")
         return None
+    finally:
+        if owns_context:
+            context.release()
+            context.study_file.release()
 
-def compare_extractions(pass1_data, pass2_data, source_file):
+def compare_extractions(pass1_data, pass2_data, source_file, verified_fields=None):
     """
     Compare two extraction passes field-by-field.
+    With verified_fields (an adaptive, partial pass 2), only those fields are
+    cross-checked; every other field keeps its Pass 1 value.
     Returns (merged_data, discrepancies, justifications).
     """
     if not pass1_data and not pass2_data:
@@ -158,6 +371,11 @@ def compare_extractions(pass1_data, pass2_data, source_file):
         v1 = pass1_data.get(key)
         v2 = pass2_data.get(key)
         
+        if verified_fields is not None and key not in verified_fields:
+            # Not re-extracted in the partial Pass 2
+            merged[key] = v1
+            continue
+        
         # Collect justifications from Pass 2
         justification_key = f"{key}_justification"
         if justification_key in pass2_data:
@@ -209,10 +427,312 @@ def compare_extractions(pass1_data, pass2_data, source_file):
     
     return merged, discrepancies, justifications
 
+def extract_pass(pdf_path, requests, context=None, timings=None, tokens=None):
+    """
+    Run one extraction pass made of one or more field shards.
+    Shards are extracted concurrently over the same upload and merged into one
+    row. Returns None only if every shard failed.
+    timings and tokens are optional dicts the pass's stage durations and
+    token usage are summed into.
+    """
+    if len(requests) == 1:
+        prompt, schema = requests[0]
+        return extract_study_with_api(pdf_path, prompt, context, schema, timings, tokens)
+    
+    with ThreadPoolExecutor(max_workers=len(requests)) as shard_executor:
+        futures = [
+            shard_executor.submit(extract_study_with_api, pdf_path, prompt, context, schema, timings, tokens)
+            for prompt, schema in requests
+        ]
+        results = [future.result() for future in futures]
+    
+    succeeded = [r for r in results if r]
+    if not succeeded:
+        return None
+    if len(succeeded) < len(results):
+        print(f"[{os.path.basename(pdf_path)}] {len(results) - len(succeeded)}/{len(results)} field shards failed; keeping the rest")
+    merged = {}
+    for result in succeeded:
+        merged.update(result)
+    return merged
 
-def main(api_key, limit=None, template_path=None, dual_pass=True):
-    # Configure API
-    genai.configure(api_key=api_key)
+def start_study(pdf_path, prepared=None, requests=()):
+    """
+    Upload stage: set up a study and start its upload.
+    prepared is an optional pdf_text.preprocess_pdf result; when it has text,
+    that is sent instead of uploading the PDF, and a trimmed PDF (page filter)
+    is uploaded in place of the original.
+    requests are the (prompt, response_schema) requests the study will send;
+    when the response cache or replayed cassette answers all of them, nothing
+    is uploaded (a later miss, e.g. an adaptive pass 2, uploads on demand).
+    Returns the study's job dict, handed from stage to stage.
+    """
+    basename = os.path.basename(pdf_path)
+    print(f"\n--- Processing: {basename} ---")
+    
+    preprocessed = prepared or {}
+    pages_kept, pages_total = preprocessed.get('pages_kept'), preprocessed.get('pages_total')
+    if prepared is not None and pages_total is None:
+        print(f"  [{basename}] No usable text layer (scanned?); uploading full PDF")
+    elif pages_total is not None and pages_kept < pages_total:
+        print(f"  [{basename}] Page filter: sending {pages_kept}/{pages_total} pages")
+    
+    job = {
+        'pdf_path': pdf_path,
+        'started': time.perf_counter(),
+        'text': preprocessed.get('text'),
+        'pages_kept': pages_kept,
+        'pages_total': pages_total,
+        'timings': {},
+        'tokens': {},
+        # One upload (and cached context) serves pass 1, pass 2, shards and
+        # retries; released when the passes are done
+        'study_file': StudyFile(pdf_path, index=UPLOAD_INDEX, limiter=RATE_LIMITER,
+                                upload_path=preprocessed.get('upload_path'), poller=FILE_POLLER),
+    }
+    job['answered_locally'] = bool(requests) and answered_locally(
+        create_study_context(job['study_file'], job['text']), requests)
+    if job['answered_locally']:
+        print(f"  [{basename}] All responses cached; not uploading")
+    elif job['text'] is None:
+        try:
+            job['study_file'].upload()
+        except Exception as e:
+            # Not fatal: the first pass retries the upload under RETRY_POLICY
+            print(f"  [{basename}] Upload failed, retrying at extraction: {e}")
+    return job
+
+def wait_for_upload(job):
+    """Processing stage: wait until the uploaded file is ACTIVE."""
+    if job['text'] is None and not job['answered_locally']:
+        try:
+            job['study_file'].get()
+        except Exception as e:
+            print(f"  [{os.path.basename(job['pdf_path'])}] Upload failed, retrying at extraction: {e}")
+    return job
+
+def run_passes(job, pass1_requests, pass2_requests, dual_pass=True, parallel_passes=True, adaptive=False):
+    """
+    Generate stage: run the extraction passes for a single study.
+    Each pass is a list of (prompt, response_schema) requests from create_pass_requests.
+    With parallel_passes, pass 1 and pass 2 are sent at the same time; otherwise
+    pass 2 only runs once pass 1 has succeeded.
+    With adaptive, pass 2 runs after pass 1 and re-extracts only the fields
+    chosen by select_fields_for_verification.
+    Adds data1, data2, verified_fields and input to the job, and each pass's
+    stage durations and token usage to job['timings'] and job['tokens'].
+    """
+    pdf_path = job['pdf_path']
+    basename = os.path.basename(pdf_path)
+    verified_fields = None  # None = pass 2 covered the whole template
+    timings1 = job['timings'].setdefault('pass1', {})
+    timings2 = job['timings'].setdefault('pass2', {})
+    tokens1 = job['tokens'].setdefault('pass1', empty_usage())
+    tokens2 = job['tokens'].setdefault('pass2', empty_usage())
+    
+    with job['study_file'] as study_file, create_study_context(study_file, job['text']) as context:
+        if dual_pass and parallel_passes and not adaptive:
+            # Pass 2 does not depend on pass 1's output, so both run concurrently
+            print(f"  [{basename}] [Pass 1 + Pass 2] Extracting in parallel...")
+            with ThreadPoolExecutor(max_workers=2) as pass_executor:
+                future1 = pass_executor.submit(extract_pass, pdf_path, pass1_requests, context, timings1, tokens1)
+                future2 = pass_executor.submit(extract_pass, pdf_path, pass2_requests, context, timings2, tokens2)
+                data1 = future1.result()
+                data2 = future2.result()
+        else:
+            # Pass 1
+            print(f"  [{basename}] [Pass 1] Extracting...")
+            data1 = extract_pass(pdf_path, pass1_requests, context, timings1, tokens1)
+            data2 = None
+            
+            if dual_pass and data1 and adaptive:
+                # Pass 2 only re-extracts fields that need verification
+                fields = select_fields_for_verification(data1)
+                verified_fields = {field.name for field in fields}
+                print(f"  [{basename}] [Pass 2] Verifying {len(fields)}/{len(TEMPLATE_FIELDS)} fields...")
+                if fields:
+                    data2 = extract_pass(pdf_path, create_pass_requests(2, fields), context, timings2, tokens2)
+                else:
+                    data2 = {}
+            elif dual_pass and data1:
+                # Pass 2 (independent, different prompt strategy)
+                print(f"  [{basename}] [Pass 2] Independent re-extraction...")
+                data2 = extract_pass(pdf_path, pass2_requests, context, timings2, tokens2)
+        source = context.source
+    
+    job.update({'data1': data1, 'data2': data2, 'verified_fields': verified_fields, 'input': source})
+    return job
+
+def finish_study(job, dual_pass=True):
+    """
+    Parse/compare stage: merge the passes of a study.
+    Returns a dict with the merged row, discrepancies, justifications and audit entry.
+    """
+    basename = os.path.basename(job['pdf_path'])
+    data1, data2, verified_fields = job['data1'], job['data2'], job['verified_fields']
+    discrepancies = []
+    justifications = []
+    
+    timings = job['timings']
+    study_file = job['study_file']
+    if study_file.upload_time:
+        STAGE_TIMER.add('upload', study_file.upload_time, timings)
+    if job['text'] is None and (not job['answered_locally'] or study_file.processing_wait):
+        STAGE_TIMER.add('processing_wait', study_file.processing_wait, timings)
+    
+    tokens = job['tokens']
+    study_tokens = empty_usage()
+    for pass_tokens in tokens.values():
+        merge_usage(study_tokens, pass_tokens)
+    tokens['total'] = study_tokens
+    tokens['estimated_cost_usd'] = estimate_cost(study_tokens, MODEL_NAME)
+    
+    if dual_pass and (data1 or data2):
+        # Compare passes
+        with STAGE_TIMER.time('compare', timings):
+            merged, discrepancies, justifications = compare_extractions(data1, data2, basename, verified_fields)
+        
+        n_critical = sum(1 for d in discrepancies if d['Severity'] == 'CRITICAL')
+        n_minor = sum(1 for d in discrepancies if d['Severity'] == 'MINOR')
+        if data1 is None or data2 is None:
+            print(f"  [{basename}] ⚠️ Only Pass {1 if data1 else 2} succeeded (no cross-check)")
+        elif discrepancies:
+            print(f"  [{basename}] ⚠️ {len(discrepancies)} discrepancies ({n_critical} critical, {n_minor} minor)")
+        else:
+            print(f"  [{basename}] ✅ Both passes agree")
+        
+        audit = {
+            'source_file': basename,
+            'pass1_extracted': data1 is not None,
+            'pass2_extracted': data2 is not None,
+            'input': job['input'],
+            'pages_sent': job['pages_kept'],
+            'pages_total': job['pages_total'],
+            'processing_polls': study_file.polls,
+            'timings': timings,
+            'tokens': tokens,
+            'pass2_fields': (len(verified_fields) if verified_fields is not None
+                             else len(TEMPLATE_FIELDS) if data2 is not None else 0),
+            'discrepancies': len(discrepancies),
+            'critical_discrepancies': n_critical,
+            'justifications': justifications
+        }
+        
+        data = merged
+    else:
+        data = data1
+        if data:
+            data['Source File'] = basename
+        audit = {
+            'source_file': basename,
+            'pass1_extracted': data is not None,
+            'pass2_extracted': False,
+            'input': job['input'],
+            'pages_sent': job['pages_kept'],
+            'pages_total': job['pages_total'],
+            'processing_polls': study_file.polls,
+            'timings': timings,
+            'tokens': tokens,
+            'pass2_fields': 0,
+            'discrepancies': 0,
+            'critical_discrepancies': 0,
+            'justifications': []
+        }
+    
+    return {
+        'data': data,
+        'discrepancies': discrepancies,
+        'justifications': justifications,
+        'audit': audit,
+        'started': job['started']
+    }
+
+def save_study_row(journal, data):
+    """Append one extracted study to the result journal, aligned to the template columns."""
+    row = {'Source File': data.get('Source File')}
+    for c in ALL_COLUMNS:
+        row[c] = data.get(c)
+    journal.append(row)
+
+def export_results(template_path=None):
+    """Materialize OUTPUT_FILE from the result journal."""
+    load_template(template_path or DEFAULT_TEMPLATE)
+    journal = ResultJournal(JOURNAL_FILE, legacy_excel=OUTPUT_FILE)
+    n_rows = export_to_excel(journal, OUTPUT_FILE, ALL_COLUMNS)
+    print(f"📊 Exported {n_rows} rows from {JOURNAL_FILE} to {OUTPUT_FILE}")
+
+
+def main(api_key, limit=None, template_path=None, dual_pass=True, workers=1, parallel_passes=True,
+         upload_index=True, use_cache=True, cache_dir=DEFAULT_CACHE_DIR, cache_max_bytes=DEFAULT_MAX_BYTES,
+         rpm=DEFAULT_RPM, tpm=DEFAULT_TPM, max_attempts=5, stream=False, use_schema=True,
+         shard_size=0, context_cache=False, adaptive=False, local_text=False, page_filter=False, prefetch=1,
+         processing_timeout=DEFAULT_PROCESSING_TIMEOUT, transport=DEFAULT_TRANSPORT,
+         max_connections=DEFAULT_MAX_CONNECTIONS, keepalive=DEFAULT_KEEPALIVE, backend=None,
+         record=None, replay=None, replay_latency='original', rpd=0, tpd=0, quota_policy='stop',
+         quota_ledger=DEFAULT_LEDGER_FILE):
+    global UPLOAD_INDEX, RESPONSE_CACHE, RATE_LIMITER, RETRY_POLICY, STREAM_RESPONSES, CONTEXT_CACHING
+    global SHARD_SIZE, USE_SCHEMA, FILE_POLLER, STAGE_TIMER, USAGE_TRACKER, CASSETTE
+    
+    # Record every model response to a cassette, or serve them from one
+    try:
+        if record:
+            CASSETTE = Cassette(record, mode='record')
+        elif replay:
+            CASSETTE = Cassette(replay, mode='replay', latency=replay_latency)
+        else:
+            CASSETTE = None
+    except OSError as e:
+        print(f"Error opening cassette: {e}")
+        return
+    if CASSETTE is not None:
+        # Cached responses would bypass the cassette
+        use_cache = False
+    if CASSETTE is not None and CASSETTE.replaying:
+        print(f"Replaying {CASSETTE.path} ({replay_latency} latency); no API calls are made")
+        # Uploads go to a local stand-in; their fake files must not enter the upload index
+        upload_index = False
+        if backend is None:
+            no_wait = Latency('fixed', 0.0)
+            backend = FakeBackend(upload_latency=no_wait, processing_latency=no_wait, status_latency=no_wait)
+    
+    # Configure API (one shared, kept-alive transport for all workers), or use
+    # the given backend (e.g. backends.FakeBackend for offline benchmarks).
+    # Several keys (a list for api_key) are pooled, each with its own clients
+    api_keys = [api_key] if isinstance(api_key, str) else list(api_key or [])
+    labels = {key: f"key{n} ({mask_key(key)})" for n, key in enumerate(api_keys, start=1)}
+    # Daily caps of the real keys, counted in a ledger shared across runs
+    ledger = None
+    quotas = {}
+    if backend is None and api_keys and (rpd or tpd):
+        ledger = QuotaLedger(quota_ledger)
+        quotas = {labels[key]: DailyQuota(ledger, key_id(key), rpd=rpd, tpd=tpd, policy=quota_policy,
+                                          label=labels[key])
+                  for key in api_keys}
+    if backend is None and len(api_keys) > 1:
+        backend = KeyPool({labels[key]: create_key_backend(key, transport, max_connections, keepalive)
+                           for key in api_keys}, rpm=rpm, tpm=tpm, quotas=quotas)
+    elif backend is None:
+        configure_client(api_keys[0] if api_keys else None, transport, max_connections, keepalive)
+        backend = GeminiBackend()
+    set_backend(backend)
+    key_pool = backend if isinstance(backend, KeyPool) else None
+    
+    # Reuse files uploaded by earlier runs while they are still live
+    UPLOAD_INDEX = UploadIndex(UPLOAD_INDEX_FILE) if upload_index else None
+    RESPONSE_CACHE = ResponseCache(cache_dir, cache_max_bytes) if use_cache else None
+    # A key pool limits each key to rpm/tpm (and its daily quota) itself
+    RATE_LIMITER = (RateLimiter(rpm=rpm, tpm=tpm, quota=next(iter(quotas.values()), None))
+                    if key_pool is None else RateLimiter())
+    RETRY_POLICY = RetryPolicy(max_attempts=max_attempts)
+    FILE_POLLER = FilePoller(timeout=processing_timeout)
+    if key_pool is not None:
+        key_pool.poller = FILE_POLLER
+    STAGE_TIMER = StageTimer()
+    USAGE_TRACKER = UsageTracker()
+    STREAM_RESPONSES = stream
+    CONTEXT_CACHING = context_cache
+    SHARD_SIZE = shard_size
+    USE_SCHEMA = use_schema
     
     # Load Template
     if template_path is None:
@@ -229,17 +749,11 @@ def main(api_key, limit=None, template_path=None, dual_pass=True):
         print(f"Error: Directory {ARTICLES_DIR} does not exist.")
         return
 
-    pdf_files = [os.path.join(ARTICLES_DIR, f) for f in os.listdir(ARTICLES_DIR) if f.lower().endswith('.pdf')]
+    pdf_files = [os.path.join(ARTICLES_DIR, f) for f in sorted(os.listdir(ARTICLES_DIR)) if f.lower().endswith('.pdf')]
     
-    # Filter processed
-    processed_files = set()
-    if os.path.exists(OUTPUT_FILE):
-        try:
-            df_existing = pd.read_excel(OUTPUT_FILE)
-            if 'Source File' in df_existing.columns:
-                processed_files = set(df_existing['Source File'].astype(str).tolist())
-        except:
-            pass
+    # Filter processed (the journal is the durable record; older .xlsx output is imported once)
+    journal = ResultJournal(JOURNAL_FILE, legacy_excel=OUTPUT_FILE)
+    processed_files = journal.processed_sources()
 
     files_to_process = [f for f in pdf_files if os.path.basename(f) not in processed_files]
     
@@ -253,101 +767,125 @@ def main(api_key, limit=None, template_path=None, dual_pass=True):
     print(f"Found {len(pdf_files)} total. {len(files_to_process)} to process.")
     if dual_pass:
         print("Mode: Cross-agent redundancy (two independent extraction passes)")
+        if adaptive:
+            print("Passes: adaptive (pass 2 re-extracts only empty and numeric fields)")
+        else:
+            print(f"Passes: {'parallel' if parallel_passes else 'sequential (pass 2 skipped if pass 1 fails)'}")
+    print(f"Workers: {workers} per stage, {prefetch} queued between stages "
+          f"(rate limit: {rpm or 'unlimited'} RPM, {tpm or 'unlimited'} TPM"
+          f"{f' per key, {len(key_pool.keys)} keys' if key_pool is not None else ''})")
+    for quota in quotas.values():
+        left = quota.remaining()
+        budget = [f"{left[unit]:,} {unit}" for unit in ('requests', 'tokens') if left[unit] != float('inf')]
+        print(f"Daily quota of {quota.label}: {', '.join(budget)} left today "
+              f"(UTC; policy: {quota_policy}, ledger: {quota_ledger})")
     
-    prompt_pass1 = create_prompt(pass_num=1)
-    prompt_pass2 = create_prompt(pass_num=2) if dual_pass else None
+    pass1_requests = create_pass_requests(1)
+    pass2_requests = create_pass_requests(2) if dual_pass else None
+    if len(pass1_requests) > 1:
+        print(f"Field sharding: {len(pass1_requests)} shards of up to {shard_size} fields per pass")
     
     all_discrepancies = []
     all_justifications = []
     audit_entries = []
 
-    for pdf_path in files_to_process:
-        basename = os.path.basename(pdf_path)
-        print(f"\n--- Processing: {basename} ---")
-        
-        # Pass 1
-        print(f"  [Pass 1] Extracting...")
-        data1 = extract_study_with_api(pdf_path, prompt_pass1)
-        if data1 == "RETRY":
-            data1 = extract_study_with_api(pdf_path, prompt_pass1)  # One more try
-        if data1 == "RETRY":
-            data1 = None
-        
-        if dual_pass and data1:
-            # Pass 2 (independent, different prompt strategy)
-            print(f"  [Pass 2] Independent re-extraction...")
-            time.sleep(4)  # Rate limit safety
-            data2 = extract_study_with_api(pdf_path, prompt_pass2)
-            if data2 == "RETRY":
-                data2 = extract_study_with_api(pdf_path, prompt_pass2)
-            if data2 == "RETRY":
-                data2 = None
-            
-            # Compare passes
-            merged, discrepancies, justifications = compare_extractions(data1, data2, basename)
-            all_discrepancies.extend(discrepancies)
-            all_justifications.extend(justifications)
-            
-            n_critical = sum(1 for d in discrepancies if d['Severity'] == 'CRITICAL')
-            n_minor = sum(1 for d in discrepancies if d['Severity'] == 'MINOR')
-            if discrepancies:
-                print(f"  ⚠️ {len(discrepancies)} discrepancies ({n_critical} critical, {n_minor} minor)")
+    # Local text extraction and page filtering are CPU-bound, so they run in a
+    # process pool and overlap with the API work of studies already in flight
+    if (local_text or page_filter) and not pdf_text.is_available():
+        print("Warning: --local-text/--page-filter need the 'pypdf' package; uploading full PDFs instead.")
+        local_text = page_filter = False
+    vocabulary = pdf_text.field_vocabulary(TEMPLATE_FIELDS) if page_filter else None
+    trim_dir = tempfile.mkdtemp(prefix='trimmed_pdfs_') if page_filter and not local_text else None
+    if page_filter:
+        print(f"Page filter: scoring pages against {len(vocabulary)} template keywords")
+    text_workers = os.cpu_count() or 1
+    text_pool = ProcessPoolExecutor(max_workers=text_workers) if local_text or page_filter else None
+    
+    # Studies flow through upload -> processing wait -> generate -> compare stages
+    # connected by bounded queues, so study k+1 uploads while study k generates.
+    # Results come back in submission order so the output rows (and therefore
+    # resume state) match the sorted file list; writing happens here.
+    n_workers = max(1, int(workers))
+    # Requests known before pass 1 (an adaptive pass 2 depends on its output)
+    study_requests = pass1_requests + (pass2_requests if dual_pass and not adaptive else [])
+    stages = [
+        Stage('upload', lambda item: start_study(*item, requests=study_requests), workers=n_workers),
+        Stage('wait', wait_for_upload, workers=n_workers),
+        Stage('generate', lambda job: run_passes(job, pass1_requests, pass2_requests, dual_pass,
+                                                 parallel_passes, adaptive), workers=n_workers),
+        Stage('compare', lambda job: finish_study(job, dual_pass)),
+    ]
+    if text_pool is not None:
+        def preprocess(item):
+            pdf_path, _ = item
+            future = text_pool.submit(pdf_text.preprocess_pdf, pdf_path, vocabulary, local_text, trim_dir)
+            return pdf_path, future.result()
+        stages.insert(0, Stage('preprocess', preprocess, workers=text_workers))
+    progress = {'fed': 0, 'done': 0, 'held_back': 0}
+
+    def discover():
+        # With the 'stop' policy, only start studies (and upload their PDFs)
+        # while the keys' remaining daily budget covers them and those in flight
+        requests_per_study = len(pass1_requests) + len(pass2_requests or [])
+        for n, pdf_path in enumerate(files_to_process):
+            if quotas and quota_policy == 'stop':
+                done = progress['done']
+                tokens_per_study = USAGE_TRACKER.totals()['total_tokens'] / done if done else 0
+                in_flight = progress['fed'] - done
+                if not budget_allows(list(quotas.values()), (in_flight + 1) * requests_per_study,
+                                     (in_flight + 1) * tokens_per_study):
+                    progress['held_back'] = len(files_to_process) - n
+                    return
+            progress['fed'] += 1
+            yield pdf_path, None
+
+    # An unexpected error stops the run, but what was done so far is still
+    # exported, logged and counted against the daily quota
+    run_error = None
+    try:
+        for pdf_path, result in zip(files_to_process, run_pipeline(discover(), stages, queue_size=prefetch)):
+            progress['done'] += 1
+            basename = os.path.basename(pdf_path)
+            all_discrepancies.extend(result['discrepancies'])
+            all_justifications.extend(result['justifications'])
+            audit_entries.append(result['audit'])
+
+            if result['data']:
+                with STAGE_TIMER.time('write', result['audit']['timings']):
+                    save_study_row(journal, result['data'])
+                print(f"  💾 Saved {basename}")
             else:
-                print(f"  ✅ Both passes agree")
-            
-            audit_entries.append({
-                'source_file': basename,
-                'pass1_extracted': data1 is not None,
-                'pass2_extracted': data2 is not None,
-                'discrepancies': len(discrepancies),
-                'critical_discrepancies': n_critical,
-                'justifications': justifications
-            })
-            
-            data = merged
-        else:
-            data = data1
-            if data:
-                data['Source File'] = basename
-            audit_entries.append({
-                'source_file': basename,
-                'pass1_extracted': data is not None,
-                'pass2_extracted': False,
-                'discrepancies': 0,
-                'critical_discrepancies': 0,
-                'justifications': []
-            })
-        
-        if data:
-            # Save Incrementally
-            df = pd.DataFrame([data])
-            # Ensure all columns
-            for c in ALL_COLUMNS:
-                if c not in df.columns: df[c] = None
-            
-            # Reorder
-            cols = ['Source File'] + [c for c in ALL_COLUMNS if c in df.columns]
-            df = df[cols]
-            
-            if os.path.exists(OUTPUT_FILE):
-                existing = pd.read_excel(OUTPUT_FILE)
-                df = pd.concat([existing, df], ignore_index=True)
-            
-            df.to_excel(OUTPUT_FILE, index=False)
-            print(f"  💾 Saved {basename}")
-            
-            # Rate Limit Safety
-            time.sleep(4) 
-        else:
-            print(f"  ❌ Failed to extract {basename}")
+                print(f"  ❌ Failed to extract {basename}")
+            # End-to-end latency: from the start of the upload stage until written
+            STAGE_TIMER.add('study', time.perf_counter() - result['started'], result['audit']['timings'])
+    except (Exception, KeyboardInterrupt) as e:
+        run_error = e
+        print(f"\n❌ Run stopped after {progress['done']} studies: {e!r}")
+    if progress['held_back']:
+        print(f"\n⏸️ Daily quota reached: {progress['held_back']} studies left for the next UTC day "
+              "(rerun to resume)")
+    if ledger is not None:
+        ledger.save()
+    if text_pool is not None:
+        text_pool.shutdown()
+    if trim_dir is not None:
+        shutil.rmtree(trim_dir, ignore_errors=True)
+    
+    # Materialize the workbook once, instead of rewriting it after every study
+    with STAGE_TIMER.time('export'):
+        n_rows = export_to_excel(journal, OUTPUT_FILE, ALL_COLUMNS)
+    if n_rows:
+        print(f"\n📊 {n_rows} rows written to: {OUTPUT_FILE}")
     
     # Save discrepancies
     if all_discrepancies:
         disc_df = pd.DataFrame(all_discrepancies)
-        disc_df.to_excel(DISCREPANCY_FILE, index=False)
+        with STAGE_TIMER.time('export'):
+            disc_df.to_excel(DISCREPANCY_FILE, index=False)
         print(f"\n⚠️ Extraction discrepancies saved to: {DISCREPANCY_FILE}")
     
     # Save audit log
+    total_tokens = USAGE_TRACKER.totals()
     total_critical = sum(e['critical_discrepancies'] for e in audit_entries)
     total_justifications = sum(len(e['justifications']) for e in audit_entries)
     
@@ -355,18 +893,34 @@ def main(api_key, limit=None, template_path=None, dual_pass=True):
         'timestamp': datetime.now().isoformat(),
         'template': template_path,
         'model': MODEL_NAME,
+        'backend': backend.name,
         'dual_pass': dual_pass,
         'summary': {
-            'files_processed': len(files_to_process),
-            'files_extracted': sum(1 for e in audit_entries if e['pass1_extracted']),
+            'files_processed': progress['done'],
+            'files_extracted': sum(1 for e in audit_entries if e['pass1_extracted'] or e['pass2_extracted']),
             'total_discrepancies': len(all_discrepancies),
             'critical_discrepancies': total_critical,
-            'justification_logs': total_justifications
+            'justification_logs': total_justifications,
+            'processing_polls': FILE_POLLER.total_polls,
+            'batched_processing_polls': FILE_POLLER.batch_polls,
+            'timings': STAGE_TIMER.summary(),
+            'tokens': total_tokens,
+            'estimated_cost_usd': estimate_cost(total_tokens, MODEL_NAME),
+            'error': repr(run_error) if run_error is not None else None,
+            'pricing_per_1m_tokens_usd': model_pricing(MODEL_NAME)
         },
         'entries': audit_entries,
         'discrepancies': all_discrepancies,
         'justifications': all_justifications
     }
+    if key_pool is not None:
+        audit_output['summary']['api_keys'] = key_pool.stats()
+    if quotas:
+        audit_output['summary']['daily_quota'] = [quota.stats() for quota in quotas.values()]
+        audit_output['summary']['studies_held_back'] = progress['held_back']
+    if CASSETTE is not None:
+        CASSETTE.close()
+        audit_output['cassette'] = CASSETTE.stats()
     with open(AUDIT_LOG_FILE, 'w', encoding='utf-8') as f:
         json.dump(audit_output, f, indent=2, ensure_ascii=False)
     print(f"📝 Audit log saved to: {AUDIT_LOG_FILE}")
@@ -374,22 +928,159 @@ def main(api_key, limit=None, template_path=None, dual_pass=True):
     print(f"\n{'='*60}")
     print("EXTRACTION SUMMARY")
     print(f"{'='*60}")
-    print(f"Files processed:        {len(files_to_process)}")
-    print(f"Successfully extracted:  {sum(1 for e in audit_entries if e['pass1_extracted'])}")
+    print(f"Files processed:        {progress['done']}")
+    print(f"Successfully extracted:  {sum(1 for e in audit_entries if e['pass1_extracted'] or e['pass2_extracted'])}")
     if dual_pass:
         print(f"Total discrepancies:    {len(all_discrepancies)}")
         print(f"Critical discrepancies: {total_critical}")
         print(f"Justification logs:     {total_justifications}")
     print(f"{'='*60}")
+    print(f"Tokens:                 {total_tokens['total_tokens']:,} "
+          f"({total_tokens['prompt_tokens']:,} prompt, {total_tokens['cached_tokens']:,} cached, "
+          f"{total_tokens['candidates_tokens']:,} output) in {total_tokens['requests']} requests")
+    cost = estimate_cost(total_tokens, MODEL_NAME)
+    cost_label = f"${cost:.4f}" if cost is not None else f"unknown (no pricing for {MODEL_NAME})"
+    print(f"Estimated cost:         {cost_label}")
+    if key_pool is not None:
+        for key_stats in key_pool.stats():
+            print(f"API key {key_stats['key']}: {key_stats['tokens']['requests']} requests, "
+                  f"{key_stats['uploads']} uploads, {key_stats['rate_limited']} rate limited, "
+                  f"{key_stats['failovers']} failed over{' (daily quota used up)' if key_stats['exhausted'] else ''}")
+    for quota in quotas.values():
+        quota_stats = quota.stats()
+        print(f"Daily quota {quota.label}: {quota_stats['requests']}/{quota.rpd or 'unlimited'} requests, "
+              f"{quota_stats['tokens']:,}/{quota.tpd or 'unlimited'} tokens today (UTC)"
+              f"{' (used up)' if quota_stats['exhausted'] else ''}")
+    if CASSETTE is not None and CASSETTE.replaying:
+        print(f"Cassette:               {CASSETTE.replayed} responses replayed, {CASSETTE.misses} not recorded")
+    elif CASSETTE is not None:
+        print(f"Cassette:               {CASSETTE.recorded} responses recorded to {CASSETTE.path}")
+    print(f"{'='*60}")
+    if audit_entries:
+        print("STAGE TIMINGS")
+        print(STAGE_TIMER.report())
+        print(f"{'='*60}")
+    if run_error is not None:
+        raise run_error
     print("Extraction Complete.")
 
 if __name__ == "__main__":
     parser = argparse.ArgumentParser(description="Extract data using Gemini API with dual-pass redundancy")
-    parser.add_argument("--key", help="Gemini API Key", required=True)
+    parser.add_argument("--key", nargs='+',
+                        help="Gemini API key(s); with several keys, requests are spread across them "
+                             "(required unless --key-file, --export, --replay or --backend fake)")
+    parser.add_argument("--key-file",
+                        help="File with one Gemini API key per line, pooled with any --key values")
     parser.add_argument("--template", help="Path to template file", default=DEFAULT_TEMPLATE)
     parser.add_argument("--limit", help="Limit number of files", default=None)
     parser.add_argument("--single-pass", action="store_true",
                         help="Run single pass only (skip cross-agent redundancy)")
+    parser.add_argument("--workers", type=int, default=1,
+                        help="Number of studies to extract concurrently (default: 1)")
+    parser.add_argument("--prefetch", type=int, default=1,
+                        help="Studies queued between pipeline stages, i.e. how far uploads may run ahead of "
+                             "generation (default: %(default)s)")
+    parser.add_argument("--sequential-passes", action="store_true",
+                        help="Run pass 2 only after pass 1 succeeds instead of sending both at once")
+    parser.add_argument("--no-upload-index", action="store_true",
+                        help=f"Don't reuse uploads from earlier runs (delete each file after its study instead of indexing it in {UPLOAD_INDEX_FILE})")
+    parser.add_argument("--no-cache", action="store_true",
+                        help="Always call the model instead of reusing cached responses")
+    parser.add_argument("--cache-dir", default=DEFAULT_CACHE_DIR,
+                        help=f"Directory for the response cache (default: {DEFAULT_CACHE_DIR})")
+    parser.add_argument("--cache-max-mb", type=int, default=DEFAULT_MAX_BYTES // (1024 * 1024),
+                        help="Evict least-recently-used responses beyond this size (default: %(default)s)")
+    parser.add_argument("--rpm", type=float, default=DEFAULT_RPM,
+                        help="Requests per minute allowed by your quota (default: %(default)s; 0 = unlimited)")
+    parser.add_argument("--tpm", type=float, default=DEFAULT_TPM,
+                        help="Tokens per minute allowed by your quota (default: %(default)s; 0 = unlimited)")
+    parser.add_argument("--rpd", type=int, default=0,
+                        help=f"Requests per UTC day allowed per key, tracked across runs (e.g. {FREE_TIER_RPD} "
+                             "on the free tier; default: 0 = unlimited, no ledger)")
+    parser.add_argument("--tpd", type=int, default=0,
+                        help="Tokens per UTC day allowed per key, tracked across runs (default: 0 = unlimited, no ledger)")
+    parser.add_argument("--quota-policy", choices=QUOTA_POLICIES, default='stop',
+                        help="When the daily budget runs short: 'stop' starting new studies (resume tomorrow), "
+                             "or 'pace' requests to last until the UTC day ends (default: %(default)s)")
+    parser.add_argument("--quota-ledger", default=DEFAULT_LEDGER_FILE,
+                        help="File recording each key's daily usage across runs (default: %(default)s)")
+    parser.add_argument("--max-attempts", type=int, default=5,
+                        help="Attempts per pass for transient errors, with jittered exponential backoff (default: %(default)s)")
+    parser.add_argument("--stream", action="store_true",
+                        help=f"Stream responses, aborting early on malformed JSON and logging fields to {STREAM_LOG_FILE} as they arrive")
+    parser.add_argument("--no-schema", action="store_true",
+                        help="Don't constrain output with a response_schema built from the template")
+    parser.add_argument("--shard-fields", type=int, default=0,
+                        help="Split the template by section into concurrent prompts of at most N fields (default: 0 = one prompt)")
+    parser.add_argument("--context-cache", action="store_true",
+                        help="Cache each uploaded PDF as Gemini cached content shared by all passes and shards "
+                             "(falls back to sending the file inline when the model/document is not eligible)")
+    parser.add_argument("--adaptive-pass2", action="store_true",
+                        help="Run pass 2 after pass 1 and re-extract only empty and numeric fields")
+    parser.add_argument("--local-text", action="store_true",
+                        help="Extract the PDF text layer locally (needs pypdf) and send text instead of uploading; "
+                             "scanned PDFs are still uploaded")
+    parser.add_argument("--page-filter", action="store_true",
+                        help="Send only pages relevant to the template (drops references, appendices and "
+                             "figure-only pages); uploads a trimmed PDF, or trimmed text with --local-text")
+    parser.add_argument("--processing-timeout", type=float, default=DEFAULT_PROCESSING_TIMEOUT,
+                        help="Give up on an upload still processing server-side after this many seconds "
+                             "(default: %(default)s)")
+    parser.add_argument("--transport", choices=['grpc', 'rest'], default=DEFAULT_TRANSPORT,
+                        help="API transport shared by all workers (default: %(default)s)")
+    parser.add_argument("--max-connections", type=int, default=DEFAULT_MAX_CONNECTIONS,
+                        help="Keep-alive connection pool size for --transport rest (default: %(default)s)")
+    parser.add_argument("--keepalive", type=float, default=DEFAULT_KEEPALIVE,
+                        help="Seconds between keep-alive pings on the gRPC channel (default: %(default)s; 0 = off)")
+    parser.add_argument("--backend", choices=['gemini', 'fake'], default='gemini',
+                        help="'fake' answers locally with canned JSON (no API key or network), for "
+                             "benchmarking the pipeline (default: %(default)s)")
+    parser.add_argument("--fake-latency", type=Latency.parse, default=Latency('lognormal', 4.0, 0.4),
+                        help="Fake backend generate latency as kind:mean[:spread], kind one of "
+                             f"{', '.join(Latency.KINDS)} (default: lognormal:4:0.4)")
+    parser.add_argument("--fake-error-rate", type=float, default=0.0,
+                        help="Fraction of fake generate calls that fail with 429 (default: %(default)s)")
+    parser.add_argument("--fake-time-scale", type=float, default=1.0,
+                        help="Multiplier for every fake latency (default: %(default)s)")
+    parser.add_argument("--record", metavar="CASSETTE",
+                        help="Record every model response (with its request fingerprint, usage and latency) "
+                             "to a gzipped JSON Lines cassette")
+    parser.add_argument("--replay", metavar="CASSETTE",
+                        help="Serve model responses from a recorded cassette instead of the API (no API key needed)")
+    parser.add_argument("--replay-latency", choices=['original', 'zero'], default='original',
+                        help="Wait as long as each recorded call took, or answer immediately (default: %(default)s)")
+    parser.add_argument("--export", action="store_true",
+                        help=f"Only write {OUTPUT_FILE} from the result journal ({JOURNAL_FILE}) and exit")
     args = parser.parse_args()
     
-    main(args.key, args.limit, args.template, dual_pass=not args.single_pass)
+    if args.export:
+        export_results(args.template)
+    elif args.record and args.replay:
+        parser.error("--record and --replay can't be combined")
+    else:
+        try:
+            keys = load_keys(args.key, args.key_file)
+        except OSError as e:
+            parser.error(f"can't read --key-file: {e}")
+        if not keys and args.backend != 'fake' and not args.replay:
+            parser.error("--key or --key-file is required")
+        backend = None
+        if args.backend == 'fake':
+            fakes = {f"key{n}": FakeBackend(generate_latency=args.fake_latency, error_rate=args.fake_error_rate,
+                                            time_scale=args.fake_time_scale)
+                     for n in range(1, max(1, len(keys)) + 1)}
+            # Several keys: an offline pool, e.g. to try failover with --fake-error-rate
+            backend = (KeyPool(fakes, rpm=args.rpm, tpm=args.tpm) if len(fakes) > 1
+                       else fakes['key1'])
+        main(keys, args.limit, args.template, dual_pass=not args.single_pass, workers=args.workers,
+             parallel_passes=not args.sequential_passes, upload_index=not args.no_upload_index,
+             use_cache=not args.no_cache, cache_dir=args.cache_dir,
+             cache_max_bytes=args.cache_max_mb * 1024 * 1024, rpm=args.rpm, tpm=args.tpm,
+             max_attempts=args.max_attempts, stream=args.stream, use_schema=not args.no_schema,
+             shard_size=args.shard_fields, context_cache=args.context_cache,
+             adaptive=args.adaptive_pass2, local_text=args.local_text,
+             page_filter=args.page_filter, prefetch=args.prefetch,
+             processing_timeout=args.processing_timeout, transport=args.transport,
+             max_connections=args.max_connections, keepalive=args.keepalive, backend=backend,
+             record=args.record, replay=args.replay, replay_latency=args.replay_latency, rpd=args.rpd,
+             tpd=args.tpd, quota_policy=args.quota_policy, quota_ledger=args.quota_ledger)
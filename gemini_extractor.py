@@ -2,14 +2,15 @@
 import os
 import time
 import json
-import pandas as pd
 import argparse
 from playwright.sync_api import sync_playwright
 from template_parser import parse_template, get_field_names
+from result_journal import ResultJournal, export_to_excel
 
 # Configuration
 ARTICLES_DIR = 'Articles'
 OUTPUT_FILE = 'extracted_studies.xlsx'
+JOURNAL_FILE = 'extracted_studies.jsonl'
 GEMINI_URL = "https://gemini.google.com/app"
 DEFAULT_TEMPLATE = 'GLP1_Meta_Analysis_Data_Extraction_Template.docx'
 
@@ -204,33 +205,24 @@ def main(limit=None, browser_channel="chrome", template_path=None):
 
     pdf_files = get_pdf_files()
     
-    # Resume Skip Logic
-    if os.path.exists(OUTPUT_FILE):
-        try:
-            existing_df = pd.read_excel(OUTPUT_FILE)
-            if 'Source File' in existing_df.columns:
-                processed_files = set(existing_df['Source File'].dropna().astype(str).tolist())
-                # Normalize basenames for comparison
-                processed_basenames = {os.path.basename(f) for f in processed_files}
-                
-                # Filter out files whose basename matches processed files (or variants like "file (Run 2A)")
-                # Actually, our Source File just stores the basename or basename + suffix.
-                # A simple basename check might be best if we just strip suffixes.
-                # But 'A Fano 2025.pdf (Run 2A)' implies 'A Fano 2025.pdf' was processed.
-                
-                # Better approach: check if original filename is contained in any processed source file string
-                files_to_skip = []
-                for pf in pdf_files:
-                    basename = os.path.basename(pf)
-                    # Check if this basename appears in any recorded source file entry
-                    if any(basename in str(recorded) for recorded in processed_files):
-                        files_to_skip.append(pf)
-                
-                original_count = len(pdf_files)
-                pdf_files = [f for f in pdf_files if f not in files_to_skip]
-                print(f"Skipping {len(files_to_skip)} already processed files. {len(pdf_files)} remaining.")
-        except Exception as e:
-            print(f"Warning: Could not read existing output file for resume logic: {e}")
+    # Resume Skip Logic (the journal is the durable record; older .xlsx output is imported once)
+    journal = ResultJournal(JOURNAL_FILE, legacy_excel=OUTPUT_FILE)
+    processed_files = journal.processed_sources()
+    if processed_files:
+        # Filter out files whose basename matches processed files (or variants like "file (Run 2A)")
+        # Our Source File stores the basename or basename + suffix, so
+        # 'A Fano 2025.pdf (Run 2A)' implies 'A Fano 2025.pdf' was processed.
+        
+        # Check if original filename is contained in any processed source file string
+        files_to_skip = []
+        for pf in pdf_files:
+            basename = os.path.basename(pf)
+            # Check if this basename appears in any recorded source file entry
+            if any(basename in str(recorded) for recorded in processed_files):
+                files_to_skip.append(pf)
+        
+        pdf_files = [f for f in pdf_files if f not in files_to_skip]
+        print(f"Skipping {len(files_to_skip)} already processed files. {len(pdf_files)} remaining.")
 
     if limit:
         pdf_files = pdf_files[:int(limit)]
@@ -292,25 +284,15 @@ def main(limit=None, browser_channel="chrome", template_path=None):
             if study_results:
                 all_results.extend(study_results)
                 
-                # Save Incremental
-                df = pd.DataFrame(study_results)
-                # Align columns
-                for c in ALL_COLUMNS:
-                    if c not in df.columns: df[c] = None
-                
-                cols = ['Source File'] + [c for c in ALL_COLUMNS if c in df.columns]
-                df = df[cols]
-
-                if os.path.exists(OUTPUT_FILE):
-                    existing = pd.read_excel(OUTPUT_FILE)
-                    df = pd.concat([existing, df], ignore_index=True)
-                else:
-                    # If first write, ensure all columns are present for template structure if needed
-                    pass
-                
-                df.to_excel(OUTPUT_FILE, index=False)
-                print(f"Saved {len(study_results)} rows to {OUTPUT_FILE}")
+                # Save Incremental (append-only; the workbook is written once at the end)
+                for row in study_results:
+                    journal.append({'Source File': row.get('Source File'),
+                                    **{c: row.get(c) for c in ALL_COLUMNS}})
+                print(f"Saved {len(study_results)} rows to {JOURNAL_FILE}")
 
+        n_rows = export_to_excel(journal, OUTPUT_FILE, ALL_COLUMNS)
+        if n_rows:
+            print(f"Wrote {n_rows} rows to {OUTPUT_FILE}")
         print("Done. Browser remains open.")
         time.sleep(5)
 
@@ -334,5 +316,15 @@ if __name__ == "__main__":
         help="Browser channel (chrome, msedge)",
         default="chrome"
     )
+    parser.add_argument(
+        "--export",
+        action="store_true",
+        help=f"Only write {OUTPUT_FILE} from the result journal ({JOURNAL_FILE}) and exit"
+    )
     args = parser.parse_args()
-    main(limit=args.limit, browser_channel=args.browser, template_path=args.template)
+    if args.export:
+        load_template(args.template or DEFAULT_TEMPLATE)
+        n_rows = export_to_excel(ResultJournal(JOURNAL_FILE, legacy_excel=OUTPUT_FILE), OUTPUT_FILE, ALL_COLUMNS)
+        print(f"Exported {n_rows} rows from {JOURNAL_FILE} to {OUTPUT_FILE}")
+    else:
+        main(limit=args.limit, browser_channel=args.browser, template_path=args.template)
@@ -0,0 +1,151 @@
+"""
+GenAI Client Module
+
+This module holds the long-lived, thread-safe objects shared by every worker:
+the API transport, GenerativeModel instances and GenerationConfig objects.
+Models and configs are created once per (model, instructions) and per response
+schema instead of on every call, and the transport is tuned for many
+concurrent requests:
+
+- gRPC (default): a single HTTP/2 channel multiplexes all requests; keep-alive
+  pings stop idle connections from being dropped between studies.
+- REST: a requests session whose connection pool holds `max_connections`
+  keep-alive connections, so concurrent workers don't repeat TLS handshakes.
+
+With several API keys, create_key_backend builds one GeminiBackend per key,
+each with its own tuned clients.
+
+Usage:
+    from genai_client import configure_client, get_model, get_generation_config
+
+    configure_client(api_key, transport='grpc', keepalive=30)
+    model = get_model('models/gemini-2.0-flash', system_instruction)
+    config = get_generation_config(response_schema)
+    response = model.generate_content(contents, generation_config=config)
+"""
+
+import json
+import threading
+from typing import Dict, Optional, Tuple
+import google.generativeai as genai
+from backends import GeminiBackend, get_backend
+from google.generativeai import client as genai_client
+
+DEFAULT_TRANSPORT = 'grpc'
+# Keep-alive connections in the REST connection pool
+DEFAULT_MAX_CONNECTIONS = 100
+# Seconds between keep-alive pings on an idle gRPC channel
+DEFAULT_KEEPALIVE = 30
+
+_lock = threading.Lock()
+_models: Dict[Tuple[object, str, Optional[str]], object] = {}
+_configs: Dict[Tuple[object, str], object] = {}
+
+
+def configure_client(api_key: str, transport: str = DEFAULT_TRANSPORT,
+                     max_connections: int = DEFAULT_MAX_CONNECTIONS, keepalive: float = DEFAULT_KEEPALIVE):
+    """
+    Configure the API key and a shared, tuned transport for model calls.
+
+    Args:
+        api_key: Gemini API key
+        transport: 'grpc' or 'rest'
+        max_connections: Size of the REST keep-alive connection pool
+        keepalive: gRPC keep-alive ping interval in seconds (0 = off)
+    """
+    genai.configure(api_key=api_key, transport=transport)
+    with _lock:
+        _models.clear()
+    _tune_transport(genai_client._client_manager, api_key, transport, max_connections, keepalive)
+
+
+def create_key_backend(api_key: str, transport: str = DEFAULT_TRANSPORT,
+                       max_connections: int = DEFAULT_MAX_CONNECTIONS,
+                       keepalive: float = DEFAULT_KEEPALIVE) -> GeminiBackend:
+    """
+    Create a GeminiBackend with its own tuned clients for one API key.
+
+    Args:
+        api_key: Gemini API key
+        transport: 'grpc' or 'rest'
+        max_connections: Size of the REST keep-alive connection pool
+        keepalive: gRPC keep-alive ping interval in seconds (0 = off)
+    """
+    backend = GeminiBackend(api_key=api_key, transport=transport)
+    _tune_transport(backend.clients, api_key, transport, max_connections, keepalive)
+    return backend
+
+
+def _tune_transport(clients, api_key: str, transport: str, max_connections: int, keepalive: float):
+    """Tune the generative client of a google.generativeai client manager."""
+    try:
+        if transport == 'rest':
+            _tune_rest(clients, max_connections)
+        else:
+            _tune_grpc(clients, api_key, keepalive)
+    except Exception as e:
+        # Tuning is an optimization; the library's default transport still works
+        print(f"Warning: could not tune the {transport} transport, using defaults: {e}")
+
+
+def _tune_grpc(clients, api_key: str, keepalive: float):
+    """Install a generative client whose gRPC channel sends keep-alive pings."""
+    if not keepalive:
+        return
+    from google.auth import api_key as api_key_credentials
+    from google.ai import generativelanguage as glm
+    from google.ai.generativelanguage_v1beta.services.generative_service.transports.grpc import (
+        GenerativeServiceGrpcTransport)
+
+    keepalive_options = [
+        ('grpc.keepalive_time_ms', int(keepalive * 1000)),
+        ('grpc.keepalive_timeout_ms', 20_000),
+        ('grpc.keepalive_permit_without_calls', 1),
+        ('grpc.http2.max_pings_without_data', 0),
+    ]
+
+    def create_channel(*args, options=(), **kwargs):
+        return GenerativeServiceGrpcTransport.create_channel(
+            *args, options=list(options) + keepalive_options, **kwargs)
+
+    transport = GenerativeServiceGrpcTransport(credentials=api_key_credentials.Credentials(api_key),
+                                               channel=create_channel)
+    clients.clients['generative'] = glm.GenerativeServiceClient(transport=transport)
+
+
+def _tune_rest(clients, max_connections: int):
+    """Enlarge the keep-alive connection pool of the shared REST session."""
+    from requests.adapters import HTTPAdapter
+
+    client = clients.get_default_client('generative')
+    adapter = HTTPAdapter(pool_connections=max_connections, pool_maxsize=max_connections)
+    client._transport._session.mount('https://', adapter)
+
+
+def get_model(model_name: str, system_instruction: Optional[str] = None):
+    """
+    Return the shared GenerativeModel for a model and system instruction.
+
+    GenerativeModel holds no per-request state, so one instance serves every
+    worker concurrently. Models come from the active backend.
+    """
+    backend = get_backend()
+    key = (backend, model_name, system_instruction)
+    with _lock:
+        model = _models.get(key)
+        if model is None:
+            model = backend.generative_model(model_name, system_instruction)
+            _models[key] = model
+        return model
+
+
+def get_generation_config(response_schema: Optional[dict] = None):
+    """Return the shared JSON GenerationConfig for a response schema (or none)."""
+    backend = get_backend()
+    key = (backend, json.dumps(response_schema, sort_keys=True))
+    with _lock:
+        config = _configs.get(key)
+        if config is None:
+            config = backend.generation_config(response_schema)
+            _configs[key] = config
+        return config
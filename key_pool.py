@@ -0,0 +1,504 @@
+"""
+Key Pool Module
+
+This module spreads the extraction over several Gemini API keys. KeyPool
+implements the backend interface (see backends.py) on top of one backend per
+key, so the rest of the extractor runs unchanged:
+
+- Each upload goes to the next key in turn that is not cooling down. The
+  study's later calls (status checks, generation, cached content, deletion)
+  go to the key that holds its file, since uploads are only visible to the
+  project they were made in.
+- Each key has its own RPM/TPM limiter.
+- A 429 puts the key in cooldown for the server's retry hint (or
+  DEFAULT_COOLDOWN, also used after MAX_STRIKES 429s in a row). A 429 for a
+  daily quota retires it for the rest of the run, as does a used-up daily
+  budget in the quota ledger (quota_ledger.py).
+- The request fails over to another key at once: text is resent as is, and
+  an uploaded PDF is re-uploaded to the new key (reused by the study's other
+  requests and deleted once the study is done). Requests bound to a cached
+  context can't move, so they wait until their key's cooldown ends.
+- When every key is cooling down, requests wait for the first one to come
+  back; once every key's daily quota is used up, DailyQuotaExceeded (not
+  retried) is raised.
+- Requests, uploads, 429s, failovers and tokens are counted per key for the
+  audit log.
+
+Usage:
+    from key_pool import KeyPool, load_keys, mask_key
+    from genai_client import create_key_backend
+    from backends import set_backend
+
+    keys = load_keys(['KEY_A', 'KEY_B'], key_file='keys.txt')
+    pool = KeyPool({mask_key(k): create_key_backend(k) for k in keys}, rpm=15, tpm=1_000_000)
+    set_backend(pool)
+    ...
+    print(pool.stats())
+"""
+
+import time
+import threading
+from typing import Dict, List, Optional
+from google.api_core import exceptions
+from rate_limiter import RateLimiter
+from retry_policy import retry_hint
+from token_usage import UsageTracker
+from file_manager import DEFAULT_POLLER
+from quota_ledger import DAILY_QUOTA_PATTERN, DailyQuotaExceeded
+
+# Seconds a key rests after a 429 that carries no retry hint
+DEFAULT_COOLDOWN = 60.0
+# A study waits this long for its own key to come out of cooldown before its
+# file is re-uploaded to another key
+MAX_WAIT_FOR_HOME = 10.0
+# Consecutive 429s after which a key rests for the full cooldown, whatever
+# the retry hint says
+MAX_STRIKES = 3
+RATE_LIMIT_ERRORS = (exceptions.ResourceExhausted, exceptions.TooManyRequests)
+# What asking a key about another project's file raises
+NOT_VISIBLE_ERRORS = (exceptions.NotFound, exceptions.PermissionDenied)
+
+
+def mask_key(api_key: str) -> str:
+    """A printable label for a key: its last four characters."""
+    return f"...{api_key[-4:]}"
+
+
+def load_keys(values: Optional[List[str]] = None, key_file: Optional[str] = None) -> List[str]:
+    """
+    Collect API keys from the command line and/or a key file.
+
+    Args:
+        values: Keys (each may also be a comma-separated list)
+        key_file: File with one key per line ('#' starts a comment)
+
+    Returns:
+        The distinct keys, in the order given
+    """
+    keys = []
+    for value in values or []:
+        keys.extend(part.strip() for part in value.split(','))
+    if key_file:
+        with open(key_file, encoding='utf-8') as f:
+            keys.extend(line.split('#', 1)[0].strip() for line in f)
+    return list(dict.fromkeys(key for key in keys if key))
+
+
+class PoolKey:
+    """One key of the pool: its backend, limiter, cooldown and counters."""
+
+    def __init__(self, label: str, backend, limiter: RateLimiter):
+        self.label = label
+        self.backend = backend
+        self.limiter = limiter
+        self.cooldown_until = 0.0
+        self.exhausted = False
+        self.strikes = 0  # 429s since the last success
+        self.uploads = 0
+        self.rate_limited = 0
+        self.failovers = 0
+        self.usage = UsageTracker()
+        self._models: Dict[tuple, object] = {}
+
+    def ready(self, now: float) -> bool:
+        """True if the key may take new requests."""
+        return not self.exhausted and now >= self.cooldown_until
+
+    def model(self, model_name: str, system_instruction: Optional[str]):
+        """This key's model for a name and system instruction."""
+        key = (model_name, system_instruction)
+        if key not in self._models:
+            self._models[key] = self.backend.generative_model(model_name, system_instruction)
+        return self._models[key]
+
+    def stats(self) -> Dict:
+        return {
+            'key': self.label,
+            'uploads': self.uploads,
+            'rate_limited': self.rate_limited,
+            'failovers': self.failovers,
+            'exhausted': self.exhausted,
+            'tokens': self.usage.totals(),
+        }
+
+
+class PooledModel:
+    """Model whose requests are routed to a key of the pool."""
+
+    def __init__(self, pool: 'KeyPool', model_name: Optional[str], system_instruction: Optional[str] = None,
+                 cached: Optional['PooledCachedContent'] = None):
+        self.pool = pool
+        self.model_name = model_name
+        self.system_instruction = system_instruction
+        self.cached = cached
+
+    def generate_content(self, contents, generation_config=None, stream: bool = False, **kwargs):
+        return self.pool._generate(self, list(contents), generation_config, stream, kwargs)
+
+
+class PooledCachedContent:
+    """A cached content entry and the key it was created with."""
+
+    def __init__(self, key: PoolKey, content, model):
+        self.key = key
+        self.content = content
+        self.model = model
+        self.name = content.name
+
+
+class _PooledStream:
+    """A streamed response; usage is counted once it has been read to the end."""
+
+    def __init__(self, response, pool: 'KeyPool', key: PoolKey, reservation: float):
+        self._response = response
+        self._pool = pool
+        self._key = key
+        self._reservation = reservation
+
+    def __iter__(self):
+        usage = None
+        try:
+            for chunk in self._response:
+                yield chunk
+            usage = self.usage_metadata
+            self._key.strikes = 0
+        except RATE_LIMIT_ERRORS as e:
+            self._pool._cool_down(self._key, e)
+            raise
+        finally:
+            self._key.limiter.settle(self._reservation, usage)
+            self._key.usage.add(usage)
+
+    @property
+    def usage_metadata(self):
+        return getattr(self._response, 'usage_metadata', None)
+
+    @property
+    def text(self):
+        return self._response.text
+
+
+class KeyPool:
+    """Backend that distributes calls over several keys' backends."""
+
+    name = 'pool'
+
+    def __init__(self, backends: Dict[str, object], rpm: Optional[float] = None, tpm: Optional[float] = None,
+                 cooldown: float = DEFAULT_COOLDOWN, poller=None, quotas: Optional[Dict[str, object]] = None):
+        """
+        Args:
+            backends: Key label -> that key's backend
+            rpm: Requests per minute allowed for each key (None = unlimited)
+            tpm: Tokens per minute allowed for each key (None = unlimited)
+            cooldown: Seconds a key rests after a 429 without a retry hint
+            poller: file_manager.FilePoller for re-uploads (default: DEFAULT_POLLER)
+            quotas: Key label -> quota_ledger.DailyQuota, for keys with daily caps
+        """
+        if not backends:
+            raise ValueError("KeyPool needs at least one key")
+        quotas = quotas or {}
+        self.keys = [PoolKey(label, backend, RateLimiter(rpm=rpm, tpm=tpm, quota=quotas.get(label)))
+                     for label, backend in backends.items()]
+        self.cooldown = cooldown
+        self.poller = poller or DEFAULT_POLLER
+        self._owners: Dict[str, PoolKey] = {}     # file name -> key holding it
+        self._sources: Dict[str, tuple] = {}      # file name -> (local path, display name)
+        self._copies: Dict[tuple, object] = {}    # (file name, key label) -> re-uploaded file
+        self._copy_locks: Dict[tuple, threading.Lock] = {}
+        self._next = 0
+        self._lock = threading.Lock()
+
+    # --- Key selection ---
+
+    def _pick(self, preferred: Optional[PoolKey] = None, tried=()) -> Optional[PoolKey]:
+        """
+        The key for the next request: the preferred key if it is ready,
+        otherwise the next ready key in turn. If no key has been tried yet and
+        none is ready, waits for the first cooldown to end. Only ever returns a
+        ready key.
+
+        Raises:
+            DailyQuotaExceeded: If every key has used up its daily quota
+        """
+        while True:
+            now = time.monotonic()
+            if preferred is not None and preferred not in tried and preferred.ready(now):
+                return preferred
+            with self._lock:
+                for offset in range(len(self.keys)):
+                    key = self.keys[(self._next + offset) % len(self.keys)]
+                    if key not in tried and key.ready(now):
+                        self._next = (self._next + offset + 1) % len(self.keys)
+                        return key
+                waiting = [key for key in self.keys if not key.exhausted]
+            if not waiting:
+                raise DailyQuotaExceeded("Every API key in the pool has used up its daily quota")
+            if tried:
+                return None
+            wait = min(key.cooldown_until for key in waiting) - now
+            if wait > 0:
+                print(f"[key-pool] Every key is rate limited; waiting {wait:.1f}s")
+                time.sleep(wait)
+
+    def _cool_down(self, key: PoolKey, exc: BaseException):
+        """Take a key out of rotation after a 429 (or a used-up daily budget)."""
+        if isinstance(exc, DailyQuotaExceeded) or DAILY_QUOTA_PATTERN.search(str(exc)):
+            with self._lock:
+                key.rate_limited += not isinstance(exc, DailyQuotaExceeded)
+                key.exhausted = True
+            if key.limiter.quota is not None:
+                key.limiter.quota.note_error(exc)
+            print(f"[key-pool] Key {key.label} has used up its daily quota; not using it again this run")
+            return
+        with self._lock:
+            key.rate_limited += 1
+            key.strikes += 1
+            delay = retry_hint(exc) or self.cooldown
+            if key.strikes >= MAX_STRIKES:
+                delay = max(delay, self.cooldown)
+            key.cooldown_until = max(key.cooldown_until, time.monotonic() + delay)
+        print(f"[key-pool] Key {key.label} rate limited; resting it for {delay:.1f}s")
+
+    def _resting_briefly(self, key: PoolKey) -> bool:
+        """True if the key will be back within MAX_WAIT_FOR_HOME seconds."""
+        return not key.exhausted and key.cooldown_until - time.monotonic() <= MAX_WAIT_FOR_HOME
+
+    @staticmethod
+    def _no_key_left(last_error: Optional[BaseException]) -> BaseException:
+        """The error to raise once every usable key has been tried."""
+        if last_error is not None:
+            return last_error
+        return exceptions.ResourceExhausted("No API key in the pool could take the request")
+
+    def _owner(self, name: str) -> Optional[PoolKey]:
+        with self._lock:
+            return self._owners.get(name)
+
+    # --- Files ---
+
+    def upload_file(self, path: str, display_name: str):
+        tried = set()
+        last_error = None
+        while True:
+            key = self._pick(tried=tried)
+            if key is None:
+                raise self._no_key_left(last_error)
+            key.limiter.acquire(counts_tokens=False)
+            try:
+                remote_file = key.backend.upload_file(path, display_name)
+            except RATE_LIMIT_ERRORS as e:
+                self._cool_down(key, e)
+                tried.add(key)
+                last_error = e
+                continue
+            with self._lock:
+                key.uploads += 1
+                self._owners[remote_file.name] = key
+                self._sources[remote_file.name] = (path, display_name)
+            return remote_file
+
+    def get_file(self, name: str):
+        key = self._owner(name)
+        if key is not None:
+            return key.backend.get_file(name)
+        # Uploaded by an earlier run (upload index): find the key that can see it
+        for key in self.keys:
+            try:
+                remote_file = key.backend.get_file(name)
+            except NOT_VISIBLE_ERRORS:
+                continue
+            with self._lock:
+                self._owners[name] = key
+            return remote_file
+        raise exceptions.NotFound(f"File {name} not found for any API key")
+
+    def list_files(self):
+        for key in self.keys:
+            for remote_file in key.backend.list_files():
+                yield remote_file
+
+    def delete_file(self, name: str):
+        self.release_file(name)
+        with self._lock:
+            key = self._owners.pop(name, None)
+            self._sources.pop(name, None)
+        if key is not None:
+            key.backend.delete_file(name)
+            return
+        for key in self.keys:
+            try:
+                key.backend.delete_file(name)
+                return
+            except NOT_VISIBLE_ERRORS:
+                continue
+        raise exceptions.NotFound(f"File {name} not found for any API key")
+
+    def release_file(self, name: str):
+        """Delete the copies of a file re-uploaded to other keys; the original is left as is."""
+        with self._lock:
+            copies = [(label, self._copies.pop((file_name, label))) for (file_name, label) in list(self._copies)
+                      if file_name == name]
+            for copy_key in [copy_key for copy_key in self._copy_locks if copy_key[0] == name]:
+                del self._copy_locks[copy_key]
+        for label, copy in copies:
+            self._delete_copy(label, copy)
+
+    def _delete_copy(self, label: str, copy):
+        for key in self.keys:
+            if key.label == label:
+                try:
+                    key.backend.delete_file(copy.name)
+                except Exception:
+                    pass  # Expires on its own
+        with self._lock:
+            self._owners.pop(copy.name, None)
+
+    def _copy_to(self, remote_file, key: PoolKey):
+        """
+        The study's file as seen by another key, re-uploading it there on first
+        use. Returns None if it can't be re-uploaded (unknown local path, or
+        processing failed; the failed copy is deleted). A 429 on the upload
+        cools the key down and is re-raised.
+        """
+        source = self._sources.get(remote_file.name)
+        if source is None:
+            return None
+        copy_key = (remote_file.name, key.label)
+        with self._lock:
+            lock = self._copy_locks.setdefault(copy_key, threading.Lock())
+        with lock:
+            copy = self._copies.get(copy_key)
+            if copy is not None:
+                return copy
+            print(f"[key-pool] Re-uploading {source[1]} to key {key.label}")
+            key.limiter.acquire(counts_tokens=False)
+            try:
+                copy = key.backend.upload_file(*source)
+            except RATE_LIMIT_ERRORS as e:
+                self._cool_down(key, e)
+                raise
+            with self._lock:
+                key.uploads += 1
+                self._owners[copy.name] = key
+            copy = self.poller.wait(copy).file
+            if copy.state.name != "ACTIVE":
+                try:
+                    key.backend.delete_file(copy.name)
+                except Exception:
+                    pass  # Expires on its own
+                with self._lock:
+                    self._owners.pop(copy.name, None)
+                return None
+            with self._lock:
+                self._copies[copy_key] = copy
+            return copy
+
+    # --- Models ---
+
+    def generative_model(self, model_name: str, system_instruction: Optional[str] = None):
+        return PooledModel(self, model_name, system_instruction)
+
+    def generation_config(self, response_schema: Optional[dict] = None):
+        return self.keys[0].backend.generation_config(response_schema)
+
+    def create_cached_content(self, model_name: str, document, system_instruction: Optional[str],
+                              ttl, display_name: str = ""):
+        key = self._owner(getattr(document, 'name', None)) or self._pick()
+        key.limiter.acquire(counts_tokens=False)
+        try:
+            content = key.backend.create_cached_content(model_name, document, system_instruction, ttl, display_name)
+        except RATE_LIMIT_ERRORS as e:
+            self._cool_down(key, e)
+            raise
+        return PooledCachedContent(key, content, key.backend.model_from_cached_content(content))
+
+    def model_from_cached_content(self, cached_content: PooledCachedContent):
+        return PooledModel(self, None, cached=cached_content)
+
+    def delete_cached_content(self, cached_content: PooledCachedContent):
+        cached_content.key.backend.delete_cached_content(cached_content.content)
+
+    # --- Generation ---
+
+    def _generate(self, model: PooledModel, contents: List, generation_config, stream: bool, kwargs: Dict):
+        """Send a request to a ready key, failing over to the others on 429."""
+        if model.cached is not None:
+            # A cached context lives with its key, so wait out the key's cooldown
+            home, document = model.cached.key, None
+            if home.exhausted:
+                raise DailyQuotaExceeded(f"Key {home.label} holding the cached context has used up its daily quota")
+            remaining = home.cooldown_until - time.monotonic()
+            if remaining > 0:
+                time.sleep(remaining)
+        else:
+            document = next((part for part in contents if self._owner(getattr(part, 'name', None))), None)
+            home = self._owner(document.name) if document is not None else None
+            # Briefly cooling down: waiting is cheaper than moving the file
+            remaining = home.cooldown_until - time.monotonic() if home is not None else 0
+            if 0 < remaining <= MAX_WAIT_FOR_HOME and not home.exhausted:
+                time.sleep(remaining)
+
+        tried = set()
+        failed = None
+        last_error = None
+        while True:
+            if model.cached is not None:
+                key = home if not tried else None
+            else:
+                key = self._pick(home, tried)
+            if key is None:
+                raise self._no_key_left(last_error)
+            if failed is not None:
+                with self._lock:
+                    failed.failovers += 1
+            parts = contents
+            if document is not None and key is not home:
+                try:
+                    copy = self._copy_to(document, key)
+                except RATE_LIMIT_ERRORS as e:
+                    tried.add(key)
+                    failed = key
+                    last_error = e
+                    continue
+                if copy is None:
+                    tried.add(key)
+                    last_error = exceptions.ResourceExhausted(
+                        f"Key {home.label} is rate limited and {document.name} can't be moved to another key")
+                    continue
+                parts = [copy if part is document else part for part in contents]
+            target = model.cached.model if model.cached is not None else key.model(model.model_name,
+                                                                                  model.system_instruction)
+            try:
+                reservation = key.limiter.acquire()
+            except DailyQuotaExceeded as e:
+                self._cool_down(key, e)
+                tried.add(key)
+                failed = key
+                last_error = e
+                continue
+            try:
+                response = target.generate_content(parts, generation_config=generation_config, stream=stream,
+                                                   **kwargs)
+            except RATE_LIMIT_ERRORS as e:
+                key.limiter.settle(reservation)
+                self._cool_down(key, e)
+                if key is home and document is not None and self._resting_briefly(key):
+                    raise  # Cheaper to wait (the retry policy honours the hint) than to re-upload
+                tried.add(key)
+                failed = key
+                last_error = e
+                continue
+            except Exception:
+                key.limiter.settle(reservation)
+                raise
+            if stream:
+                return _PooledStream(response, self, key, reservation)
+            usage = getattr(response, 'usage_metadata', None)
+            key.limiter.settle(reservation, usage)
+            key.usage.add(usage)
+            key.strikes = 0
+            return response
+
+    def stats(self) -> List[Dict]:
+        """Per-key counters for the audit log."""
+        return [key.stats() for key in self.keys]
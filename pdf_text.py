@@ -0,0 +1,227 @@
+"""
+PDF Text Module
+
+This module extracts the text layer of born-digital PDFs locally so studies
+can be sent to the model as compact text instead of uploading the binary PDF.
+Scanned PDFs (little or no text layer) return None and should be uploaded as
+usual.
+
+Pages can also be scored against the template's field names and descriptions
+so that reference lists, appendices and figure-only pages are dropped before
+the document is sent, either as text or as a trimmed PDF.
+
+Extraction is CPU-bound, so preprocess_pdf is a plain top-level function
+that can be run in a ProcessPoolExecutor.
+
+Requires the optional `pypdf` package.
+
+Usage:
+    from pdf_text import field_vocabulary, preprocess_pdf
+
+    result = preprocess_pdf('Articles/study.pdf')
+    if result['text'] is None:
+        ...  # scanned or unreadable: upload the PDF instead
+
+    vocabulary = field_vocabulary(template_fields)
+    result = preprocess_pdf('Articles/study.pdf', vocabulary, as_text=False, trim_dir='tmp')
+    # result['upload_path'] -> PDF containing only the relevant pages
+"""
+
+import os
+import re
+from typing import Dict, Iterable, List, Optional, Set
+
+try:
+    from pypdf import PdfReader, PdfWriter
+except ImportError:  # Optional dependency
+    PdfReader = PdfWriter = None
+
+# Below this many characters per page the PDF is treated as scanned
+MIN_CHARS_PER_PAGE = 200
+# Pages with less text than this are figure-only
+MIN_PAGE_CHARS = 150
+# Distinct template keywords a page needs to be kept (body / after the references)
+MIN_BODY_HITS = 1
+MIN_BACK_MATTER_HITS = 3
+
+REFERENCES_HEADING = re.compile(r'^(references|bibliography|literature cited|works cited)\b', re.IGNORECASE)
+APPENDIX_HEADING = re.compile(r'^(appendix|supplementary|supplemental)\b', re.IGNORECASE)
+CITATION_LINE = re.compile(r'^(\[\d+\]|\d+\.)\s|\bdoi\b|\bet al\b', re.IGNORECASE)
+WORD_PATTERN = re.compile(r'[a-z][a-z0-9\-]{2,}')
+STOPWORDS = {
+    'the', 'and', 'for', 'with', 'from', 'not', 'any', 'are', 'was', 'were', 'this', 'that',
+    'total', 'number', 'mean', 'median', 'yes', 'reported', 'specify', 'other', 'per',
+    'all', 'each', 'into', 'than', 'study',
+}
+
+
+def is_available() -> bool:
+    """Return True if local text extraction is supported (pypdf installed)."""
+    return PdfReader is not None
+
+
+def _compact(text: str) -> str:
+    """Normalize whitespace while keeping line (and table row) structure."""
+    lines = [re.sub(r'[ \t]+', ' ', line).strip() for line in text.splitlines()]
+    compacted = '\n'.join(lines)
+    return re.sub(r'\n{3,}', '\n\n', compacted).strip()
+
+
+def extract_pdf_pages(pdf_path: str) -> Optional[List[str]]:
+    """
+    Extract the text of each page.
+
+    Args:
+        pdf_path: Path to the PDF
+
+    Returns:
+        List of page texts, or None if the PDF is scanned, unreadable or
+        pypdf is not installed
+    """
+    if PdfReader is None:
+        return None
+    try:
+        reader = PdfReader(pdf_path)
+        pages = [_compact(page.extract_text() or "") for page in reader.pages]
+    except Exception as e:
+        print(f"[{pdf_path}] Local text extraction failed: {e}")
+        return None
+
+    if not pages or sum(len(p) for p in pages) < MIN_CHARS_PER_PAGE * len(pages):
+        return None
+    return pages
+
+
+def format_pages(pages: List[str], page_numbers: Optional[List[int]] = None) -> str:
+    """
+    Join page texts into one document with page markers.
+
+    Args:
+        pages: Page texts
+        page_numbers: 1-based page numbers for each text (defaults to 1..N)
+    """
+    if page_numbers is None:
+        page_numbers = list(range(1, len(pages) + 1))
+    return '\n\n'.join(f"--- Page {n} ---\n{text}" for n, text in zip(page_numbers, pages))
+
+
+def field_vocabulary(fields: Iterable) -> Set[str]:
+    """
+    Build the set of keywords used to score pages from template fields.
+
+    Args:
+        fields: TemplateField objects (anything with name/description/section)
+
+    Returns:
+        Lower-case keywords
+    """
+    vocabulary = set()
+    for field in fields:
+        text = f"{field.name} {field.description} {field.section}".lower()
+        vocabulary.update(w for w in WORD_PATTERN.findall(text) if w not in STOPWORDS)
+    return vocabulary
+
+
+def _keyword_hits(text: str, vocabulary: Set[str]) -> int:
+    """Number of distinct vocabulary words on a page."""
+    return len(vocabulary.intersection(WORD_PATTERN.findall(text.lower())))
+
+
+def select_relevant_pages(pages: List[str], vocabulary: Set[str]) -> List[int]:
+    """
+    Choose the pages worth sending to the model.
+
+    The first page (title, authors, abstract) is always kept. Figure-only pages
+    are dropped, as are pages after a References/Appendix heading unless they
+    still score well against the template (e.g. supplementary tables).
+
+    Args:
+        pages: Page texts
+        vocabulary: Keywords from field_vocabulary()
+
+    Returns:
+        0-based indexes of the pages to keep (all pages if no body page scores)
+    """
+    keep = []
+    unmatched = 0  # Body pages dropped only for lack of keywords
+    back_matter = False
+    for index, text in enumerate(pages):
+        lines = [line for line in text.splitlines() if line.strip()]
+        in_back_matter = back_matter  # The whole page follows a References/Appendix heading
+        body = text
+        if not back_matter:
+            for position, line in enumerate(lines):
+                if REFERENCES_HEADING.match(line) or APPENDIX_HEADING.match(line):
+                    # Only the text before the heading counts as body text
+                    body = '\n'.join(lines[:position])
+                    back_matter = True
+                    break
+
+        if index == 0:
+            keep.append(index)
+            continue
+        if len(text) < MIN_PAGE_CHARS:
+            continue  # Figure-only
+
+        if in_back_matter:
+            citations = sum(1 for line in lines if CITATION_LINE.search(line))
+            if lines and citations / len(lines) > 0.3:
+                continue  # Reference list
+            min_hits = MIN_BACK_MATTER_HITS
+        else:
+            min_hits = MIN_BODY_HITS
+        if _keyword_hits(body, vocabulary) >= min_hits:
+            keep.append(index)
+        elif not in_back_matter and len(body) >= MIN_PAGE_CHARS:
+            unmatched += 1
+
+    if len(keep) == 1 and unmatched:
+        # No body page matched: the template vocabulary doesn't fit this paper
+        return list(range(len(pages)))
+    return keep
+
+
+def trim_pdf(pdf_path: str, page_indexes: List[int], out_path: str) -> str:
+    """Write a copy of the PDF containing only the given pages."""
+    reader = PdfReader(pdf_path)
+    writer = PdfWriter()
+    for index in page_indexes:
+        writer.add_page(reader.pages[index])
+    with open(out_path, 'wb') as f:
+        writer.write(f)
+    return out_path
+
+
+def preprocess_pdf(pdf_path: str, vocabulary: Optional[Set[str]] = None, as_text: bool = True,
+                   trim_dir: Optional[str] = None) -> Dict:
+    """
+    Prepare a study for sending: extract text and/or drop irrelevant pages.
+
+    Args:
+        pdf_path: Path to the PDF
+        vocabulary: Keywords from field_vocabulary(); None keeps every page
+        as_text: Return the (filtered) text to send instead of the PDF
+        trim_dir: Directory for trimmed PDFs when sending the PDF itself
+
+    Returns:
+        Dict with 'text' (or None), 'upload_path' (PDF to upload, or None for
+        the original), 'pages_kept' and 'pages_total' (None if scanned)
+    """
+    result = {'text': None, 'upload_path': None, 'pages_kept': None, 'pages_total': None}
+    pages = extract_pdf_pages(pdf_path)
+    if pages is None:
+        return result  # Scanned or unreadable: upload the original
+
+    keep = select_relevant_pages(pages, vocabulary) if vocabulary else list(range(len(pages)))
+    result['pages_kept'] = len(keep)
+    result['pages_total'] = len(pages)
+
+    if as_text:
+        result['text'] = format_pages([pages[i] for i in keep], [i + 1 for i in keep])
+    elif trim_dir and len(keep) < len(pages):
+        out_path = os.path.join(trim_dir, os.path.basename(pdf_path))
+        try:
+            result['upload_path'] = trim_pdf(pdf_path, keep, out_path)
+        except Exception as e:
+            print(f"[{pdf_path}] Could not write trimmed PDF, uploading original: {e}")
+    return result
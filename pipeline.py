@@ -0,0 +1,135 @@
+"""
+Pipeline Module
+
+This module runs items through a chain of stages connected by bounded queues.
+Each stage has its own worker threads, so different items can be in different
+stages at once (study k+1 uploads while study k is generating) and throughput
+is set by the slowest stage instead of the sum of all stages. The bounded
+queues stop fast stages from running arbitrarily far ahead.
+
+Results come out in input order, whatever order the stages finish them in.
+
+Usage:
+    from pipeline import Stage, run_pipeline
+
+    stages = [
+        Stage('upload', upload, workers=2),
+        Stage('generate', generate, workers=4),
+    ]
+    for result in run_pipeline(items, stages, queue_size=2):
+        write(result)
+"""
+
+import queue
+import threading
+from typing import Any, Callable, Iterable, Iterator, List
+
+_DONE = object()  # End-of-input marker passed down the queues
+
+
+class Stage:
+    """One step of the pipeline: fn applied to each item by `workers` threads."""
+
+    def __init__(self, name: str, fn: Callable[[Any], Any], workers: int = 1):
+        """
+        Args:
+            name: Stage name (used for thread names)
+            fn: Function applied to each item; its return value goes to the next stage
+            workers: Number of threads running this stage
+        """
+        self.name = name
+        self.fn = fn
+        self.workers = max(1, int(workers))
+
+
+class _Failure:
+    """An exception raised by a stage, carried to the consumer."""
+
+    def __init__(self, exc: BaseException):
+        self.exc = exc
+
+
+def _run_stage(stage: Stage, inbox: queue.Queue, outbox: queue.Queue, remaining: List[int],
+               lock: threading.Lock):
+    """Worker loop: process items until the end marker, then pass it on once."""
+    while True:
+        entry = inbox.get()
+        if entry is _DONE:
+            inbox.put(_DONE)  # Let the stage's other workers see it too
+            with lock:
+                remaining[0] -= 1
+                last = remaining[0] == 0
+            if last:
+                outbox.put(_DONE)
+            return
+        seq, item = entry
+        if not isinstance(item, _Failure):
+            try:
+                item = stage.fn(item)
+            except Exception as e:
+                item = _Failure(e)
+        outbox.put((seq, item))
+
+
+def run_pipeline(items: Iterable, stages: List[Stage], queue_size: int = 1) -> Iterator:
+    """
+    Push items through the stages and yield the results in input order.
+
+    Args:
+        items: Inputs to the first stage
+        stages: Stages in order
+        queue_size: Capacity of each queue between stages
+
+    Yields:
+        The last stage's result for each item
+
+    Raises:
+        The first exception raised by a stage for an item, when that item's
+        result is reached (or by iterating items, after the items before it)
+    """
+    queue_size = max(1, int(queue_size))
+    # The final queue is unbounded so finished results never block a stage
+    queues = [queue.Queue(maxsize=queue_size) for _ in stages] + [queue.Queue()]
+
+    threads = []
+    for stage, inbox, outbox in zip(stages, queues, queues[1:]):
+        remaining = [stage.workers]
+        lock = threading.Lock()
+        for n in range(stage.workers):
+            thread = threading.Thread(target=_run_stage, args=(stage, inbox, outbox, remaining, lock),
+                                      name=f"{stage.name}-{n}", daemon=True)
+            thread.start()
+            threads.append(thread)
+
+    def feed():
+        seq = 0
+        try:
+            for item in items:
+                queues[0].put((seq, item))
+                seq += 1
+        except Exception as e:
+            # The consumer re-raises it once the items before it are out
+            queues[0].put((seq, _Failure(e)))
+        finally:
+            queues[0].put(_DONE)
+
+    threading.Thread(target=feed, name="discover", daemon=True).start()
+
+    # Reassemble in input order
+    pending = {}
+    next_seq = 0
+    while True:
+        entry = queues[-1].get()
+        if entry is _DONE:
+            break
+        seq, result = entry
+        pending[seq] = result
+        while next_seq in pending:
+            result = pending.pop(next_seq)
+            next_seq += 1
+            if isinstance(result, _Failure):
+                raise result.exc
+            yield result
+
+    for thread in threads:
+        thread.join()
@@ -0,0 +1,245 @@
+"""
+Quota Ledger Module
+
+This module remembers, across runs, how many requests and tokens each API key
+has used on each UTC day (the window the Gemini API's daily quotas reset on),
+so a run can stop, or slow down, before the key's daily cap turns into hard
+429 errors halfway through.
+
+QuotaLedger is the on-disk record: a small JSON file of
+{day: {key id: {'requests', 'tokens', 'exhausted'}}}. Keys are stored as
+hashes, never in clear. Counts are merged into the file (re-read on every
+save), so runs sharing a ledger add up rather than overwrite each other, and
+days older than KEEP_DAYS are dropped.
+
+DailyQuota applies one key's caps before each generate request (through its
+RateLimiter):
+
+- 'stop': requests go ahead while the day's budget lasts; after that
+  DailyQuotaExceeded is raised. The extractor also checks budget_allows()
+  before starting each study, so it stops starting studies (and uploading
+  their PDFs) once the remaining budget can't cover them.
+- 'pace': requests are spaced so the remaining budget lasts until the UTC
+  day ends. Once it is used up, requests wait for the next day's quota.
+
+Usage:
+    from quota_ledger import QuotaLedger, DailyQuota, key_id
+    from rate_limiter import RateLimiter
+
+    ledger = QuotaLedger('quota_ledger.json')
+    quota = DailyQuota(ledger, key_id(api_key), rpd=1500, policy='stop')
+    limiter = RateLimiter(rpm=15, quota=quota)
+    ...
+    ledger.save()
+"""
+
+import os
+import re
+import json
+import time
+import math
+import hashlib
+import threading
+from datetime import datetime, timedelta, timezone
+from typing import Dict, List, Optional
+
+DEFAULT_LEDGER_FILE = 'quota_ledger.json'
+# Days of history kept in the ledger
+KEEP_DAYS = 7
+# Seconds between automatic saves while requests are being counted
+SAVE_INTERVAL = 5.0
+QUOTA_POLICIES = ('stop', 'pace')
+# Quota violations that won't clear until the next day
+DAILY_QUOTA_PATTERN = re.compile(r'per\s*day|PerDay', re.IGNORECASE)
+
+
+class DailyQuotaExceeded(Exception):
+    """A key's daily request or token budget is used up."""
+
+
+def utc_day(now: Optional[datetime] = None) -> str:
+    """The current UTC date, e.g. '2025-01-31'."""
+    return (now or datetime.now(timezone.utc)).strftime('%Y-%m-%d')
+
+
+def seconds_until_utc_midnight() -> float:
+    """Seconds left in the current UTC day."""
+    now = datetime.now(timezone.utc)
+    midnight = (now + timedelta(days=1)).replace(hour=0, minute=0, second=0, microsecond=0)
+    return (midnight - now).total_seconds()
+
+
+def key_id(api_key: str) -> str:
+    """Stable identifier for a key that does not reveal it."""
+    return hashlib.sha256(api_key.encode('utf-8')).hexdigest()[:16]
+
+
+def _empty_counts() -> Dict:
+    return {'requests': 0, 'tokens': 0, 'exhausted': False}
+
+
+class QuotaLedger:
+    """Persistent per-key, per-UTC-day request and token counts."""
+
+    def __init__(self, path: str = DEFAULT_LEDGER_FILE):
+        self.path = path
+        self._lock = threading.Lock()
+        self._days: Dict[str, Dict[str, Dict]] = self._load()
+        self._unsaved: Dict[str, Dict[str, Dict]] = {}
+        self._last_save = time.monotonic()
+
+    def _load(self) -> Dict[str, Dict[str, Dict]]:
+        if not os.path.exists(self.path):
+            return {}
+        try:
+            with open(self.path, 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except (OSError, ValueError) as e:
+            print(f"Warning: Could not read quota ledger {self.path}: {e}")
+            return {}
+
+    def used(self, key: str) -> Dict:
+        """Today's counts for a key: {'requests', 'tokens', 'exhausted'}."""
+        with self._lock:
+            return dict(self._days.get(utc_day(), {}).get(key, _empty_counts()))
+
+    def add(self, key: str, requests: int = 0, tokens: int = 0):
+        """Count requests and/or tokens against a key for today."""
+        day = utc_day()
+        with self._lock:
+            for days in (self._days, self._unsaved):
+                counts = days.setdefault(day, {}).setdefault(key, _empty_counts())
+                counts['requests'] += requests
+                counts['tokens'] += tokens
+            due = time.monotonic() - self._last_save >= SAVE_INTERVAL
+        if due:
+            self.save()
+
+    def mark_exhausted(self, key: str):
+        """Record that the API refused a key for the rest of today."""
+        day = utc_day()
+        with self._lock:
+            for days in (self._days, self._unsaved):
+                days.setdefault(day, {}).setdefault(key, _empty_counts())['exhausted'] = True
+        self.save()
+
+    def save(self):
+        """Merge the counts added since the last save into the file."""
+        with self._lock:
+            on_disk = self._load()
+            for day, keys in self._unsaved.items():
+                for key, delta in keys.items():
+                    counts = on_disk.setdefault(day, {}).setdefault(key, _empty_counts())
+                    counts['requests'] += delta['requests']
+                    counts['tokens'] += delta['tokens']
+                    counts['exhausted'] = counts['exhausted'] or delta['exhausted']
+            oldest = utc_day(datetime.now(timezone.utc) - timedelta(days=KEEP_DAYS))
+            self._days = {day: keys for day, keys in on_disk.items() if day >= oldest}
+            self._unsaved = {}
+            self._last_save = time.monotonic()
+            tmp_path = f"{self.path}.tmp"
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                json.dump(self._days, f, indent=2, sort_keys=True)
+            os.replace(tmp_path, self.path)
+
+
+class DailyQuota:
+    """One key's daily caps, checked before each generate request."""
+
+    def __init__(self, ledger: QuotaLedger, key: str, rpd: Optional[int] = None, tpd: Optional[int] = None,
+                 policy: str = 'stop', label: str = ''):
+        """
+        Args:
+            ledger: Shared QuotaLedger
+            key: The key's id (key_id())
+            rpd: Requests per UTC day (None = unlimited)
+            tpd: Tokens per UTC day (None = unlimited)
+            policy: 'stop' or 'pace' (see the module docstring)
+            label: Printable name of the key
+        """
+        if policy not in QUOTA_POLICIES:
+            raise ValueError(f"Unknown quota policy: {policy}")
+        self.ledger = ledger
+        self.key = key
+        self.rpd = rpd or None
+        self.tpd = tpd or None
+        self.policy = policy
+        self.label = label or key
+        self._next_slot = 0.0
+        self._lock = threading.Lock()
+
+    def remaining(self) -> Dict[str, float]:
+        """Requests and tokens left today (math.inf where there is no cap)."""
+        used = self.ledger.used(self.key)
+        if used['exhausted']:
+            return {'requests': 0, 'tokens': 0}
+        return {
+            'requests': max(0, self.rpd - used['requests']) if self.rpd else math.inf,
+            'tokens': max(0, self.tpd - used['tokens']) if self.tpd else math.inf,
+        }
+
+    def before_request(self):
+        """
+        Count one request against today's budget, waiting first when pacing.
+
+        Raises:
+            DailyQuotaExceeded: With the 'stop' policy, once the budget is used up
+        """
+        while True:
+            left = self.remaining()
+            if left['requests'] >= 1 and left['tokens'] > 0:
+                break
+            if self.policy == 'stop':
+                raise DailyQuotaExceeded(f"Daily quota of key {self.label} is used up for {utc_day()} (UTC)")
+            wait = seconds_until_utc_midnight() + 1
+            print(f"[quota] Daily quota of key {self.label} is used up; waiting {wait / 3600:.1f} h "
+                  "for the next UTC day")
+            time.sleep(wait)
+        if self.policy == 'pace':
+            self._pace(left)
+        self.ledger.add(self.key, requests=1)
+
+    def _pace(self, left: Dict[str, float]):
+        """Space requests so the remaining budget lasts until the end of the UTC day."""
+        seconds_left = seconds_until_utc_midnight()
+        spacing = seconds_left / left['requests'] if left['requests'] != math.inf else 0.0
+        if left['tokens'] != math.inf:
+            used = self.ledger.used(self.key)
+            per_request = used['tokens'] / used['requests'] if used['requests'] else 0
+            spacing = max(spacing, seconds_left * per_request / left['tokens'])
+        with self._lock:
+            now = time.monotonic()
+            slot = max(now, self._next_slot)
+            self._next_slot = slot + spacing
+        if slot > now:
+            time.sleep(slot - now)
+
+    def after_response(self, tokens: int):
+        """Count the tokens a response used."""
+        if tokens:
+            self.ledger.add(self.key, tokens=tokens)
+
+    def note_error(self, exc: BaseException):
+        """Remember a daily-quota 429 from the API, so later runs don't retry the key today."""
+        if DAILY_QUOTA_PATTERN.search(str(exc)):
+            self.ledger.mark_exhausted(self.key)
+
+    def stats(self) -> Dict:
+        """Today's usage against the caps, for the audit log."""
+        used = self.ledger.used(self.key)
+        return {
+            'key': self.label,
+            'day': utc_day(),
+            'requests': used['requests'],
+            'tokens': used['tokens'],
+            'requests_per_day': self.rpd,
+            'tokens_per_day': self.tpd,
+            'exhausted': used['exhausted'],
+        }
+
+
+def budget_allows(quotas: List[DailyQuota], requests: float, tokens: float = 0) -> bool:
+    """True if the keys together have at least this many requests and tokens left today."""
+    left_requests = sum(quota.remaining()['requests'] for quota in quotas)
+    left_tokens = sum(quota.remaining()['tokens'] for quota in quotas)
+    return left_requests >= requests and left_tokens >= tokens
@@ -0,0 +1,136 @@
+"""
+Rate Limiter Module
+
+This module provides a thread-safe token-bucket rate limiter that keeps API
+traffic under a requests-per-minute (RPM) and tokens-per-minute (TPM) quota.
+Every upload and generate call acquires from the shared limiter, so any number
+of workers can run right at the quota ceiling without tripping 429 errors.
+
+Token usage is not known until a response arrives, so each generate call
+reserves an estimate (the running average of recent calls) and the
+reservation is settled against the response's usage_metadata afterwards.
+
+An optional quota_ledger.DailyQuota adds the key's per-day caps: generate
+calls are counted against it (and paced or refused by it) on acquire, and
+their tokens on settle.
+
+Usage:
+    from rate_limiter import RateLimiter
+
+    limiter = RateLimiter(rpm=15, tpm=1_000_000)
+    reservation = limiter.acquire()
+    response = model.generate_content(...)
+    limiter.settle(reservation, response.usage_metadata)
+"""
+
+import time
+import threading
+from typing import Optional
+
+
+class TokenBucket:
+    """Token bucket refilled continuously at a per-minute rate."""
+
+    def __init__(self, rate_per_minute: float, capacity: Optional[float] = None):
+        self.rate = rate_per_minute / 60.0
+        # Allow up to one minute's worth of burst by default
+        self.capacity = capacity if capacity is not None else float(rate_per_minute)
+        self._tokens = self.capacity
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _refill(self):
+        """Add tokens for the time elapsed. Caller must hold the lock."""
+        now = time.monotonic()
+        self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def acquire(self, amount: float = 1) -> float:
+        """
+        Block until `amount` tokens are available and take them.
+
+        Returns:
+            Seconds spent waiting
+        """
+        # Never wait for more than the bucket can ever hold
+        amount = min(amount, self.capacity)
+        waited = 0.0
+        while True:
+            with self._lock:
+                self._refill()
+                if self._tokens >= amount:
+                    self._tokens -= amount
+                    return waited
+                delay = (amount - self._tokens) / self.rate
+            time.sleep(delay)
+            waited += delay
+
+    def adjust(self, amount: float):
+        """Take (positive) or return (negative) tokens without waiting; may go negative."""
+        with self._lock:
+            self._refill()
+            self._tokens = min(self.capacity, self._tokens - amount)
+
+
+class RateLimiter:
+    """Shared RPM/TPM limiter for all API calls."""
+
+    def __init__(self, rpm: Optional[float] = None, tpm: Optional[float] = None, quota=None):
+        """
+        Args:
+            rpm: Requests per minute (None = unlimited)
+            tpm: Tokens per minute (None = unlimited)
+            quota: Optional quota_ledger.DailyQuota for the key's daily caps
+        """
+        self.quota = quota
+        self.requests = TokenBucket(rpm) if rpm else None
+        self.tokens = TokenBucket(tpm) if tpm else None
+        self._lock = threading.Lock()
+        self._avg_tokens = 0.0
+        self._samples = 0
+
+    def acquire(self, counts_tokens: bool = True) -> float:
+        """
+        Wait for capacity for one request.
+
+        Args:
+            counts_tokens: Reserve estimated tokens (generate calls); False for
+                calls that don't consume model tokens, such as uploads
+
+        Returns:
+            The token reservation to pass to settle()
+
+        Raises:
+            quota_ledger.DailyQuotaExceeded: If the daily quota refuses a generate call
+        """
+        if counts_tokens and self.quota is not None:
+            self.quota.before_request()
+        if self.requests is not None:
+            self.requests.acquire(1)
+        reserved = 0.0
+        if counts_tokens and self.tokens is not None:
+            with self._lock:
+                reserved = self._avg_tokens
+            if reserved:
+                self.tokens.acquire(reserved)
+        return reserved
+
+    def settle(self, reserved: float, usage_metadata=None):
+        """
+        Reconcile a reservation with the tokens the call actually used.
+
+        Args:
+            reserved: Value returned by acquire()
+            usage_metadata: The response's usage_metadata, or None if the call failed
+        """
+        used = getattr(usage_metadata, 'total_token_count', 0) or 0
+        if self.quota is not None:
+            self.quota.after_response(used)
+        if used:
+            with self._lock:
+                self._samples += 1
+                # Running average, weighted towards recent calls once warmed up
+                weight = max(1.0 / self._samples, 0.2)
+                self._avg_tokens += (used - self._avg_tokens) * weight
+        if self.tokens is not None and used != reserved:
+            self.tokens.adjust(used - reserved)
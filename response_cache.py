@@ -0,0 +1,121 @@
+"""
+Response Cache Module
+
+This module provides a disk-backed cache of raw model responses, keyed by the
+PDF content hash, the prompt and the model name. Re-running an extraction with
+identical inputs is served from the cache without any API calls.
+
+Entries are stored in a single SQLite database and evicted least-recently-used
+first once the cache grows beyond its size limit.
+
+Usage:
+    from response_cache import ResponseCache
+
+    cache = ResponseCache('.extraction_cache')
+    key = cache.make_key(pdf_sha256, prompt, 'models/gemini-2.0-flash')
+    text = cache.get(key)
+    if text is None:
+        text = model.generate_content(...).text
+        cache.put(key, text)
+"""
+
+import os
+import time
+import json
+import sqlite3
+import hashlib
+import threading
+from typing import Optional
+
+DEFAULT_CACHE_DIR = '.extraction_cache'
+DEFAULT_MAX_BYTES = 512 * 1024 * 1024
+
+
+class ResponseCache:
+    """Size-bounded LRU cache of model responses stored in SQLite."""
+
+    def __init__(self, cache_dir: str = DEFAULT_CACHE_DIR, max_bytes: int = DEFAULT_MAX_BYTES):
+        os.makedirs(cache_dir, exist_ok=True)
+        self.path = os.path.join(cache_dir, 'responses.sqlite3')
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(self.path, check_same_thread=False)
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS responses ("
+            "key TEXT PRIMARY KEY, response TEXT NOT NULL, "
+            "size INTEGER NOT NULL, last_access REAL NOT NULL)"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_last_access ON responses (last_access)")
+        self._conn.commit()
+        row = self._conn.execute("SELECT COALESCE(SUM(size), 0) FROM responses").fetchone()
+        self._total_bytes = row[0]
+
+    @staticmethod
+    def make_key(pdf_sha256: str, prompt: str, model: str, *extra: str) -> str:
+        """
+        Build a cache key from the request inputs.
+
+        Args:
+            pdf_sha256: Content hash of the PDF
+            prompt: Full prompt text
+            model: Model name
+            *extra: Any other inputs that change the response (e.g. a schema)
+
+        Returns:
+            Hex digest identifying the request
+        """
+        prompt_hash = hashlib.sha256(prompt.encode('utf-8')).hexdigest()
+        payload = json.dumps([pdf_sha256, prompt_hash, model, *extra])
+        return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+    def __contains__(self, key: str) -> bool:
+        """True if a response is cached for the key (without counting as an access)."""
+        with self._lock:
+            return self._conn.execute("SELECT 1 FROM responses WHERE key = ?", (key,)).fetchone() is not None
+
+    def get(self, key: str) -> Optional[str]:
+        """Return the cached response text, or None on a miss."""
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT response FROM responses WHERE key = ?", (key,)
+            ).fetchone()
+            if row is None:
+                return None
+            self._conn.execute(
+                "UPDATE responses SET last_access = ? WHERE key = ?", (time.time(), key)
+            )
+            self._conn.commit()
+            return row[0]
+
+    def put(self, key: str, response: str):
+        """Store a response, evicting least-recently-used entries if over the size limit."""
+        size = len(response.encode('utf-8'))
+        with self._lock:
+            old = self._conn.execute(
+                "SELECT size FROM responses WHERE key = ?", (key,)
+            ).fetchone()
+            if old is not None:
+                self._total_bytes -= old[0]
+            self._conn.execute(
+                "INSERT OR REPLACE INTO responses (key, response, size, last_access) "
+                "VALUES (?, ?, ?, ?)", (key, response, size, time.time())
+            )
+            self._total_bytes += size
+            self._evict()
+            self._conn.commit()
+
+    def _evict(self):
+        """Drop oldest entries until under max_bytes. Caller must hold the lock."""
+        while self._total_bytes > self.max_bytes:
+            row = self._conn.execute(
+                "SELECT key, size FROM responses ORDER BY last_access LIMIT 1"
+            ).fetchone()
+            if row is None:
+                break
+            self._conn.execute("DELETE FROM responses WHERE key = ?", (row[0],))
+            self._total_bytes -= row[1]
+
+    def close(self):
+        """Close the underlying database connection."""
+        with self._lock:
+            self._conn.close()
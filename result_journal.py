@@ -0,0 +1,109 @@
+"""
+Result Journal Module
+
+This module provides an append-only JSON Lines journal that is the durable
+store for extracted rows. Appending a study costs the same no matter how many
+studies are already saved; the Excel workbook is materialized from the journal
+once at the end of a run (or on demand with --export).
+
+Usage:
+    from result_journal import ResultJournal, export_to_excel
+
+    journal = ResultJournal('extracted_studies_api.jsonl',
+                            legacy_excel='extracted_studies_api.xlsx')
+    done = journal.processed_sources()
+    journal.append({'Source File': 'study.pdf', 'Title': '...'})
+    export_to_excel(journal, 'extracted_studies_api.xlsx', columns)
+"""
+
+import os
+import json
+import threading
+from typing import Dict, List, Optional, Set
+import pandas as pd
+
+
+class ResultJournal:
+    """Append-only JSON Lines store of extracted study rows."""
+
+    def __init__(self, path: str, legacy_excel: Optional[str] = None):
+        """
+        Open (or create) a journal.
+
+        Args:
+            path: Path to the .jsonl journal
+            legacy_excel: Output workbook written by older versions; its rows
+                are imported once if the journal does not exist yet
+        """
+        self.path = path
+        self._lock = threading.Lock()
+        if not os.path.exists(path) and legacy_excel and os.path.exists(legacy_excel):
+            self._import_excel(legacy_excel)
+
+    def _import_excel(self, excel_path: str):
+        """Seed a new journal from an existing output workbook."""
+        try:
+            df = pd.read_excel(excel_path)
+        except Exception as e:
+            print(f"Warning: Could not import existing output {excel_path}: {e}")
+            return
+        df = df.astype(object).where(pd.notna(df), None)
+        for row in df.to_dict('records'):
+            self.append(row)
+        print(f"Imported {len(df)} rows from {excel_path} into {self.path}")
+
+    def append(self, row: Dict):
+        """Durably append one row."""
+        line = json.dumps(row, ensure_ascii=False, default=str)
+        with self._lock:
+            with open(self.path, 'a', encoding='utf-8') as f:
+                f.write(line + '\n')
+                f.flush()
+
+    def rows(self) -> List[Dict]:
+        """Read all rows in the order they were appended."""
+        if not os.path.exists(self.path):
+            return []
+        rows = []
+        with open(self.path, 'r', encoding='utf-8') as f:
+            for line in f:
+                line = line.strip()
+                if not line:
+                    continue
+                try:
+                    rows.append(json.loads(line))
+                except json.JSONDecodeError:
+                    # A torn final line from an interrupted write
+                    print(f"Warning: Skipping unreadable line in {self.path}")
+        return rows
+
+    def processed_sources(self) -> Set[str]:
+        """Return the 'Source File' values already recorded."""
+        return {str(row['Source File']) for row in self.rows() if row.get('Source File') is not None}
+
+
+def export_to_excel(journal: ResultJournal, output_file: str, columns: List[str]) -> int:
+    """
+    Materialize the journal as an Excel workbook.
+
+    Args:
+        journal: Journal to export
+        output_file: Path of the .xlsx file to write
+        columns: Template field names, in output order
+
+    Returns:
+        Number of rows written
+    """
+    rows = journal.rows()
+    if not rows:
+        return 0
+
+    df = pd.DataFrame(rows)
+    # Ensure all columns
+    for c in columns:
+        if c not in df.columns:
+            df[c] = None
+
+    cols = ['Source File'] + [c for c in columns if c in df.columns and c != 'Source File']
+    df[cols].to_excel(output_file, index=False)
+    return len(df)
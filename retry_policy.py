@@ -0,0 +1,146 @@
+"""
+Retry Policy Module
+
+This module decides which API failures are worth retrying and how long to wait
+between attempts. Delays grow exponentially with "full jitter" (a uniformly
+random wait up to the exponential cap) so concurrent workers don't retry in
+lockstep, and a server-supplied retry delay always takes precedence.
+
+Usage:
+    from retry_policy import RetryPolicy
+
+    policy = RetryPolicy(max_attempts=5)
+    result = policy.call(do_request, arg1, arg2, label='study.pdf')
+"""
+
+import re
+import time
+import random
+from typing import Callable, Optional, Tuple, Type
+from google.api_core import exceptions
+
+try:
+    from requests import exceptions as requests_exceptions
+except ImportError:  # Only used by the REST transport
+    requests_exceptions = None
+
+
+class InvalidResponseError(Exception):
+    """The model returned output that could not be parsed."""
+
+
+# Transient failures: quota, server errors, timeouts and dropped connections
+RETRYABLE_EXCEPTIONS: Tuple[Type[BaseException], ...] = (
+    exceptions.ResourceExhausted,
+    exceptions.TooManyRequests,
+    exceptions.InternalServerError,
+    exceptions.BadGateway,
+    exceptions.ServiceUnavailable,
+    exceptions.GatewayTimeout,
+    exceptions.DeadlineExceeded,
+    exceptions.Aborted,
+    ConnectionError,
+    TimeoutError,
+    InvalidResponseError,
+)
+if requests_exceptions is not None:
+    # The REST transport's dropped connections don't subclass the builtins
+    RETRYABLE_EXCEPTIONS += (
+        requests_exceptions.ConnectionError,
+        requests_exceptions.Timeout,
+        requests_exceptions.ChunkedEncodingError,
+    )
+
+# e.g. 'retry_delay { seconds: 23 }', '"retryDelay": "23s"', 'Please retry in 23.4s'
+RETRY_HINT_PATTERNS = [
+    re.compile(r'retry_delay\s*\{\s*seconds:\s*(\d+)'),
+    re.compile(r'"retryDelay":\s*"(\d+(?:\.\d+)?)s"'),
+    re.compile(r'retry in (\d+(?:\.\d+)?)\s*s', re.IGNORECASE),
+]
+
+
+def retry_hint(exc: BaseException) -> Optional[float]:
+    """
+    Extract a server-suggested retry delay (in seconds) from an exception.
+
+    Looks at google.rpc.RetryInfo details, an HTTP Retry-After header and,
+    as a last resort, the error message.
+
+    Returns:
+        Delay in seconds, or None if the server gave no hint
+    """
+    for detail in getattr(exc, 'details', None) or []:
+        delay = getattr(detail, 'retry_delay', None)
+        if delay is not None and hasattr(delay, 'seconds'):
+            return delay.seconds + getattr(delay, 'nanos', 0) / 1e9
+
+    response = getattr(exc, 'response', None)
+    headers = getattr(response, 'headers', None) or {}
+    retry_after = headers.get('Retry-After') if hasattr(headers, 'get') else None
+    if retry_after:
+        try:
+            return float(retry_after)
+        except ValueError:
+            pass
+
+    message = str(exc)
+    for pattern in RETRY_HINT_PATTERNS:
+        match = pattern.search(message)
+        if match:
+            return float(match.group(1))
+    return None
+
+
+class RetryPolicy:
+    """Exponential backoff with full jitter and per-exception classification."""
+
+    def __init__(self, max_attempts: int = 5, base_delay: float = 2.0, max_delay: float = 60.0,
+                 retryable: Tuple[Type[BaseException], ...] = RETRYABLE_EXCEPTIONS):
+        """
+        Args:
+            max_attempts: Total attempts, including the first
+            base_delay: Backoff cap (seconds) after the first failure
+            max_delay: Upper bound on any single wait
+            retryable: Exception types considered transient
+        """
+        self.max_attempts = max(1, max_attempts)
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.retryable = retryable
+
+    def is_retryable(self, exc: BaseException) -> bool:
+        """Return True if the failure is transient."""
+        return isinstance(exc, self.retryable)
+
+    def delay(self, attempt: int, exc: BaseException) -> float:
+        """
+        Seconds to wait after the given (1-based) failed attempt.
+
+        A server retry hint is honoured as-is (capped at max_delay);
+        otherwise a random delay in [0, base_delay * 2**(attempt-1)].
+        """
+        hint = retry_hint(exc)
+        if hint is not None:
+            return min(hint, self.max_delay)
+        cap = min(self.max_delay, self.base_delay * (2 ** (attempt - 1)))
+        return random.uniform(0, cap)
+
+    def call(self, fn: Callable, *args, label: str = "", **kwargs):
+        """
+        Call fn, retrying transient failures.
+
+        Raises:
+            The last exception if it is not retryable or attempts run out
+        """
+        attempt = 1
+        while True:
+            try:
+                return fn(*args, **kwargs)
+            except Exception as e:
+                if not self.is_retryable(e) or attempt >= self.max_attempts:
+                    raise
+                wait = self.delay(attempt, e)
+                print(f"[{label}] {type(e).__name__}: retrying in {wait:.1f}s "
+                      f"(attempt {attempt + 1}/{self.max_attempts})")
+                time.sleep(wait)
+                attempt += 1
@@ -0,0 +1,86 @@
+"""
+Stage Timer Module
+
+This module measures how long each stage of the extraction takes (upload,
+server-side processing, generation, parsing, comparison, writing). Every
+duration is kept as a sample for the end-of-run p50/p95/max report, and can
+also be added to a per-study (or per-pass) record for the audit log.
+
+Usage:
+    from stage_timer import StageTimer
+
+    timer = StageTimer()
+    record = {}
+    with timer.time('generate', record):
+        response = model.generate_content(...)
+    print(record)            # {'generate': 1.234}
+    print(timer.report())    # p50/p95/max per stage
+"""
+
+import math
+import time
+import threading
+from contextlib import contextmanager
+from typing import Dict, List, Optional
+
+
+def percentile(values: List[float], q: float) -> float:
+    """Nearest-rank percentile (q in 0-100) of a non-empty list."""
+    ordered = sorted(values)
+    rank = max(1, math.ceil(q / 100 * len(ordered)))
+    return ordered[rank - 1]
+
+
+class StageTimer:
+    """Thread-safe collector of stage durations."""
+
+    def __init__(self):
+        self._samples: Dict[str, List[float]] = {}
+        self._lock = threading.Lock()
+
+    def add(self, stage: str, seconds: float, record: Optional[Dict[str, float]] = None):
+        """
+        Record one duration.
+
+        Args:
+            stage: Stage name
+            seconds: Duration
+            record: Optional per-study/per-pass dict; durations of the same stage
+                (retries, field shards) are summed into record[stage]
+        """
+        with self._lock:
+            self._samples.setdefault(stage, []).append(seconds)
+            if record is not None:
+                record[stage] = round(record.get(stage, 0.0) + seconds, 3)
+
+    @contextmanager
+    def time(self, stage: str, record: Optional[Dict[str, float]] = None):
+        """Context manager that records the duration of its block (even if it raises)."""
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.add(stage, time.perf_counter() - started, record)
+
+    def summary(self) -> Dict[str, Dict[str, float]]:
+        """Per-stage count, total, p50, p95 and max (seconds), in first-seen order."""
+        with self._lock:
+            samples = {stage: list(values) for stage, values in self._samples.items()}
+        return {
+            stage: {
+                'count': len(values),
+                'total_s': round(sum(values), 3),
+                'p50_s': round(percentile(values, 50), 3),
+                'p95_s': round(percentile(values, 95), 3),
+                'max_s': round(max(values), 3),
+            }
+            for stage, values in samples.items()
+        }
+
+    def report(self) -> str:
+        """The summary as a printable table."""
+        lines = [f"{'Stage':<18}{'Count':>7}{'p50 (s)':>10}{'p95 (s)':>10}{'Max (s)':>10}{'Total (s)':>11}"]
+        for stage, stats in self.summary().items():
+            lines.append(f"{stage:<18}{stats['count']:>7}{stats['p50_s']:>10.2f}{stats['p95_s']:>10.2f}"
+                         f"{stats['max_s']:>10.2f}{stats['total_s']:>11.2f}")
+        return '\n'.join(lines)
@@ -0,0 +1,134 @@
+"""
+Streaming JSON Module
+
+This module parses a JSON object incrementally as it is streamed from the
+model. Each top-level field is returned as soon as its value is complete, and
+output that cannot be a JSON object (prose, a stray array, a broken member) is
+rejected on the chunk where it appears instead of after the whole response.
+
+Usage:
+    from streaming_json import IncrementalJSONParser
+
+    parser = IncrementalJSONParser()
+    for chunk in model.generate_content(..., stream=True):
+        for key, value in parser.feed(chunk.text):
+            print(key, value)
+    data = parser.close()   # raises ValueError if the object was truncated
+"""
+
+import json
+from typing import Any, Dict, List, Tuple
+
+
+class IncrementalJSONParser:
+    """Incremental parser for a single top-level JSON object."""
+
+    def __init__(self):
+        self.text = ""
+        self._pos = 0             # next character to scan
+        self._start = None        # index of the opening '{'
+        self._member_start = None # start of the current top-level member
+        self._depth = 0
+        self._in_string = False
+        self._escape = False
+        self._done = False
+        self._fields: Dict[str, Any] = {}
+
+    def feed(self, chunk: str) -> List[Tuple[str, Any]]:
+        """
+        Add a chunk of streamed text.
+
+        Returns:
+            (key, value) pairs for top-level fields completed by this chunk
+
+        Raises:
+            ValueError: If the output is already known to be malformed
+        """
+        self.text += chunk
+        if self._start is None and not self._find_start():
+            return []
+        return self._scan()
+
+    def _find_start(self) -> bool:
+        """Locate the opening brace, skipping whitespace and a markdown fence."""
+        stripped = self.text.lstrip()
+        if not stripped:
+            return False
+        if stripped.startswith("```") or "```".startswith(stripped):
+            newline = stripped.find("\n")
+            if newline == -1:
+                return False  # Fence header not complete yet
+            stripped = stripped[newline + 1:].lstrip()
+            if not stripped:
+                return False
+        if stripped[0] != "{":
+            raise ValueError(f"Expected a JSON object, got: {stripped[:40]!r}")
+        self._start = len(self.text) - len(stripped)
+        self._pos = self._start
+        return True
+
+    def _scan(self) -> List[Tuple[str, Any]]:
+        """Scan newly received characters for completed top-level members."""
+        completed = []
+        text = self.text
+        while self._pos < len(text):
+            ch = text[self._pos]
+            if self._done:
+                if not ch.isspace() and ch != "`":
+                    raise ValueError(f"Unexpected data after JSON object: {text[self._pos:self._pos + 40]!r}")
+            elif self._in_string:
+                if self._escape:
+                    self._escape = False
+                elif ch == "\\":
+                    self._escape = True
+                elif ch == '"':
+                    self._in_string = False
+            elif ch == '"':
+                self._in_string = True
+            elif ch in "{[":
+                self._depth += 1
+                if self._depth == 1:
+                    self._member_start = self._pos + 1
+            elif ch in "}]":
+                self._depth -= 1
+                if self._depth == 0:
+                    completed.extend(self._close_member(self._pos))
+                    self._done = True
+            elif ch == "," and self._depth == 1:
+                completed.extend(self._close_member(self._pos))
+                self._member_start = self._pos + 1
+            self._pos += 1
+        return completed
+
+    def _close_member(self, end: int) -> List[Tuple[str, Any]]:
+        """Parse the member between _member_start and end."""
+        member = self.text[self._member_start:end].strip()
+        if not member:
+            return []
+        try:
+            parsed = json.loads("{" + member + "}")
+        except json.JSONDecodeError as e:
+            raise ValueError(f"Malformed field in streamed JSON: {member[:40]!r} ({e.msg})")
+        self._fields.update(parsed)
+        return list(parsed.items())
+
+    @property
+    def fields(self) -> Dict[str, Any]:
+        """Fields completed so far."""
+        return dict(self._fields)
+
+    def close(self) -> Dict[str, Any]:
+        """
+        Finish parsing.
+
+        Returns:
+            The complete object
+
+        Raises:
+            ValueError: If the stream ended before the object was closed
+        """
+        if self._start is None:
+            self._find_start()
+        if not self._done:
+            raise ValueError(f"Truncated JSON: stream ended after {len(self._fields)} complete fields")
+        return self.fields
@@ -240,6 +240,123 @@ def get_field_names(fields: List[TemplateField]) -> List[str]:
     return [field.name for field in fields]
 
 
+def shard_fields(fields: List[TemplateField], max_fields: int) -> List[List[TemplateField]]:
+    """
+    Split fields into shards of at most max_fields, keeping sections together.
+    
+    Whole sections are packed into a shard while they fit; a section larger
+    than max_fields is split across consecutive shards. Field order is kept.
+    
+    Args:
+        fields: Template fields
+        max_fields: Maximum number of fields per shard
+    
+    Returns:
+        List of field lists
+    """
+    if max_fields <= 0:
+        return [list(fields)]
+    
+    # Group consecutive fields by section
+    sections: List[List[TemplateField]] = []
+    for field in fields:
+        if sections and sections[-1][0].section == field.section:
+            sections[-1].append(field)
+        else:
+            sections.append([field])
+    
+    shards: List[List[TemplateField]] = []
+    current: List[TemplateField] = []
+    for section in sections:
+        if current and len(current) + len(section) > max_fields:
+            shards.append(current)
+            current = []
+        for field in section:
+            if len(current) >= max_fields:
+                shards.append(current)
+                current = []
+            current.append(field)
+    if current:
+        shards.append(current)
+    return shards
+
+
+# Composite values (Mean ± SD, n/N, ranges, CIs) must stay free text
+COMPOSITE_PATTERN = r'±|\bSD\b|\bIQR\b|\bCI\b|\brange\b|/'
+INTEGER_PATTERNS = [
+    r'\byear\b',
+    r'\bsample size\b',
+    r'\bcohort size\b',
+    r'\bnumber of\b',
+    r'\bno\.? of\b',
+    r'\(n\)',
+]
+NUMBER_PATTERNS = [
+    r'%',
+    r'\bpercent(age)?\b',
+]
+
+
+def infer_field_type(field: TemplateField) -> str:
+    """
+    Infer a JSON schema type for a field from its name and description.
+    
+    Args:
+        field: Template field
+    
+    Returns:
+        'integer', 'number' or 'string'
+    """
+    name = field.name.lower()
+    text = f"{field.name} {field.description}"
+    if re.search(COMPOSITE_PATTERN, text, re.IGNORECASE):
+        return 'string'
+    if any(re.search(pattern, name) for pattern in INTEGER_PATTERNS):
+        return 'integer'
+    if any(re.search(pattern, name) for pattern in NUMBER_PATTERNS):
+        return 'number'
+    return 'string'
+
+
+def build_response_schema(fields: List[TemplateField], include_justifications: bool = False) -> Dict:
+    """
+    Compile template fields into a Gemini response_schema.
+    
+    Every field is a required, nullable property so the model always returns
+    exactly the template's keys, using null for missing information.
+    
+    Args:
+        fields: Template fields
+        include_justifications: Also allow an optional '<Field>_justification'
+            string for each field (used by the verification pass)
+    
+    Returns:
+        Schema dictionary for genai.GenerationConfig(response_schema=...)
+    """
+    properties = {}
+    for field in fields:
+        prop = {'type': infer_field_type(field), 'nullable': True}
+        if field.description:
+            prop['description'] = field.description
+        properties[field.name] = prop
+    
+    required = list(properties)
+    
+    if include_justifications:
+        for name in required:
+            properties[f"{name}_justification"] = {
+                'type': 'string',
+                'nullable': True,
+                'description': f"Why {name} is null, if it is"
+            }
+    
+    return {
+        'type': 'object',
+        'properties': properties,
+        'required': required
+    }
+
+
 if __name__ == "__main__":
     # Example usage and testing
     import sys
@@ -0,0 +1,39 @@
+"""
+Shared fixtures for the offline test suite.
+
+Everything runs against backends.FakeBackend in a temporary directory, so no
+API key or network is needed.
+"""
+
+import os
+import sys
+
+import pytest
+
+TESTS_DIR = os.path.dirname(os.path.abspath(__file__))
+REPO_DIR = os.path.dirname(TESTS_DIR)
+sys.path.insert(0, REPO_DIR)
+sys.path.insert(0, os.path.join(REPO_DIR, 'benchmarks'))
+
+from backends import FakeBackend  # noqa: E402
+from synthetic import write_corpus, write_template  # noqa: E402
+
+N_STUDIES = 3
+N_FIELDS = 20
+TEMPLATE_FILE = 'template.xlsx'
+
+
+@pytest.fixture
+def workdir(tmp_path, monkeypatch):
+    """A working directory with Articles/ (N_STUDIES synthetic PDFs) and an N_FIELDS template."""
+    write_corpus(str(tmp_path / 'Articles'), N_STUDIES, seed=1, min_pages=3, max_pages=5)
+    write_template(str(tmp_path / TEMPLATE_FILE), N_FIELDS)
+    monkeypatch.chdir(tmp_path)
+    return tmp_path
+
+
+def fake_backend(**kwargs) -> FakeBackend:
+    """A FakeBackend with near-zero latencies."""
+    kwargs.setdefault('time_scale', 0.001)
+    kwargs.setdefault('seed', 1)
+    return FakeBackend(**kwargs)
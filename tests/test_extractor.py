@@ -0,0 +1,198 @@
+"""End-to-end runs of gemini_api_extractor.main() against the fake backend."""
+
+import json
+import os
+
+import pandas as pd
+import pytest
+
+import backends
+import gemini_api_extractor as extractor
+from conftest import N_FIELDS, N_STUDIES, TEMPLATE_FILE, fake_backend
+from template_parser import TemplateField
+
+
+def run(backend=None, **options):
+    """Run main() in the current directory; returns (journal rows, audit log)."""
+    options.setdefault('upload_index', False)
+    options.setdefault('use_cache', False)
+    extractor.main(None, template_path=TEMPLATE_FILE, workers=N_STUDIES, rpm=0, tpm=0, backend=backend,
+                   **options)
+    with open(extractor.JOURNAL_FILE, encoding='utf-8') as f:
+        rows = [json.loads(line) for line in f if line.strip()]
+    with open(extractor.AUDIT_LOG_FILE, encoding='utf-8') as f:
+        audit = json.load(f)
+    return rows, audit
+
+
+def clear_results():
+    """Forget earlier results so the next run extracts every study again."""
+    for path in (extractor.JOURNAL_FILE, extractor.OUTPUT_FILE):
+        if os.path.exists(path):
+            os.remove(path)
+
+
+def assert_complete(rows):
+    """One row per study, each with every template field."""
+    assert sorted(row['Source File'] for row in rows) == [f"study_{n:05d}.pdf" for n in range(N_STUDIES)]
+    field_names = [field.name for field in extractor.TEMPLATE_FIELDS]
+    assert len(field_names) == N_FIELDS
+    for row in rows:
+        assert all(name in row for name in field_names)
+
+
+def test_dual_pass(workdir):
+    backend = fake_backend()
+    rows, audit = run(backend)
+
+    assert_complete(rows)
+    summary = audit['summary']
+    assert summary['files_processed'] == N_STUDIES
+    assert summary['files_extracted'] == N_STUDIES
+    assert summary['tokens']['requests'] == 2 * N_STUDIES
+    assert backend.calls['generate_content'] == 2 * N_STUDIES
+    assert backend.calls['upload_file'] == N_STUDIES
+    # Without the upload index every upload is deleted after its study
+    assert backend.calls['delete_file'] == N_STUDIES
+    assert all(entry['pass1_extracted'] and entry['pass2_extracted'] for entry in audit['entries'])
+    assert os.path.exists(extractor.OUTPUT_FILE)
+
+
+def test_shard_fields(workdir):
+    backend = fake_backend()
+    rows, audit = run(backend, shard_size=8)
+
+    assert_complete(rows)
+    n_shards = len(extractor.create_pass_requests(1))
+    assert n_shards > 1
+    assert audit['summary']['tokens']['requests'] == 2 * n_shards * N_STUDIES
+    assert backend.calls['generate_content'] == 2 * n_shards * N_STUDIES
+    # Shards of a study share one upload
+    assert backend.calls['upload_file'] == N_STUDIES
+
+
+def test_context_cache(workdir):
+    backend = fake_backend()
+    rows, audit = run(backend, context_cache=True)
+
+    assert_complete(rows)
+    assert audit['summary']['files_extracted'] == N_STUDIES
+    # One cached context per study, shared by both passes and deleted afterwards
+    assert backend.calls['create_cached_content'] == N_STUDIES
+    assert backend.calls['delete_cached_content'] == N_STUDIES
+    assert backend.calls['generate_content'] == 2 * N_STUDIES
+
+
+def test_local_text(workdir):
+    pytest.importorskip('pypdf')
+    backend = fake_backend()
+    rows, audit = run(backend, local_text=True)
+
+    assert_complete(rows)
+    assert [entry['input'] for entry in audit['entries']] == ['text'] * N_STUDIES
+    assert 'upload_file' not in backend.calls
+    assert backend.calls['generate_content'] == 2 * N_STUDIES
+
+
+def test_record_then_replay(workdir):
+    cassette = str(workdir / 'run.cassette.jsonl.gz')
+    recorded_rows, recorded = run(fake_backend(), record=cassette)
+    assert recorded['cassette']['recorded'] == 2 * N_STUDIES
+
+    clear_results()
+    replayed_rows, replayed = run(replay=cassette, replay_latency='zero')
+
+    assert replayed_rows == recorded_rows
+    assert replayed['cassette']['replayed'] == 2 * N_STUDIES
+    assert replayed['cassette']['misses'] == 0
+    assert replayed['summary']['tokens'] == recorded['summary']['tokens']
+    # Every response was recorded, so nothing reaches even the stand-in backend
+    assert backends.get_backend().calls == {}
+
+
+def test_warm_cache_makes_no_api_calls(workdir):
+    cache_dir = str(workdir / 'cache')
+    first_rows, _ = run(fake_backend(), use_cache=True, cache_dir=cache_dir)
+
+    clear_results()
+    backend = fake_backend()
+    rows, audit = run(backend, use_cache=True, cache_dir=cache_dir)
+
+    assert rows == first_rows
+    assert audit['summary']['files_extracted'] == N_STUDIES
+    assert backend.calls == {}
+
+
+def test_resume_skips_extracted_studies(workdir):
+    run(fake_backend(), limit=1)
+    backend = fake_backend()
+    rows, audit = run(backend)
+
+    assert_complete(rows)
+    assert audit['summary']['files_processed'] == N_STUDIES - 1
+    assert backend.calls['upload_file'] == N_STUDIES - 1
+
+
+def test_failed_run_still_exports_and_logs(workdir, monkeypatch):
+    finish_study = extractor.finish_study
+
+    def failing_finish(job, dual_pass=True):
+        if job['pdf_path'].endswith('study_00001.pdf'):
+            raise RuntimeError("compare crashed")
+        return finish_study(job, dual_pass)
+
+    monkeypatch.setattr(extractor, 'finish_study', failing_finish)
+    with pytest.raises(RuntimeError, match="compare crashed"):
+        run(fake_backend())
+
+    with open(extractor.AUDIT_LOG_FILE, encoding='utf-8') as f:
+        summary = json.load(f)['summary']
+    assert summary['files_extracted'] == 1
+    assert 'compare crashed' in summary['error']
+    assert len(pd.read_excel(extractor.OUTPUT_FILE)) == 1
+
+
+def test_select_fields_for_verification(monkeypatch):
+    fields = [TemplateField("Author"), TemplateField("Study ID"), TemplateField("Country"),
+              TemplateField("Sample size"), TemplateField("Female (%)"), TemplateField("Events", "events / total N")]
+    monkeypatch.setattr(extractor, 'TEMPLATE_FIELDS', fields)
+    pass1 = {"Author": "Smith", "Study ID": "NCT01234567", "Country": "Not reported",
+             "Sample size": 120, "Female (%)": "48.5", "Events": "12 / 60"}
+
+    selected = [field.name for field in extractor.select_fields_for_verification(pass1)]
+
+    # Empty values and numeric-typed fields; free text with digits is trusted
+    assert selected == ["Country", "Sample size", "Female (%)"]
+
+
+def test_compare_extractions_only_checks_verified_fields():
+    pass1 = {"Author": "Smith", "Sample size": 120, "Country": None}
+    pass2 = {"Sample size": 112, "Country": "France", "Country_justification": None}
+
+    merged, discrepancies, justifications = extractor.compare_extractions(
+        pass1, pass2, 'a.pdf', verified_fields={"Sample size", "Country"})
+
+    assert merged == {'Source File': 'a.pdf', "Author": "Smith", "Sample size": 120, "Country": "France"}
+    assert {(d['Field'], d['Severity']) for d in discrepancies} == {("Sample size", 'CRITICAL'), ("Country", 'MINOR')}
+    assert [j['field'] for j in justifications] == ["Country"]
+
+
+def test_compare_extractions_full_pass2_checks_every_field():
+    pass1 = {"Author": "Smith", "Sample size": 120}
+    pass2 = {"Author": "Jones", "Sample size": 120}
+
+    merged, discrepancies, _ = extractor.compare_extractions(pass1, pass2, 'a.pdf')
+
+    assert merged["Author"] == "Smith"
+    assert [d['Field'] for d in discrepancies] == ["Author"]
+
+
+def test_adaptive_pass2(workdir):
+    backend = fake_backend()
+    rows, audit = run(backend, adaptive=True)
+
+    assert_complete(rows)
+    assert backend.calls['generate_content'] == 2 * N_STUDIES
+    assert backend.calls['upload_file'] == N_STUDIES
+    for entry in audit['entries']:
+        assert 0 < entry['pass2_fields'] < N_FIELDS
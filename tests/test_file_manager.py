@@ -0,0 +1,51 @@
+"""Tests for file_manager.UploadIndex."""
+
+import pytest
+from google.api_core import exceptions
+
+import backends
+from conftest import fake_backend
+from file_manager import UploadIndex, file_sha256
+
+
+@pytest.fixture
+def indexed(tmp_path, monkeypatch):
+    """An index holding one ACTIVE upload of a small PDF on the active fake backend."""
+    backend = fake_backend(processing_latency=backends.Latency('fixed', 0.0))
+    monkeypatch.setattr(backends, '_backend', backend)
+    pdf = tmp_path / 'study.pdf'
+    pdf.write_bytes(b'%PDF-1.4 study')
+    sha256 = file_sha256(str(pdf))
+    index = UploadIndex(str(tmp_path / 'upload_index.json'))
+    index.record(sha256, backend.upload_file(str(pdf), 'study.pdf'))
+    return index, sha256, backend
+
+
+def test_live_file_is_reused(indexed):
+    index, sha256, _ = indexed
+
+    assert index.lookup(sha256) is not None
+    assert UploadIndex(index.path).lookup(sha256) is not None  # Persisted across runs
+
+
+def test_file_gone_from_the_server_is_evicted(indexed):
+    index, sha256, backend = indexed
+    backend.delete_file(index._entries[sha256]['name'])
+
+    assert index.lookup(sha256) is None
+    assert sha256 not in UploadIndex(index.path)._entries
+
+
+def test_transient_error_keeps_the_entry(indexed, monkeypatch):
+    index, sha256, backend = indexed
+    get_file = backend.get_file
+
+    def unavailable(name):
+        raise exceptions.ServiceUnavailable("503")
+
+    monkeypatch.setattr(backend, 'get_file', unavailable)
+    with pytest.raises(exceptions.ServiceUnavailable):
+        index.lookup(sha256)
+
+    monkeypatch.setattr(backend, 'get_file', get_file)
+    assert index.lookup(sha256) is not None
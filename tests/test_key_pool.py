@@ -0,0 +1,143 @@
+"""Tests for key_pool.KeyPool failover."""
+
+import time
+from datetime import timedelta
+
+import pytest
+from google.api_core import exceptions
+
+import backends
+import key_pool
+from conftest import fake_backend
+from file_manager import FilePoller
+from key_pool import KeyPool
+from quota_ledger import DailyQuotaExceeded
+
+MODEL = 'models/gemini-2.0-flash'
+
+
+@pytest.fixture
+def pool(tmp_path, monkeypatch):
+    """Key 'a' answers every request with 429, key 'b' works; the pool is the active backend."""
+    pool = KeyPool({'a': fake_backend(error_rate=1.0), 'b': fake_backend()},
+                   poller=FilePoller(initial_delay=0.01))
+    monkeypatch.setattr(backends, '_backend', pool)
+    # Fail over at once instead of waiting for the study's own key
+    monkeypatch.setattr(key_pool, 'MAX_WAIT_FOR_HOME', 0.0)
+    pdf = tmp_path / 'study.pdf'
+    pdf.write_bytes(b'%PDF-1.4 study')
+    pool.pdf_path = str(pdf)
+    return pool
+
+
+def upload(pool):
+    """Upload the test PDF (to key 'a', the first in turn) and wait until it is ACTIVE."""
+    remote_file = pool.upload_file(pool.pdf_path, 'study.pdf')
+    return pool.poller.wait(remote_file).file
+
+
+def test_text_request_fails_over(pool):
+    a, b = pool.keys
+    response = pool.generative_model(MODEL).generate_content(['Extract the fields', '- Author'])
+
+    assert response.text
+    assert (a.rate_limited, a.failovers) == (1, 1)
+    assert not a.ready(time.monotonic())
+    assert b.usage.totals()['requests'] == 1
+
+
+def test_file_is_reuploaded_to_the_new_key(pool):
+    a, b = pool.keys
+    remote_file = upload(pool)
+    model = pool.generative_model(MODEL)
+
+    model.generate_content([remote_file, '- Author'])
+    model.generate_content([remote_file, '- Year'])
+
+    # One copy on key 'b' serves both requests
+    assert (a.uploads, b.uploads) == (1, 1)
+    assert b.backend.calls['generate_content'] == 2
+
+
+def test_copies_are_deleted_when_the_study_is_released(pool):
+    a, b = pool.keys
+    remote_file = upload(pool)
+    pool.generative_model(MODEL).generate_content([remote_file, '- Author'])
+
+    pool.release_file(remote_file.name)
+
+    assert b.backend.calls['delete_file'] == 1
+    assert 'delete_file' not in a.backend.calls  # The original is left for the upload index
+    assert pool._copies == {}
+
+
+def test_waits_for_a_cooling_key_instead_of_using_it(pool):
+    a, b = pool.keys
+    remote_file = upload(pool)
+    now = time.monotonic()
+    a.cooldown_until, b.cooldown_until = now + 60, now + 0.3
+
+    started = time.monotonic()
+    pool.generative_model(MODEL).generate_content([remote_file, '- Author'])
+
+    assert time.monotonic() - started >= 0.3
+    assert b.uploads == 1
+
+
+def test_every_key_exhausted_is_not_retried(pool):
+    for key in pool.keys:
+        key.exhausted = True
+
+    with pytest.raises(DailyQuotaExceeded):
+        pool.generative_model(MODEL).generate_content(['- Author'])
+
+
+def test_daily_quota_429_retires_the_key(pool):
+    a, b = pool.keys
+    pool._cool_down(a, Exception("429 Quota exceeded for GenerateRequestsPerDayPerProjectPerModel"))
+
+    assert a.exhausted
+    assert pool._pick() is b
+
+
+def test_rate_limited_copy_upload_cools_the_key_down(pool, monkeypatch):
+    a, b = pool.keys
+    remote_file = upload(pool)
+
+    def rate_limited(path, display_name):
+        raise exceptions.ResourceExhausted("429 Please retry in 30s.")
+
+    monkeypatch.setattr(b.backend, 'upload_file', rate_limited)
+    with pytest.raises(exceptions.ResourceExhausted):
+        pool.generative_model(MODEL).generate_content([remote_file, '- Author'])
+
+    assert b.rate_limited == 1
+    assert not b.ready(time.monotonic())
+
+
+def test_failed_copy_is_deleted(pool):
+    a, b = pool.keys
+    remote_file = upload(pool)
+    b.backend.processing_failure_rate = 1.0
+
+    with pytest.raises(exceptions.ResourceExhausted):
+        pool.generative_model(MODEL).generate_content([remote_file, '- Author'])
+
+    assert b.backend.calls['delete_file'] == 1
+    assert b.backend.list_files() == []
+    assert set(pool._owners) == {remote_file.name}
+
+
+def test_cached_context_waits_for_its_key(pool):
+    a, b = pool.keys
+    a.backend.error_rate = 0.0
+    remote_file = upload(pool)
+    cached = pool.create_cached_content(MODEL, remote_file, None, timedelta(minutes=5))
+    a.cooldown_until = time.monotonic() + 0.3
+
+    started = time.monotonic()
+    pool.model_from_cached_content(cached).generate_content(['- Author'])
+
+    assert time.monotonic() - started >= 0.3
+    assert a.usage.totals()['requests'] == 1
+    assert 'generate_content' not in b.backend.calls
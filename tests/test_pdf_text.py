@@ -0,0 +1,66 @@
+"""Tests for pdf_text page selection and preprocessing."""
+
+import pytest
+
+import pdf_text
+from pdf_text import select_relevant_pages
+from synthetic import make_pdf
+
+VOCABULARY = {'hba1c', 'baseline', 'weight', 'placebo', 'dropouts'}
+FILLER = "The trial enrolled adults across several centres and followed them over the study period. " * 3
+
+
+def page(*lines):
+    return "\n".join(lines)
+
+
+TITLE = page("Semaglutide versus placebo in type 2 diabetes", "Smith J, et al.")
+RESULTS = page("Results", FILLER, "Baseline HbA1c fell by 1.4% and weight by 4 kg versus placebo.")
+METHODS = page("Methods", FILLER)
+FIGURE = page("Figure 2")
+REFERENCES = page("References", *[f"{n}. Author A, et al. Diabetes Care. 2020;43:{n}." for n in range(1, 20)])
+
+
+def test_title_page_is_always_kept():
+    assert select_relevant_pages([TITLE, RESULTS], VOCABULARY)[0] == 0
+
+
+def test_figure_only_and_unmatched_pages_are_dropped():
+    assert select_relevant_pages([TITLE, METHODS, RESULTS, FIGURE], VOCABULARY) == [0, 2]
+
+
+def test_reference_list_is_dropped():
+    assert select_relevant_pages([TITLE, RESULTS, REFERENCES], VOCABULARY) == [0, 1]
+
+
+def test_supplementary_table_after_references_is_kept():
+    supplement = page("Supplementary Table S1", FILLER,
+                      "Baseline HbA1c, weight and dropouts by arm versus placebo.")
+
+    assert select_relevant_pages([TITLE, RESULTS, REFERENCES, supplement], VOCABULARY) == [0, 1, 3]
+
+
+def test_all_pages_kept_when_no_body_page_matches():
+    pages = [TITLE, METHODS, METHODS, FIGURE]
+
+    assert select_relevant_pages(pages, {'unrelated'}) == list(range(len(pages)))
+
+
+def test_preprocess_without_pypdf_uploads_the_original(tmp_path, monkeypatch):
+    monkeypatch.setattr(pdf_text, 'PdfReader', None)
+
+    assert not pdf_text.is_available()
+    assert pdf_text.preprocess_pdf(str(tmp_path / 'study.pdf')) == {
+        'text': None, 'upload_path': None, 'pages_kept': None, 'pages_total': None}
+
+
+def test_preprocess_returns_text_with_page_markers(tmp_path):
+    pytest.importorskip('pypdf')
+    pdf = tmp_path / 'study.pdf'
+    pdf.write_bytes(make_pdf([[f"Line {n} of page {page} with baseline HbA1c values" for n in range(8)]
+                              for page in range(1, 4)]))
+
+    result = pdf_text.preprocess_pdf(str(pdf))
+
+    assert result['pages_total'] == result['pages_kept'] == 3
+    assert result['text'].startswith("--- Page 1 ---")
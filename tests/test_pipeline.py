@@ -0,0 +1,48 @@
+"""Tests for pipeline.run_pipeline."""
+
+import random
+import time
+
+import pytest
+
+from pipeline import Stage, run_pipeline
+
+
+def jittered(fn):
+    """fn after a short random delay, so stages finish out of order."""
+    def run(item):
+        time.sleep(random.uniform(0, 0.005))
+        return fn(item)
+    return run
+
+
+def test_results_come_out_in_input_order():
+    stages = [Stage('double', jittered(lambda x: x * 2), workers=4), Stage('inc', jittered(lambda x: x + 1), workers=3)]
+
+    assert list(run_pipeline(range(50), stages, queue_size=2)) == [x * 2 + 1 for x in range(50)]
+
+
+def test_stage_error_is_raised_at_its_item():
+    def fail_on_three(x):
+        if x == 3:
+            raise ValueError("bad item")
+        return x
+
+    results = []
+    with pytest.raises(ValueError, match="bad item"):
+        for result in run_pipeline(range(6), [Stage('check', fail_on_three, workers=2)]):
+            results.append(result)
+    assert results == [0, 1, 2]
+
+
+def test_error_from_the_items_iterator_does_not_hang():
+    def items():
+        yield 1
+        yield 2
+        raise RuntimeError("discovery failed")
+
+    results = []
+    with pytest.raises(RuntimeError, match="discovery failed"):
+        for result in run_pipeline(items(), [Stage('a', lambda x: x, workers=2), Stage('b', lambda x: x)]):
+            results.append(result)
+    assert results == [1, 2]
@@ -0,0 +1,141 @@
+"""QuotaLedger persistence and the opt-in daily caps."""
+
+import json
+import os
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+import gemini_api_extractor as extractor
+import quota_ledger
+from conftest import N_STUDIES, TEMPLATE_FILE, fake_backend
+from quota_ledger import DailyQuota, DailyQuotaExceeded, QuotaLedger, budget_allows, utc_day
+
+
+@pytest.fixture
+def ledger_path(tmp_path):
+    return str(tmp_path / 'ledger.json')
+
+
+def test_counts_survive_a_restart(ledger_path):
+    ledger = QuotaLedger(ledger_path)
+    ledger.add('k', requests=2, tokens=300)
+    ledger.save()
+
+    assert QuotaLedger(ledger_path).used('k') == {'requests': 2, 'tokens': 300, 'exhausted': False}
+
+
+def test_concurrent_runs_add_up(ledger_path):
+    first, second = QuotaLedger(ledger_path), QuotaLedger(ledger_path)
+    first.add('k', requests=1, tokens=100)
+    second.add('k', requests=2, tokens=50)
+    first.save()
+    second.save()
+
+    assert second.used('k') == {'requests': 3, 'tokens': 150, 'exhausted': False}
+    # Saving again adds nothing twice
+    first.save()
+    assert QuotaLedger(ledger_path).used('k')['requests'] == 3
+
+
+def test_old_days_are_dropped(ledger_path):
+    old = utc_day(datetime.now(timezone.utc) - timedelta(days=quota_ledger.KEEP_DAYS + 1))
+    with open(ledger_path, 'w', encoding='utf-8') as f:
+        json.dump({old: {'k': {'requests': 9, 'tokens': 0, 'exhausted': True}}}, f)
+    ledger = QuotaLedger(ledger_path)
+    ledger.add('k', requests=1)
+    ledger.save()
+
+    with open(ledger_path, encoding='utf-8') as f:
+        assert list(json.load(f)) == [utc_day()]
+
+
+def test_unreadable_ledger_starts_empty(ledger_path):
+    with open(ledger_path, 'w', encoding='utf-8') as f:
+        f.write('{not json')
+
+    assert QuotaLedger(ledger_path).used('k')['requests'] == 0
+
+
+def test_stop_policy_raises_when_used_up(ledger_path):
+    quota = DailyQuota(QuotaLedger(ledger_path), 'k', rpd=2)
+    quota.before_request()
+    quota.before_request()
+
+    with pytest.raises(DailyQuotaExceeded):
+        quota.before_request()
+    assert quota.remaining()['requests'] == 0
+
+
+def test_token_cap(ledger_path):
+    quota = DailyQuota(QuotaLedger(ledger_path), 'k', tpd=1000)
+    quota.before_request()
+    quota.after_response(1000)
+
+    with pytest.raises(DailyQuotaExceeded):
+        quota.before_request()
+
+
+def test_daily_429_marks_the_key_exhausted(ledger_path):
+    quota = DailyQuota(QuotaLedger(ledger_path), 'k', rpd=100)
+    quota.note_error(RuntimeError("429 Quota exceeded for quota metric 'GenerateRequestsPerMinute'"))
+    assert quota.remaining()['requests'] == 100
+
+    quota.note_error(RuntimeError("429 Quota exceeded for quota metric 'GenerateRequestsPerDayPerProject'"))
+    assert quota.remaining() == {'requests': 0, 'tokens': 0}
+    # Remembered by the next run too
+    assert QuotaLedger(ledger_path).used('k')['exhausted']
+
+
+def test_pace_policy_spreads_requests_over_the_day(ledger_path, monkeypatch):
+    sleeps = []
+    monkeypatch.setattr(quota_ledger, 'seconds_until_utc_midnight', lambda: 100.0)
+    monkeypatch.setattr(quota_ledger.time, 'sleep', sleeps.append)
+    quota = DailyQuota(QuotaLedger(ledger_path), 'k', rpd=10, policy='pace')
+
+    quota.before_request()
+    quota.before_request()
+
+    # 10 requests left for 100 seconds: the second waits ~10 s for its slot
+    assert sleeps == [pytest.approx(10.0, abs=0.5)]
+
+
+def test_budget_allows_sums_keys(ledger_path):
+    ledger = QuotaLedger(ledger_path)
+    quotas = [DailyQuota(ledger, 'a', rpd=3), DailyQuota(ledger, 'b', rpd=3)]
+    ledger.add('a', requests=2)
+
+    assert budget_allows(quotas, 4)
+    assert not budget_allows(quotas, 5)
+    assert budget_allows([DailyQuota(ledger, 'c')], 10 ** 9, 10 ** 9)
+
+
+def run_with_keys(monkeypatch, **options):
+    """Run main() with two (fake) API keys, as a real multi-key run would be."""
+    monkeypatch.setattr(extractor, 'create_key_backend', lambda *args: fake_backend())
+    extractor.main(['key-one', 'key-two'], template_path=TEMPLATE_FILE, workers=N_STUDIES, rpm=0, tpm=0,
+                   upload_index=False, use_cache=False, **options)
+    with open(extractor.AUDIT_LOG_FILE, encoding='utf-8') as f:
+        return json.load(f)['summary']
+
+
+def test_daily_caps_are_opt_in(workdir, monkeypatch):
+    summary = run_with_keys(monkeypatch)
+
+    assert summary['files_extracted'] == N_STUDIES
+    assert 'daily_quota' not in summary
+    assert not os.path.exists(quota_ledger.DEFAULT_LEDGER_FILE)
+
+
+def test_stop_policy_holds_back_studies_across_runs(workdir, monkeypatch):
+    # Two keys with one request a day each: enough for one dual-pass study
+    summary = run_with_keys(monkeypatch, rpd=1)
+
+    assert summary['files_extracted'] == 1
+    assert summary['studies_held_back'] == N_STUDIES - 1
+    assert [quota['requests'] for quota in summary['daily_quota']] == [1, 1]
+
+    # The ledger remembers today's usage, so a rerun starts nothing
+    summary = run_with_keys(monkeypatch, rpd=1)
+    assert summary['files_processed'] == 0
+    assert summary['studies_held_back'] == N_STUDIES - 1
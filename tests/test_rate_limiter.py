@@ -0,0 +1,113 @@
+"""Token-bucket RPM/TPM limiting, on a fake clock so nothing really sleeps."""
+
+from types import SimpleNamespace
+
+import pytest
+
+import rate_limiter
+from rate_limiter import RateLimiter, TokenBucket
+
+
+class Clock:
+    """Stands in for time.monotonic/time.sleep; sleeping just advances the clock."""
+
+    def __init__(self):
+        self.now = 1000.0
+        self.slept = 0.0
+
+    def monotonic(self):
+        return self.now
+
+    def sleep(self, seconds):
+        self.now += seconds
+        self.slept += seconds
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(rate_limiter.time, 'monotonic', clock.monotonic)
+    monkeypatch.setattr(rate_limiter.time, 'sleep', clock.sleep)
+    return clock
+
+
+def usage(tokens):
+    return SimpleNamespace(total_token_count=tokens)
+
+
+def test_bucket_allows_a_burst_then_waits(clock):
+    bucket = TokenBucket(60)  # one per second, burst of 60
+    for _ in range(60):
+        assert bucket.acquire() == 0
+    assert bucket.acquire() == pytest.approx(1.0)
+    assert clock.slept == pytest.approx(1.0)
+
+
+def test_bucket_refills_up_to_capacity(clock):
+    bucket = TokenBucket(60, capacity=5)
+    for _ in range(5):
+        bucket.acquire()
+    clock.now += 3600
+    for _ in range(5):
+        assert bucket.acquire() == 0
+    assert bucket.acquire() == pytest.approx(1.0)
+
+
+def test_bucket_caps_oversized_requests(clock):
+    bucket = TokenBucket(60)
+    # Asking for more than capacity waits for a full bucket instead of forever
+    assert bucket.acquire(1000) == 0
+    assert bucket.acquire(1000) == pytest.approx(60.0)
+
+
+def test_adjust_can_go_negative(clock):
+    bucket = TokenBucket(60)
+    bucket.acquire(60)
+    bucket.adjust(30)
+    assert bucket.acquire(1) == pytest.approx(31.0)
+
+
+def test_rpm_limit(clock):
+    limiter = RateLimiter(rpm=2)
+    limiter.acquire()
+    limiter.acquire()
+    limiter.acquire()
+    assert clock.slept == pytest.approx(30.0)
+
+
+def test_unlimited_never_waits(clock):
+    limiter = RateLimiter()
+    for _ in range(100):
+        limiter.settle(limiter.acquire(), usage(10_000))
+    assert clock.slept == 0
+
+
+def test_tpm_reserves_average_and_settles_actual_usage(clock):
+    limiter = RateLimiter(tpm=1000)
+    # Nothing is known about the first call, so it reserves nothing
+    reserved = limiter.acquire()
+    assert reserved == 0
+    limiter.settle(reserved, usage(600))
+    assert limiter.tokens._tokens == pytest.approx(400)
+
+    # Later calls reserve the running average
+    reserved = limiter.acquire()
+    assert reserved == pytest.approx(600)
+    assert clock.slept == pytest.approx(12.0)  # 200 tokens short at 1000/min
+    limiter.settle(reserved, usage(300))
+    assert limiter.tokens._tokens == pytest.approx(300)
+
+
+def test_uploads_do_not_reserve_tokens(clock):
+    limiter = RateLimiter(tpm=1000)
+    limiter.settle(limiter.acquire(), usage(900))
+    assert limiter.acquire(counts_tokens=False) == 0
+    assert clock.slept == 0
+
+
+def test_failed_call_returns_its_reservation(clock):
+    limiter = RateLimiter(tpm=1000)
+    limiter.settle(limiter.acquire(), usage(500))
+    reserved = limiter.acquire()
+    limiter.settle(reserved, None)
+    assert limiter.tokens._tokens == pytest.approx(500)
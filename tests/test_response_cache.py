@@ -0,0 +1,62 @@
+"""ResponseCache keys, LRU eviction and the size cap."""
+
+import time
+
+from response_cache import ResponseCache
+
+
+def test_make_key_depends_on_every_input():
+    key = ResponseCache.make_key('abc', 'prompt', 'model', 'schema')
+    assert key == ResponseCache.make_key('abc', 'prompt', 'model', 'schema')
+    assert key != ResponseCache.make_key('abd', 'prompt', 'model', 'schema')
+    assert key != ResponseCache.make_key('abc', 'prompt!', 'model', 'schema')
+    assert key != ResponseCache.make_key('abc', 'prompt', 'other', 'schema')
+    assert key != ResponseCache.make_key('abc', 'prompt', 'model', 'other')
+
+
+def test_get_put_and_persist(tmp_path):
+    cache = ResponseCache(str(tmp_path))
+    assert cache.get('a') is None
+    cache.put('a', '{"x": 1}')
+    assert 'a' in cache
+    assert cache.get('a') == '{"x": 1}'
+    cache.close()
+
+    reopened = ResponseCache(str(tmp_path))
+    assert reopened.get('a') == '{"x": 1}'
+    reopened.close()
+
+
+def test_evicts_least_recently_used(tmp_path):
+    cache = ResponseCache(str(tmp_path), max_bytes=30)
+    cache.put('a', 'a' * 10)
+    time.sleep(0.01)
+    cache.put('b', 'b' * 10)
+    time.sleep(0.01)
+    cache.get('a')  # 'b' is now the least recently used
+    time.sleep(0.01)
+    cache.put('c', 'c' * 10)
+    time.sleep(0.01)
+    cache.put('d', 'd' * 10)
+
+    assert 'b' not in cache
+    assert all(key in cache for key in 'acd')
+    cache.close()
+
+
+def test_size_cap_counts_replaced_entries_once(tmp_path):
+    cache = ResponseCache(str(tmp_path), max_bytes=20)
+    cache.put('a', 'a' * 10)
+    cache.put('b', 'b' * 10)
+    # Replacing 'a' must not count its old size, so nothing is evicted
+    cache.put('a', 'A' * 10)
+    assert 'a' in cache and 'b' in cache
+
+    cache.put('big', 'x' * 25)
+    # An entry over the cap evicts everything, itself included
+    assert not any(key in cache for key in ('a', 'b', 'big'))
+    cache.close()
+
+    reopened = ResponseCache(str(tmp_path), max_bytes=20)
+    assert reopened._total_bytes == 0
+    reopened.close()
@@ -0,0 +1,76 @@
+"""Tests for retry_policy.retry_hint and RetryPolicy."""
+
+from types import SimpleNamespace
+
+import pytest
+import requests
+from google.api_core import exceptions
+
+from retry_policy import RetryPolicy, retry_hint
+
+
+def test_hint_from_retry_info_details():
+    error = exceptions.ResourceExhausted("429", details=[SimpleNamespace(
+        retry_delay=SimpleNamespace(seconds=12, nanos=500_000_000))])
+
+    assert retry_hint(error) == 12.5
+
+
+def test_hint_from_retry_after_header():
+    error = exceptions.TooManyRequests("429", response=SimpleNamespace(headers={'Retry-After': '7'}))
+
+    assert retry_hint(error) == 7.0
+
+
+@pytest.mark.parametrize('message, expected', [
+    ("429 Quota exceeded. retry_delay { seconds: 23 }", 23.0),
+    ('{"error": {"details": [{"retryDelay": "4.5s"}]}}', 4.5),
+    ("Resource exhausted. Please retry in 31.2s.", 31.2),
+    ("500 Internal error", None),
+])
+def test_hint_from_message(message, expected):
+    assert retry_hint(Exception(message)) == expected
+
+
+def test_hint_is_honoured_up_to_max_delay():
+    policy = RetryPolicy(max_delay=10)
+
+    assert policy.delay(1, Exception("Please retry in 3s")) == 3.0
+    assert policy.delay(1, Exception("Please retry in 300s")) == 10
+
+
+def test_call_retries_transient_errors_only(monkeypatch):
+    monkeypatch.setattr('retry_policy.time.sleep', lambda seconds: None)
+    policy = RetryPolicy(max_attempts=3)
+    attempts = []
+
+    def flaky():
+        attempts.append(1)
+        if len(attempts) < 3:
+            raise exceptions.ServiceUnavailable("503")
+        return 'ok'
+
+    def broken():
+        attempts.append(1)
+        raise ValueError("not transient")
+
+    assert policy.call(flaky) == 'ok'
+    assert len(attempts) == 3
+    with pytest.raises(ValueError):
+        policy.call(broken)
+    assert len(attempts) == 4
+
+
+@pytest.mark.parametrize('error', [
+    requests.exceptions.ConnectionError("Connection aborted"),
+    requests.exceptions.ReadTimeout("Read timed out"),
+    requests.exceptions.ChunkedEncodingError("Connection broken: IncompleteRead"),
+    ConnectionResetError("reset by peer"),
+    exceptions.ResourceExhausted("429"),
+])
+def test_transport_errors_are_retryable(error):
+    assert RetryPolicy().is_retryable(error)
+
+
+def test_client_errors_are_not_retryable():
+    assert not RetryPolicy().is_retryable(exceptions.InvalidArgument("400"))
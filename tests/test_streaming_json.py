@@ -0,0 +1,58 @@
+"""Tests for streaming_json.IncrementalJSONParser."""
+
+import pytest
+
+from streaming_json import IncrementalJSONParser
+
+
+def feed_all(chunks):
+    parser = IncrementalJSONParser()
+    completed = [parser.feed(chunk) for chunk in chunks]
+    return parser, completed
+
+
+def test_fields_are_returned_as_they_complete():
+    parser, completed = feed_all(['{"Author": "Sm', 'ith", "Year": 20', '21, "n": {"a": 1, "b": [2, 3]}', '}'])
+
+    assert completed == [[], [('Author', 'Smith')], [('Year', 2021)], [('n', {'a': 1, 'b': [2, 3]})]]
+    assert parser.close() == {'Author': 'Smith', 'Year': 2021, 'n': {'a': 1, 'b': [2, 3]}}
+
+
+def test_commas_and_braces_inside_strings():
+    parser, _ = feed_all(['{"Outcome": "HbA1c, {mean}", ', '"Quote": "said \\"yes, ok\\""}'])
+
+    assert parser.close() == {'Outcome': 'HbA1c, {mean}', 'Quote': 'said "yes, ok"'}
+
+
+def test_markdown_fence_is_skipped():
+    parser, _ = feed_all(['``', '`json\n{"a": 1}', '\n```'])
+
+    assert parser.close() == {'a': 1}
+
+
+def test_prose_is_rejected_on_first_chunk():
+    parser = IncrementalJSONParser()
+    with pytest.raises(ValueError):
+        parser.feed('Sure! Here is the data:')
+
+
+def test_malformed_member_is_rejected_when_it_ends():
+    parser = IncrementalJSONParser()
+    parser.feed('{"a": 1, "b": nope')
+    with pytest.raises(ValueError):
+        parser.feed(', "c": 2}')
+    assert parser.fields == {'a': 1}
+
+
+def test_data_after_the_object_is_rejected():
+    parser = IncrementalJSONParser()
+    parser.feed('{"a": 1}')
+    with pytest.raises(ValueError):
+        parser.feed(' {"b": 2}')
+
+
+def test_truncated_stream_fails_on_close():
+    parser, _ = feed_all(['{"a": 1, "b": "unfinished'])
+
+    with pytest.raises(ValueError, match="1 complete fields"):
+        parser.close()
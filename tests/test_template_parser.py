@@ -0,0 +1,73 @@
+"""Tests for template_parser: field sharding, type inference and the response schema."""
+
+from template_parser import TemplateField, build_response_schema, infer_field_type, shard_fields
+
+
+def make_fields(sizes):
+    """Fields in consecutive sections of the given sizes."""
+    return [TemplateField(f"S{section} F{n}", section=f"Section {section}")
+            for section, size in enumerate(sizes) for n in range(size)]
+
+
+def names(shards):
+    return [[field.name for field in shard] for shard in shards]
+
+
+def test_no_limit_gives_one_shard():
+    fields = make_fields([3, 4])
+
+    assert names(shard_fields(fields, 0)) == [[field.name for field in fields]]
+
+
+def test_whole_sections_are_packed_while_they_fit():
+    shards = shard_fields(make_fields([3, 2, 4]), 5)
+
+    assert [len(shard) for shard in shards] == [5, 4]
+    assert {field.section for field in shards[0]} == {'Section 0', 'Section 1'}
+
+
+def test_large_section_is_split_and_order_kept():
+    fields = make_fields([2, 7, 1])
+    shards = shard_fields(fields, 3)
+
+    assert all(len(shard) <= 3 for shard in shards)
+    assert [field.name for shard in shards for field in shard] == [field.name for field in fields]
+
+
+def test_infer_field_type():
+    assert infer_field_type(TemplateField("Year of publication")) == 'integer'
+    assert infer_field_type(TemplateField("Sample size")) == 'integer'
+    assert infer_field_type(TemplateField("Number of centres")) == 'integer'
+    assert infer_field_type(TemplateField("Female (%)")) == 'number'
+    assert infer_field_type(TemplateField("Author")) == 'string'
+
+
+def test_composite_values_stay_strings():
+    assert infer_field_type(TemplateField("Age (mean ± SD)")) == 'string'
+    assert infer_field_type(TemplateField("Number of events", "n/N per arm")) == 'string'
+    assert infer_field_type(TemplateField("Follow-up range (years)")) == 'string'
+
+
+def test_type_comes_from_the_name_not_the_description():
+    # A description merely mentioning a year does not make the field numeric
+    assert infer_field_type(TemplateField("Country", "Country where the study ran, e.g. in 2019")) == 'string'
+
+
+def test_build_response_schema():
+    fields = [TemplateField("Author", "First author surname"), TemplateField("Sample size")]
+    schema = build_response_schema(fields)
+
+    assert schema['type'] == 'object'
+    assert schema['required'] == ["Author", "Sample size"]
+    assert schema['properties']["Author"] == {'type': 'string', 'nullable': True,
+                                              'description': "First author surname"}
+    assert schema['properties']["Sample size"] == {'type': 'integer', 'nullable': True}
+
+
+def test_build_response_schema_with_justifications():
+    schema = build_response_schema([TemplateField("Author")], include_justifications=True)
+
+    # Justifications are optional extras; only the template fields are required
+    assert schema['required'] == ["Author"]
+    assert schema['properties']["Author_justification"]['type'] == 'string'
+    assert schema['properties']["Author_justification"]['nullable'] is True
@@ -0,0 +1,54 @@
+"""Token accounting and cost estimates."""
+
+from types import SimpleNamespace
+
+import pytest
+
+from token_usage import MODEL_PRICING, UsageTracker, empty_usage, estimate_cost, model_pricing
+
+
+def metadata(prompt=0, candidates=0, cached=0, thoughts=0):
+    return SimpleNamespace(prompt_token_count=prompt, candidates_token_count=candidates,
+                           cached_content_token_count=cached, thoughts_token_count=thoughts,
+                           total_token_count=prompt + candidates + thoughts)
+
+
+def test_tracker_sums_totals_and_records():
+    tracker = UsageTracker()
+    study = {}
+    tracker.add(metadata(prompt=1000, candidates=200, cached=800), study)
+    tracker.add(metadata(prompt=500, candidates=100), study)
+    tracker.add(metadata(prompt=10, candidates=1))
+
+    assert study == {'requests': 2, 'prompt_tokens': 1500, 'candidates_tokens': 300, 'cached_tokens': 800,
+                     'thoughts_tokens': 0, 'total_tokens': 1800}
+    totals = tracker.totals()
+    assert totals['requests'] == 3
+    assert totals['total_tokens'] == 1811
+
+
+def test_missing_metadata_counts_the_request_only():
+    tracker = UsageTracker()
+    tracker.add(None)
+    tracker.add(SimpleNamespace(prompt_token_count=None))
+
+    assert tracker.totals() == dict(empty_usage(), requests=2)
+
+
+def test_model_pricing_matches_longest_prefix():
+    assert model_pricing('models/gemini-2.0-flash') == MODEL_PRICING['gemini-2.0-flash']
+    assert model_pricing('gemini-2.0-flash-001') == MODEL_PRICING['gemini-2.0-flash']
+    assert model_pricing('models/gemini-2.0-flash-lite-001') == MODEL_PRICING['gemini-2.0-flash-lite']
+    assert model_pricing('models/some-other-model') is None
+
+
+def test_estimate_cost():
+    # 1M uncached prompt, 1M cached prompt, 1M output and 1M thinking tokens
+    usage = {'prompt_tokens': 2_000_000, 'cached_tokens': 1_000_000,
+             'candidates_tokens': 1_000_000, 'thoughts_tokens': 1_000_000}
+    pricing = MODEL_PRICING['gemini-1.5-pro']
+
+    expected = pricing['input'] + pricing['cached'] + 2 * pricing['output']
+    assert estimate_cost(usage, 'models/gemini-1.5-pro') == pytest.approx(expected)
+    assert estimate_cost(empty_usage(), 'models/gemini-1.5-pro') == 0
+    assert estimate_cost(usage, 'unknown-model') is None
@@ -0,0 +1,113 @@
+"""
+Token Usage Module
+
+This module accounts for the tokens reported in each response's
+usage_metadata (prompt, candidates, cached and total) and estimates what they
+cost for the configured model. Counts are summed for the whole run and, if a
+record dict is given, per study or per pass for the audit log.
+
+Prices are USD per million tokens from the public Gemini API price list
+(paid tier, prompts up to 128k tokens); update MODEL_PRICING when they change.
+Cached prompt tokens are billed at the cached rate, the rest of the prompt at
+the input rate, and candidate (and thinking) tokens at the output rate.
+
+Usage:
+    from token_usage import UsageTracker, estimate_cost
+
+    tracker = UsageTracker()
+    record = {}
+    tracker.add(response.usage_metadata, record)
+    print(record)   # {'requests': 1, 'prompt_tokens': 1200, ...}
+    print(estimate_cost(tracker.totals(), 'models/gemini-2.0-flash'))
+"""
+
+import threading
+from typing import Dict, Optional
+
+# USD per 1M tokens: input, output and cached input
+MODEL_PRICING: Dict[str, Dict[str, float]] = {
+    'gemini-2.0-flash': {'input': 0.10, 'output': 0.40, 'cached': 0.025},
+    'gemini-2.0-flash-lite': {'input': 0.075, 'output': 0.30, 'cached': 0.01875},
+    'gemini-1.5-flash': {'input': 0.075, 'output': 0.30, 'cached': 0.01875},
+    'gemini-1.5-flash-8b': {'input': 0.0375, 'output': 0.15, 'cached': 0.01},
+    'gemini-1.5-pro': {'input': 1.25, 'output': 5.00, 'cached': 0.3125},
+}
+
+# usage_metadata attribute -> record key
+USAGE_FIELDS = {
+    'prompt_token_count': 'prompt_tokens',
+    'candidates_token_count': 'candidates_tokens',
+    'cached_content_token_count': 'cached_tokens',
+    'thoughts_token_count': 'thoughts_tokens',
+    'total_token_count': 'total_tokens',
+}
+
+
+def empty_usage() -> Dict[str, int]:
+    """A zeroed usage record."""
+    record = {'requests': 0}
+    record.update({key: 0 for key in USAGE_FIELDS.values()})
+    return record
+
+
+def merge_usage(target: Dict[str, int], other: Dict[str, int]):
+    """Add the counts of one usage record to another."""
+    for key, value in other.items():
+        target[key] = target.get(key, 0) + value
+
+
+def model_pricing(model_name: str) -> Optional[Dict[str, float]]:
+    """Prices for a model name (with or without the 'models/' prefix and version suffix)."""
+    name = model_name.split('/')[-1]
+    # Longest matching prefix, so 'gemini-2.0-flash-lite-001' is not priced as 'gemini-2.0-flash'
+    for known in sorted(MODEL_PRICING, key=len, reverse=True):
+        if name.startswith(known):
+            return MODEL_PRICING[known]
+    return None
+
+
+def estimate_cost(usage: Dict[str, int], model_name: str) -> Optional[float]:
+    """
+    Estimate the cost of a usage record in USD.
+
+    Returns:
+        The cost, or None if the model has no entry in MODEL_PRICING
+    """
+    pricing = model_pricing(model_name)
+    if pricing is None:
+        return None
+    cached = usage.get('cached_tokens', 0)
+    uncached = max(0, usage.get('prompt_tokens', 0) - cached)
+    output = usage.get('candidates_tokens', 0) + usage.get('thoughts_tokens', 0)
+    cost = (uncached * pricing['input'] + cached * pricing['cached'] + output * pricing['output']) / 1_000_000
+    return round(cost, 6)
+
+
+class UsageTracker:
+    """Thread-safe running totals of token usage."""
+
+    def __init__(self):
+        self._totals = empty_usage()
+        self._lock = threading.Lock()
+
+    def add(self, usage_metadata, record: Optional[Dict[str, int]] = None):
+        """
+        Count one response.
+
+        Args:
+            usage_metadata: The response's usage_metadata (None counts the request only)
+            record: Optional per-study/per-pass dict the counts are also added to
+        """
+        usage = empty_usage()
+        usage['requests'] = 1
+        for attribute, key in USAGE_FIELDS.items():
+            usage[key] = getattr(usage_metadata, attribute, 0) or 0
+        with self._lock:
+            merge_usage(self._totals, usage)
+            if record is not None:
+                merge_usage(record, usage)
+
+    def totals(self) -> Dict[str, int]:
+        """Usage summed over every response so far."""
+        with self._lock:
+            return dict(self._totals)